@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0006_merge_20240914_1136"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customer",
+            name="avatar_renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:43
+
+import utils.media
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0007_customer_avatar_renditions"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="customer",
+            name="avatar",
+            field=utils.media.ContentAddressedImageField(
+                blank=True,
+                db_index=True,
+                max_length=255,
+                null=True,
+                upload_to="uploads/",
+            ),
+        ),
+    ]
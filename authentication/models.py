@@ -8,8 +8,11 @@ from django.utils.translation import gettext_lazy as _
 from datetime import timedelta
 
 from authentication.managers import UserManager
+from utils.media import ContentAddressedImageField
 
 
+# Upload path of the images stored before content addressing, used by
+# the migrations.
 def customer_image_file_path(instance, filename):
     _, extension = os.path.splitext(filename)
     filename = f"customer-{instance.id}{extension}"
@@ -21,12 +24,13 @@ class Customer(AbstractUser):
     username = None
     email = models.EmailField(_("email address"), unique=True)
     phone_number = models.CharField(_("phone number"), max_length=17, blank=True, unique=True)
-    avatar = models.ImageField(
+    avatar = ContentAddressedImageField(
         null=True,
         blank=True,
-        upload_to=customer_image_file_path,
+        upload_to="uploads/",
         max_length=255,
     )
+    avatar_renditions = models.JSONField(default=dict, blank=True, editable=False)
 
     shipping_country = models.CharField(max_length=100, null=True, blank=True)
     shipping_city = models.CharField(max_length=100, null=True, blank=True)
@@ -6,6 +6,8 @@ from rest_framework import serializers
 
 from authentication.models import PasswordReset
 from authentication.utils import send_reset_password_email
+from shop.tasks.images import schedule_image_processing
+from utils.images import SrcsetField
 
 
 def validate_password_confirm(password, password2):
@@ -48,6 +50,7 @@ class RegistrationSerializer(serializers.ModelSerializer):
 
 class CustomerSerializer(serializers.ModelSerializer):
     user_role = serializers.SerializerMethodField()
+    avatar_srcset = SrcsetField("avatar")
     old_password = serializers.CharField(write_only=True)
     password = serializers.CharField(write_only=True)
     password2 = serializers.CharField(write_only=True)
@@ -67,6 +70,7 @@ class CustomerSerializer(serializers.ModelSerializer):
             "first_name",
             "last_name",
             "avatar",
+            "avatar_srcset",
             "phone_number",
             "shipping_country",
             "shipping_city",
@@ -117,6 +121,8 @@ class CustomerSerializer(serializers.ModelSerializer):
         if password:
             user.set_password(password)
             user.save()
+        if validated_data.get("avatar"):
+            schedule_image_processing(user, "avatar")
         return user
 
 
@@ -133,6 +139,7 @@ class CustomerAdminSerializer(CustomerSerializer):
             "last_name",
             "phone_number",
             "avatar",
+            "avatar_srcset",
             "shipping_country",
             "shipping_city",
             "shipping_address",
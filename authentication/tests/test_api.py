@@ -1,3 +1,9 @@
+import tempfile
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PIL import Image
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
@@ -5,6 +11,8 @@ from django.urls import reverse
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.conf import settings
 
+from utils.tests.storages import LOCAL_STORAGES
+
 
 class CreateCustomerViewTests(APITestCase):
     def setUp(self):
@@ -97,6 +105,27 @@ class ManageUserViewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["email"], "test@example.com")
 
+    def test_avatar_upload_generates_renditions(self):
+        buffer = BytesIO()
+        Image.new("RGB", (500, 500)).save(buffer, format="PNG")
+        avatar = SimpleUploadedFile("avatar.png", buffer.getvalue())
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root,
+            STORAGES=LOCAL_STORAGES,
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(
+                    self.url,
+                    {"avatar": avatar},
+                    format="multipart",
+                    HTTP_AUTHORIZATION=f"Bearer {self.access_token}",
+                )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.get(
+                self.url, HTTP_AUTHORIZATION=f"Bearer {self.access_token}"
+            )
+        self.assertIn(" 500w", response.data["avatar_srcset"]["webp"])
+
     def test_manage_user_unauthorized(self):
         self.client.cookies.clear()
         response = self.client.get(self.url)
@@ -138,6 +138,7 @@ class CustomersListView(viewsets.ModelViewSet):
     serializer_class = CustomerAdminSerializer
     queryset = Customer.objects.all()
     pagination_class = Pagination
+    pagination_count_strategy = "estimated"
     permission_classes = (IsAdminUser,)
     filter_backends = [SearchFilter, ]
     search_fields = ['first_name', 'email']
@@ -3,7 +3,11 @@ import datetime
 from rest_framework import serializers
 from cart.models import Cart, CartItem, Coupon
 from shop.models import Product
-from shop.serializers import ProductSerializer, ProductImageSerializer
+from shop.serializers import (
+    ProductSerializer,
+    ProductImageSerializer,
+    get_primary_image,
+)
 
 
 class ProductItemSerializer(ProductSerializer):
@@ -14,7 +18,7 @@ class ProductItemSerializer(ProductSerializer):
         fields = ["id", "name", "category", "slug", "price", "images"]
 
     def get_images(self, obj) -> ProductImageSerializer:
-        first_image = obj.product_images.first()
+        first_image = get_primary_image(obj)
         return ProductImageSerializer(first_image).data if first_image else None
 
 
@@ -6,7 +6,7 @@ from django.contrib.auth import get_user_model
 
 from cart.models import Coupon, CartItem, Cart
 from shop.models import Product
-from shop.serializers import ProductSerializer
+from shop.serializers import ProductValuesSerializer
 
 
 class CartService:
@@ -125,10 +125,12 @@ class CartSessionService:
         Loop through cart items and fetch the products from the database
         """
         product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
+        products = ProductValuesSerializer().serialize(
+            Product.objects.filter(id__in=product_ids)
+        )
         cart = self.cart.copy()
         for product in products:
-            cart[str(product.id)]["product"] = ProductSerializer(product).data
+            cart[str(product["id"])]["product"] = product
         for item in cart.values():
             item["price"] = float(item["price"])
             item["total_price"] = item["price"] * item["quantity"]
@@ -212,13 +214,18 @@ class CartDBService:
         """
         Iterate through cart items associated with the user's cart in the database.
         """
-        cart_items = CartItem.objects.filter(cart=self.cart).select_related("product")
-        for item in cart_items:
+        serializer = ProductValuesSerializer(prefix="product__")
+        columns = dict.fromkeys(
+            ["quantity", "product__price", *serializer.get_columns()]
+        )
+        cart_items = list(CartItem.objects.filter(cart=self.cart).values(*columns))
+        products = serializer.to_representation(cart_items)
+        for item, product in zip(cart_items, products):
             yield {
-                "product": ProductSerializer(item.product).data,
-                "quantity": item.quantity,
-                "total_price": item.quantity * item.product.price,
-                "price": item.product.price,
+                "product": product,
+                "quantity": item["quantity"],
+                "total_price": item["quantity"] * item["product__price"],
+                "price": item["product__price"],
             }
 
     def add(
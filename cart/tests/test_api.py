@@ -1,10 +1,20 @@
+from django.core.cache import cache
+from django.db import connection
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
-from shop.models import Product, Category
+from shop.models import Product, Category, ProductImage
+from shop.serializers import ProductSerializer
+from shop.services import product_repository
+from shop.tests.factories import CategoryFactory, ProductFactory
 from authentication.models import Customer
+from cart.models import Cart, CartItem
+from cart.services import CartDBService
 from faker import Faker
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from utils.tests.storages import IN_MEMORY_STORAGES
 
 
 class CartAPITests(TestCase):
@@ -71,3 +81,51 @@ class CartAPITests(TestCase):
         apply_coupon_url = reverse("cart:coupon")
         response = self.client.post(apply_coupon_url, {"code": "TESTCOUPON"})
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class CartProductsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        product_repository.clear()
+        self.client = APIClient()
+        category = CategoryFactory(image="categories/shoes.jpg")
+        self.product = ProductFactory(category=category, price="12.5")
+        ProductImage.objects.create(
+            product=self.product,
+            image="sneakers.jpg",
+            image_renditions={"webp": {"320": "sneakers-320w.webp"}},
+        )
+        ProductFactory(category=None)
+
+    def test_cart_add_uses_cached_product(self):
+        url = reverse("cart:cart_add", kwargs={"product_id": self.product.id})
+        self.client.post(url, {"quantity": 1}, format="json")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {"quantity": 1}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            any(
+                'FROM "shop_product" WHERE "shop_product"."id" =' in query["sql"]
+                for query in queries.captured_queries
+            )
+        )
+        missing = reverse("cart:cart_add", kwargs={"product_id": 0})
+        self.assertEqual(
+            self.client.post(missing).status_code, status.HTTP_400_BAD_REQUEST
+        )
+
+    def test_cart_products_match_product_serializer(self):
+        customer = Customer.objects.create_user(
+            email="customer@example.com", password="password"
+        )
+        cart = Cart.objects.create(user=customer)
+        for product in Product.objects.order_by("id"):
+            CartItem.objects.create(cart=cart, product=product)
+        expected = [
+            ProductSerializer(item.product).data
+            for item in CartItem.objects.filter(cart=cart)
+        ]
+        actual = [item["product"] for item in CartDBService(customer)]
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
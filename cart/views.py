@@ -6,6 +6,7 @@ from rest_framework.views import APIView
 from cart.models import Coupon
 from cart.serializers import CouponSerializer, UseCouponSerializer, CartSerializer
 from shop.models import Product
+from shop.services import product_repository
 from cart.services import CartService
 from utils.custom_exceptions import (
     ProductNotExistException,
@@ -55,7 +56,7 @@ class CartAddItemView(APIView):
 
     def post(self, request, product_id):
         try:
-            product = Product.objects.get(id=product_id)
+            product = product_repository.get(product_id)
         except Product.DoesNotExist:
             raise ProductNotExistException
 
@@ -77,7 +78,7 @@ class CartRemoveItemView(APIView):
 
     def delete(self, request, product_id):
         try:
-            product = Product.objects.get(id=product_id)
+            product = product_repository.get(product_id)
         except Product.DoesNotExist:
             raise ProductNotExistException
 
@@ -95,7 +96,7 @@ class CartSubtractItemView(APIView):
 
     def post(self, request, product_id):
         try:
-            product = Product.objects.get(id=product_id)
+            product = product_repository.get(product_id)
         except Product.DoesNotExist:
             raise ProductNotExistException
 
@@ -7,6 +7,7 @@ from cart.models import Coupon
 from checkout.models import Order, OrderItem
 from shop.models import Product
 from shop.serializers import ProductSerializer
+from utils.sparse_fields import SparseFieldsSerializerMixin
 
 
 class CardInformationSerializer(serializers.Serializer):
@@ -90,7 +91,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         return obj.price * obj.quantity
 
 
-class OrderListSerializer(serializers.ModelSerializer):
+class OrderListSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     total_quantity = serializers.SerializerMethodField()
     total_price = serializers.SerializerMethodField()
 
@@ -112,7 +113,7 @@ class OrderListSerializer(serializers.ModelSerializer):
         ]
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     card_information = CardInformationSerializer(write_only=True)
     subtotal_price = serializers.SerializerMethodField()
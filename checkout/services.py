@@ -6,6 +6,7 @@ from rest_framework.response import Response
 from cart.services import CartSessionService
 from checkout.models import Order, OrderItem
 from shop.models import Product
+from shop.services import product_repository
 from utils.custom_exceptions import (
     CartEmptyException,
     StripeCardError,
@@ -61,13 +62,18 @@ class OrderService:
         return order_items
 
     def _get_cart_items(self):
+        items = list(self.cart_service)
+        product_ids = {item["product"]["id"] for item in items}
+        products = product_repository.get_many(product_ids)
+        if len(products) < len(product_ids):
+            raise Product.DoesNotExist("Product matching query does not exist.")
         return [
             {
-                "product": Product.objects.get(id=item["product"]["id"]),
+                "product": products[item["product"]["id"]],
                 "quantity": item["quantity"],
                 "price": item["price"],
             }
-            for item in self.cart_service
+            for item in items
         ]
 
     def clear_cart(self):
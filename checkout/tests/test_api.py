@@ -4,6 +4,10 @@ from rest_framework import status
 from rest_framework.test import APITestCase
 from unittest.mock import patch, MagicMock
 
+from authentication.models import Customer
+from checkout.models import Order, OrderItem
+from shop.tests.factories import ProductFactory
+
 
 class CheckoutTests(APITestCase):
     def setUp(self):
@@ -45,3 +49,49 @@ class CheckoutTests(APITestCase):
         self.assertEqual(
             response.data["error"], "card_information: This field is required."
         )
+
+
+class OrderSparseFieldsTests(APITestCase):
+    def setUp(self):
+        self.admin = Customer.objects.create_superuser(
+            email="admin@example.com", password="password"
+        )
+        self.client.force_authenticate(self.admin)
+        product = ProductFactory()
+        for _ in range(3):
+            order = Order.objects.create(
+                first_name="First",
+                last_name="Last",
+                phone="123",
+                shipping_address="Address",
+                shipping_city="City",
+                shipping_postcode="12345",
+                shipping_country="Country",
+            )
+            OrderItem.objects.create(order=order, product=product, quantity=2, price=10)
+        self.order = order
+        self.list_url = reverse("order-list-list")
+
+    def test_list_fields(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.list_url, {"fields": "id,order_status"})
+        self.assertEqual(set(response.data["items"][0]), {"id", "order_status"})
+
+    def test_list_totals_are_prefetched(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(self.list_url, {"omit": "created_at"})
+        self.assertEqual(response.data["items"][0]["total_quantity"], 2)
+        self.assertNotIn("created_at", response.data["items"][0])
+
+    def test_detail_omit_items(self):
+        url = reverse("order-list-detail", args=[self.order.id])
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                url, {"omit": "items,subtotal_price,total_price,discount"}
+            )
+        self.assertNotIn("items", response.data)
+        self.assertEqual(response.data["first_name"], "First")
+
+    def test_unknown_field(self):
+        response = self.client.get(self.list_url, {"fields": "id,password"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
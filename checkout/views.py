@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from drf_spectacular.utils import extend_schema
 from rest_framework import status, generics, viewsets
 from rest_framework.exceptions import ValidationError
@@ -7,13 +8,14 @@ from rest_framework.response import Response
 from checkout.filters import OrderFilter
 from checkout.tasks.order_notification import send_notification_mail
 
-from checkout.models import Order
+from checkout.models import Order, OrderItem
 from checkout.serializers import OrderSerializer, OrderListSerializer
 from checkout.services import (
     OrderService,
     PaymentService,
 )
 from utils.pagination import Pagination
+from utils.sparse_fields import SparseFieldsMixin
 
 
 class CheckoutView(generics.CreateAPIView):
@@ -58,19 +60,35 @@ class CheckoutView(generics.CreateAPIView):
 
 
 @extend_schema(tags=["orders"], summary="Get all orders")
-class OrderListView(viewsets.ModelViewSet):
+class OrderListView(SparseFieldsMixin, viewsets.ModelViewSet):
     permission_classes = (IsAdminUser,)
     pagination_class = Pagination
+    pagination_count_strategy = "estimated"
     filterset_class = OrderFilter
 
-    queryset = Order.objects.all().select_related("customer")
+    queryset = Order.objects.all()
     http_method_names = ["get", "patch", "delete", "head", "options"]
+    sparse_field_sources = {"discount": ["coupon"], "total_price": ["coupon"]}
 
     def get_serializer_class(self):
         if self.action == "list":
             return OrderListSerializer
         return OrderSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            if self.field_requested("total_quantity", "total_price"):
+                queryset = queryset.prefetch_related("items")
+        else:
+            if self.field_requested("discount", "total_price"):
+                queryset = queryset.select_related("coupon")
+            if self.field_requested("items", "subtotal_price", "total_price"):
+                queryset = queryset.prefetch_related(
+                    Prefetch("items", OrderItem.objects.select_related("product"))
+                )
+        return self.only_requested_fields(queryset)
+
     @extend_schema(
         summary="Retrieve a list of orders",
         description="This endpoint returns a list of all orders.",
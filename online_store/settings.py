@@ -5,6 +5,8 @@ from django.urls import reverse_lazy
 from dotenv import load_dotenv
 from datetime import timedelta
 
+from celery.schedules import crontab
+
 from utils.settings_utils import add_prefix_to_allowed_hosts
 
 load_dotenv()  # take environment variables from .env.
@@ -43,6 +45,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework_simplejwt",
     "rest_framework",
     "drf_standardized_errors",
@@ -119,6 +122,20 @@ if not bool(int(os.getenv("DEBUG", "0"))):
         }
     }
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -163,7 +180,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
-DEFAULT_FILE_STORAGE = "cloudinary_storage.storage.RawMediaCloudinaryStorage"
+DEFAULT_FILE_STORAGE = "utils.storage.ContentAddressedCloudinaryStorage"
 
 AUTH_USER_MODEL = "authentication.Customer"
 
@@ -232,17 +249,85 @@ LOGIN_URL = reverse_lazy("authentication:login")
 BRUTE_FORCE_THRESHOLD = 3  # Allow only 3 failed login attempts
 BRUTE_FORCE_TIMEOUT = 300  # Lock the user out for 5 minutes (300 seconds)
 
+# Lifetime of cached public catalog responses (seconds). Catalog changes
+# invalidate them earlier through generation counters.
+CATALOG_CACHE_TIMEOUT = 300
+# The generation counters must be seen by every worker process, so the
+# catalog caches keyed by them are off with a process-local cache (no
+# REDIS_URL), unless this is set for a single process server.
+CATALOG_CACHE_ALLOW_LOCAL = bool(int(os.getenv("CATALOG_CACHE_ALLOW_LOCAL", "0")))
+
+# Default count strategy of paginated responses: "exact", "cached" or "estimated".
+PAGINATION_COUNT_STRATEGY = "exact"
+PAGINATION_COUNT_CACHE_TIMEOUT = 60
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = 10000
+
+# Maximum number of products requested at once with ?ids= on the product list.
+PRODUCT_BATCH_MAX_IDS = 100
+
+# Width of the price histogram buckets in the product list facets.
+PRODUCT_FACET_PRICE_BUCKET_SIZE = 100
+
+# Widths (pixels) of the WebP and JPEG renditions generated for uploaded images.
+IMAGE_RENDITION_WIDTHS = [320, 640, 1280]
+IMAGE_RENDITION_QUALITY = 80
+# Limits of a multi-image upload: total request size and total pixel count.
+IMAGE_UPLOAD_MAX_BYTES = 100 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 600_000_000
+# Orphaned media collection: files deleted per batch, pause between batches
+# (seconds), and minimum age (seconds) of a file before it can be deleted.
+MEDIA_GC_BATCH_SIZE = 100
+MEDIA_GC_BATCH_PAUSE = 1.0
+MEDIA_GC_MIN_AGE = 24 * 60 * 60
+# Time (seconds) a stored file reused by an upload is kept from deletion, so
+# the transaction saving the reference can commit first.
+MEDIA_REUSE_TIMEOUT = 10 * 60
+# Per-process cache of the URLs of uploaded files: maximum entries and
+# lifetime of an entry (seconds). A size of 0 disables it.
+MEDIA_URL_CACHE_SIZE = 10_000
+MEDIA_URL_CACHE_TIMEOUT = 60 * 60
+# Memory-mapped snapshot of the catalog served by the product list, detail,
+# popular and latest endpoints, shared by the workers of a host. Rebuilt
+# this many seconds after a catalog change; disabled without a path.
+CATALOG_SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT_PATH")
+CATALOG_SNAPSHOT_REBUILD_DELAY = 5
+# Lifetime (seconds) of the cached JSON of every product, keyed by its
+# version. 0 disables the fragments.
+PRODUCT_FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+# Products looked up by id by the cart, wishlist and checkout: entries of the
+# per-process cache (0 disables it) and lifetime (seconds) in the shared cache.
+PRODUCT_CACHE_SIZE = 1000
+PRODUCT_CACHE_TIMEOUT = 60 * 60
+
 CART_SESSION_ID = "cart"
 WISHLIST_SESSION_ID = "wishlist"
 
 STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY")
 
+# Product views are buffered and flushed to the database every interval (seconds);
+# without Redis the buffer is per process and flushed by the process itself.
+# Repeated views by the same visitor within the dedup timeout are ignored (0 disables).
+PRODUCT_VIEWS_FLUSH_INTERVAL = 60
+PRODUCT_VIEWS_DEDUP_TIMEOUT = int(os.getenv("PRODUCT_VIEWS_DEDUP_TIMEOUT", "0"))
+
 CELERY_BROKER_URL = os.getenv("REDIS_URL")
+# Without a broker (development, tests) tasks run in the calling process.
+CELERY_TASK_ALWAYS_EAGER = not os.getenv("REDIS_URL")
 CELERY_ACCEPT_CONTENT = {"application/json"}
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TASK_SERIALIZER = "json"
 CELERY_TIMEZONE = "Europe/Kyiv"
 CELERY_RESULT_BACKEND = "django-db"
+CELERY_BEAT_SCHEDULE = {
+    "flush-product-views": {
+        "task": "shop.tasks.product_views.flush_product_views",
+        "schedule": PRODUCT_VIEWS_FLUSH_INTERVAL,
+    },
+    "collect-orphaned-media": {
+        "task": "shop.tasks.media.collect_orphaned_media",
+        "schedule": crontab(hour=4, minute=0),
+    },
+}
 
 
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Measure the memory used by the catalog export at growing catalog sizes.
+
+The products are generated in a throwaway test database, then the CSV
+export is consumed while tracemalloc records the peak of Python
+allocations. A flat peak across sizes means the export streams.
+
+Usage: python scripts/benchmark_export.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "online_store.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings, setup_test_environment  # noqa
+
+from shop.exporters import CatalogExporter  # noqa: E402
+from shop.models import Category, Product, ProductAttributes, ProductImage  # noqa
+
+
+def fill_catalog(size: int, batch_size: int = 5000) -> None:
+    """Grow the catalog to ``size`` products with attributes and two images."""
+    category, _ = Category.objects.get_or_create(name="Benchmark", slug="benchmark")
+    start = Product.objects.count()
+    for offset in range(start, size, batch_size):
+        products = Product.objects.bulk_create(
+            Product(
+                name=f"Product {index}",
+                slug=f"product-{index}",
+                SKU=index,
+                price=10,
+                description="Description of the benchmark product",
+                category=category,
+            )
+            for index in range(offset, min(offset + batch_size, size))
+        )
+        ProductAttributes.objects.bulk_create(
+            ProductAttributes(
+                product=product,
+                brand="Brand",
+                material="Material",
+                style="Style",
+                size=42,
+            )
+            for product in products
+        )
+        ProductImage.objects.bulk_create(
+            ProductImage(product=product, image=f"uploads/products/{name}.jpg")
+            for product in products
+            for name in (f"{product.slug}-1", f"{product.slug}-2")
+        )
+
+
+def measure_export(chunk_size: int) -> tuple[int, int, float]:
+    tracemalloc.start()
+    started = time.perf_counter()
+    written = 0
+    for line in CatalogExporter(chunk_size=chunk_size).iter_csv():
+        written += len(line)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, written, elapsed
+
+
+# Image URLs are built locally instead of by the configured cloud storage.
+LOCAL_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+@override_settings(STORAGES=LOCAL_STORAGES)
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    options = parser.parse_args()
+
+    # DEBUG would keep every executed query in memory.
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        print(f"{'products':>10} {'peak memory':>12} {'output':>10} {'time':>8}")
+        for size in sorted(options.sizes):
+            fill_catalog(size)
+            peak, written, elapsed = measure_export(options.chunk_size)
+            print(
+                f"{size:>10} {peak / 2**20:>10.1f}MB "
+                f"{written / 2**20:>8.1f}MB {elapsed:>7.1f}s"
+            )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
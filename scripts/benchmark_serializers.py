@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Compare the product list serializers on pages of growing size.
+
+Every page is serialized with ``ProductSerializer`` over model instances,
+as before, and with ``ProductValuesSerializer`` over ``values()`` rows,
+both rendered to JSON. The outputs are checked to be identical.
+
+Usage: python scripts/benchmark_serializers.py --sizes 30 100 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "online_store.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings, setup_test_environment  # noqa
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from shop.models import Category, Product, ProductImage  # noqa: E402
+from shop.serializers import ProductSerializer, ProductValuesSerializer  # noqa
+
+
+def fill_catalog(size: int) -> None:
+    """Grow the catalog to ``size`` products with two images each."""
+    category, _ = Category.objects.get_or_create(
+        name="Benchmark", slug="benchmark", defaults={"image": "benchmark.jpg"}
+    )
+    start = Product.objects.count()
+    products = Product.objects.bulk_create(
+        Product(
+            name=f"Product {index}",
+            slug=f"product-{index}",
+            SKU=index,
+            price=10,
+            description="Description of the benchmark product",
+            category=category,
+        )
+        for index in range(start, size)
+    )
+    ProductImage.objects.bulk_create(
+        ProductImage(product=product, image=f"uploads/products/{name}.jpg")
+        for product in products
+        for name in (f"{product.slug}-1", f"{product.slug}-2")
+    )
+
+
+def serialize_instances(size: int) -> bytes:
+    products = (
+        Product.objects.select_related("category")
+        .with_primary_image()
+        .order_by("id")[:size]
+    )
+    return JSONRenderer().render(ProductSerializer(products, many=True).data)
+
+
+def serialize_rows(size: int) -> bytes:
+    products = Product.objects.order_by("id")[:size]
+    return JSONRenderer().render(ProductValuesSerializer().serialize(products))
+
+
+def measure(serialize, size: int, repeat: int) -> tuple[float, bytes]:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        output = serialize(size)
+    return (time.perf_counter() - started) / repeat, output
+
+
+# Image URLs are built locally instead of by the configured cloud storage.
+LOCAL_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+@override_settings(STORAGES=LOCAL_STORAGES)
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    options = parser.parse_args()
+
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        fill_catalog(max(options.sizes))
+        print(f"{'products':>10} {'instances':>10} {'values':>10} {'speedup':>8}")
+        for size in sorted(options.sizes):
+            before, expected = measure(serialize_instances, size, options.repeat)
+            after, output = measure(serialize_rows, size, options.repeat)
+            if output != expected:
+                raise SystemExit(f"Outputs differ for {size} products.")
+            print(
+                f"{size:>10} {before * 1000:>8.1f}ms {after * 1000:>8.1f}ms "
+                f"{before / after:>7.1f}x"
+            )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
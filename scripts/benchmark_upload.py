@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+Measure the peak memory (RSS) of parsing and validating an image upload.
+
+The multipart body is written to a temporary file and streamed to the
+parser like a request body read from the socket, so only the memory used
+by the parser and the validation of ``ProductImageUploadSerializer`` is
+measured. ``--parser multipart`` uses the default upload handlers, which
+keep the files of requests of up to 2.5MB in memory, for comparison.
+
+Usage: python scripts/benchmark_upload.py --images 20 --width 1200 --height 900
+"""
+import argparse
+import gc
+import io
+import os
+import resource
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "online_store.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.handlers.wsgi import WSGIRequest  # noqa: E402
+from PIL import Image  # noqa: E402
+from rest_framework.parsers import MultiPartParser  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+
+from shop.serializers import ProductImageUploadSerializer  # noqa: E402
+from utils.uploads import SpooledMultiPartParser  # noqa: E402
+
+BOUNDARY = "BenchmarkBoundary"
+PARSERS = {"spooled": SpooledMultiPartParser, "multipart": MultiPartParser}
+
+
+def make_image(width: int, height: int) -> bytes:
+    """A noise JPEG, which does not compress, so its size is realistic."""
+    image = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def write_body(file, image: bytes, count: int) -> None:
+    for index in range(count):
+        file.write(
+            f"--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="uploaded_images"; '
+            f'filename="image-{index}.jpg"\r\n'
+            "Content-Type: image/jpeg\r\n\r\n".encode()
+        )
+        file.write(image)
+        file.write(b"\r\n")
+    file.write(f"--{BOUNDARY}--\r\n".encode())
+
+
+def upload(body, parser_class) -> int:
+    body.seek(0, os.SEEK_END)
+    length = body.tell()
+    body.seek(0)
+    request = Request(
+        WSGIRequest(
+            {
+                "REQUEST_METHOD": "POST",
+                "PATH_INFO": "/",
+                "CONTENT_TYPE": f"multipart/form-data; boundary={BOUNDARY}",
+                "CONTENT_LENGTH": str(length),
+                "wsgi.input": body,
+            }
+        ),
+        parsers=[parser_class()],
+    )
+    serializer = ProductImageUploadSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return len(serializer.validated_data["uploaded_images"])
+
+
+def read_status(key: str) -> int:
+    """Read a memory counter of /proc/self/status, in bytes."""
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(f"{key}:"):
+                return int(line.split()[1]) * 1024
+    raise KeyError(key)
+
+
+def measure_peak_rss_growth(function, *args) -> tuple[object, int]:
+    """
+    Call ``function`` and return its result with the growth of the peak
+    RSS of the process during the call.
+
+    On Linux the peak is reset first through /proc/self/clear_refs, so the
+    growth is measured from the current RSS. Elsewhere only growth above
+    the previous peak of the process can be seen.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        before = read_status("VmRSS")
+        result = function(*args)
+        return result, read_status("VmHWM") - before
+    except OSError:
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result = function(*args)
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes, except on macOS.
+        scale = 1 if sys.platform == "darwin" else 1024
+        return result, (after - before) * scale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--width", type=int, default=1200)
+    parser.add_argument("--height", type=int, default=900)
+    parser.add_argument("--parser", choices=PARSERS, default="spooled")
+    options = parser.parse_args()
+    parser_class = PARSERS[options.parser]
+
+    image = make_image(options.width, options.height)
+    with tempfile.TemporaryFile() as warm_up, tempfile.TemporaryFile() as body:
+        write_body(warm_up, image, 1)
+        write_body(body, image, options.images)
+        size = body.tell()
+        upload(warm_up, parser_class)
+
+        gc.collect()
+        count, growth = measure_peak_rss_growth(upload, body, parser_class)
+
+    print(
+        f"parser={options.parser} images={count} "
+        f"upload_mb={size / 2**20:.1f} peak_rss_growth_mb={growth / 2**20:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,12 @@ chmod go+rw /usr/src/app/.env
 python /usr/src/app/manage.py wait_for_db &&
 python /usr/src/app/manage.py migrate &&
 python /usr/src/app/manage.py collectstatic --noinput &&
-gunicorn online_store.wsgi:application --bind 0.0.0.0:80
+python /usr/src/app/manage.py warm_slug_cache &&
+python /usr/src/app/manage.py rebuild_popular_ranking
 
+# With REDIS_URL set, view flushes, image renditions, snapshots and media
+# collection run on the Celery worker and beat.
+celery -A online_store worker --loglevel=info &
+celery -A online_store beat --loglevel=info &
 
+gunicorn online_store.wsgi:application --bind 0.0.0.0:80
@@ -9,9 +9,15 @@ class ShopConfig(AppConfig):
     name = "shop"
 
     def ready(self):
+        import shop.signals  # noqa: F401
+
         post_migrate.connect(load_fixtures, sender=self)
 
 
 def load_fixtures(sender, **kwargs):
     if settings.DEBUG:
+        from shop.services import CategoryProductCounts
+
         call_command("loaddata", "initial_data.json")
+        # Fixtures are saved raw, without the signals counting products.
+        CategoryProductCounts.reconcile()
@@ -0,0 +1,202 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import Signal
+from rest_framework import status
+from rest_framework.response import Response
+
+
+# Sent with the bumped ``scopes`` whenever the public catalog changes.
+catalog_changed = Signal()
+# Stands for the scheme and host of the request in stored representations.
+ORIGIN = "__catalog_origin__"
+
+
+def request_origin(request) -> str:
+    """Scheme and host replacing ``ORIGIN`` in the URLs served to a request."""
+    return request.build_absolute_uri("/")[:-1]
+
+
+class OriginPlaceholderRequest:
+    """
+    Request stand-in making relative URLs absolute with ``ORIGIN``, so a
+    representation can be stored once and served to any host.
+    """
+
+    def build_absolute_uri(self, location: str) -> str:
+        return location if urlsplit(location).scheme else f"{ORIGIN}{location}"
+
+
+class CatalogGenerations:
+    """
+    Generation counters of the public catalog.
+
+    Cached responses embed the generations of the scopes they depend on
+    in their key, so bumping a generation makes the old entries
+    unreachable without scanning keys. The scopes are:
+
+    - ``products``: any product, image or attributes change;
+    - ``product:<id>``: a change of the product, its images or attributes;
+    - ``category:<id>``: a change of the category or of one of its products;
+    - ``categories``: any category change;
+    - ``popular``: a change of the popular products ranking.
+
+    The counters are only shared by the worker processes when the cache
+    is: in a process-local cache a change bumps them in the worker that
+    made it, and the others keep serving what they cached before.
+    """
+
+    prefix = "catalog:generation"
+
+    def is_shared(self) -> bool:
+        """
+        Whether every process sees the same generations, which the caches
+        keyed by them need. ``CATALOG_CACHE_ALLOW_LOCAL`` trusts a
+        process-local cache, for a single process server.
+        """
+        backend = settings.CACHES["default"]["BACKEND"]
+        return settings.CATALOG_CACHE_ALLOW_LOCAL or not backend.endswith(
+            ".LocMemCache"
+        )
+
+    def _key(self, scope: str) -> str:
+        return f"{self.prefix}:{scope}"
+
+    def get(self, scopes: Iterable[str]) -> list[int]:
+        keys = [self._key(scope) for scope in scopes]
+        generations = cache.get_many(keys)
+        for key in keys:
+            if key not in generations:
+                # A time based start keeps a re-created counter from reusing
+                # generations of an evicted one.
+                cache.add(key, time.time_ns(), timeout=None)
+                generations[key] = cache.get(key)
+        return [generations[key] for key in keys]
+
+    def bump(self, scopes: Iterable[str]) -> None:
+        scopes = set(scopes)
+        for scope in scopes:
+            try:
+                cache.incr(self._key(scope))
+            except ValueError:
+                pass
+        now = time.time()
+        cache.set_many(
+            {self._modified_key(scope): now for scope in scopes}, timeout=None
+        )
+        catalog_changed.send(sender=type(self), scopes=scopes)
+
+    def _modified_key(self, scope: str) -> str:
+        return f"{self.prefix}:modified:{scope}"
+
+    def last_modified(self, scopes: Iterable[str]) -> datetime:
+        """
+        Return when any of the scopes was last bumped. Scopes without a
+        recorded time count as modified now.
+        """
+        keys = [self._modified_key(scope) for scope in scopes]
+        times = cache.get_many(keys)
+        for key in keys:
+            if key not in times:
+                cache.add(key, time.time(), timeout=None)
+                times[key] = cache.get(key)
+        return datetime.fromtimestamp(max(times.values()), tz=timezone.utc)
+
+
+catalog_generations = CatalogGenerations()
+
+
+def product_scopes(product_id: int, *category_ids) -> list[str]:
+    scopes = ["products", f"product:{product_id}"]
+    scopes.extend(
+        f"category:{category_id}"
+        for category_id in category_ids
+        if category_id is not None
+    )
+    return scopes
+
+
+def category_scopes(category_id: int) -> list[str]:
+    return ["categories", f"category:{category_id}"]
+
+
+class CatalogCacheMixin:
+    """
+    Cache GET responses of public catalog views.
+
+    The key is built from the view action, the origin of the request (the
+    representations hold absolute URLs), the normalized query parameters and
+    the generations returned by ``get_cache_scopes``, ``cache_scopes`` by
+    default. Staff users always get fresh responses, and every request does
+    when the generations are not shared by the worker processes.
+    """
+
+    # Scopes whose changes invalidate the responses; the whole catalog
+    # unless a view narrows them.
+    cache_scopes = ["products", "categories"]
+
+    def get_cache_scopes(self) -> list[str]:
+        return list(self.cache_scopes)
+
+    def get_cache_key(self, request, scopes: list[str]) -> str:
+        params = sorted(
+            (key, value)
+            for key in request.query_params
+            for value in request.query_params.getlist(key)
+        )
+        generations = catalog_generations.get(scopes)
+        signature = hashlib.sha1(
+            repr(
+                (
+                    request_origin(request),
+                    sorted(self.kwargs.items()),
+                    params,
+                    generations,
+                )
+            ).encode()
+        ).hexdigest()
+        action = getattr(self, "action", None)
+        return f"catalog:response:{type(self).__name__}:{action}:{signature}"
+
+    def get_catalog_version(self) -> Optional[tuple[tuple, datetime]]:
+        """
+        Version data for conditional requests that follows the same
+        generations as the cached responses, without a database query.
+        """
+        if not catalog_generations.is_shared():
+            return None
+        scopes = self.get_cache_scopes()
+        return (
+            tuple(catalog_generations.get(scopes)),
+            catalog_generations.last_modified(scopes),
+        )
+
+    def cached_response(self, request, build, *args, **kwargs) -> Response:
+        if request.user.is_staff or not catalog_generations.is_shared():
+            return build(*args, **kwargs)
+
+        key = self.get_cache_key(request, self.get_cache_scopes())
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = build(*args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+        return response
+
+
+def cache_catalog_response(method):
+    """Cache the response of a ``CatalogCacheMixin`` view method."""
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        return self.cached_response(request, method, self, request, *args, **kwargs)
+
+    return wrapper
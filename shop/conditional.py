@@ -0,0 +1,67 @@
+import hashlib
+from datetime import datetime
+from functools import wraps
+from typing import Optional
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GET requests from row versions.
+
+    ``get_version_data`` returns cheap version data of the requested rows
+    (e.g. ``updated_at`` values from one query) and their last modification
+    time. A strong ETag and Last-Modified are derived from them before the
+    response body is built, so a matching ``If-None-Match`` or
+    ``If-Modified-Since`` gets a 304 without serializing anything.
+    """
+
+    def get_version_data(self) -> Optional[tuple[tuple, Optional[datetime]]]:
+        """
+        Version data and last modification time of the requested rows, or
+        ``None`` to answer the request unconditionally, the default.
+        """
+        return None
+
+    def get_etag(self, version: tuple) -> str:
+        params = sorted(
+            (key, value)
+            for key in self.request.query_params
+            for value in self.request.query_params.getlist(key)
+        )
+        signature = repr((type(self).__name__, self.action, params, version))
+        return quote_etag(hashlib.sha1(signature.encode()).hexdigest())
+
+    def conditional_response(self, request, build, *args, **kwargs):
+        version_data = self.get_version_data()
+        if version_data is None:
+            return build(*args, **kwargs)
+
+        version, last_modified = version_data
+        etag = self.get_etag(version)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(
+            request._request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = build(*args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response["ETag"] = etag
+        if timestamp is not None:
+            response["Last-Modified"] = http_date(timestamp)
+        return response
+
+
+def conditional_get(method):
+    """Answer conditional requests to a ``ConditionalGetMixin`` view method."""
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, method, self, request, *args, **kwargs
+        )
+
+    return wrapper
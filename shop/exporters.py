@@ -0,0 +1,91 @@
+import csv
+import json
+from typing import Iterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from shop.models import Product
+
+EXPORT_FIELDS = (
+    "SKU",
+    "name",
+    "slug",
+    "price",
+    "description",
+    "category",
+    "brand",
+    "material",
+    "style",
+    "size",
+    "images",
+)
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+class Echo:
+    """File-like object returning what is written, for ``csv.writer``."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+class CatalogExporter:
+    """
+    Export the catalog as CSV or JSON Lines without loading it in memory.
+
+    Products are read with a chunked ``.iterator()``; the category and
+    attributes are joined by the query and the images are prefetched once
+    per chunk, so every chunk costs two queries whatever its size. The
+    columns match the ``import_catalog`` format, plus the image URLs.
+    """
+
+    def __init__(self, chunk_size: int = 1000):
+        self.chunk_size = chunk_size
+
+    def get_queryset(self):
+        return (
+            Product.objects.select_related("category", "product_attributes")
+            .prefetch_related("product_images")
+            .order_by("id")
+        )
+
+    def iter_rows(self) -> Iterator[dict]:
+        for product in self.get_queryset().iterator(chunk_size=self.chunk_size):
+            attributes = getattr(product, "product_attributes", None)
+            yield {
+                "SKU": product.SKU,
+                "name": product.name,
+                "slug": product.slug,
+                "price": product.price,
+                "description": product.description,
+                "category": product.category.slug if product.category else None,
+                "brand": attributes.brand if attributes else None,
+                "material": attributes.material if attributes else None,
+                "style": attributes.style if attributes else None,
+                "size": attributes.size if attributes else None,
+                "images": [
+                    image.image.url
+                    for image in product.product_images.all()
+                    if image.image
+                ],
+            }
+
+    def iter_csv(self) -> Iterator[str]:
+        writer = csv.writer(Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in self.iter_rows():
+            row["images"] = " ".join(row["images"])
+            yield writer.writerow(row[field] for field in EXPORT_FIELDS)
+
+    def iter_jsonl(self) -> Iterator[str]:
+        for row in self.iter_rows():
+            yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+    def iter_lines(self, export_format: str) -> Iterator[str]:
+        if export_format == "csv":
+            return self.iter_csv()
+        return self.iter_jsonl()
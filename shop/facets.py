@@ -0,0 +1,79 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import CharField, Count, F, Value
+from django.db.models.functions import Cast, Floor
+
+from shop.filters import ProductFilter
+
+ATTRIBUTE_FACETS = {
+    "brand": "product_attributes__brand",
+    "material": "product_attributes__material",
+    "style": "product_attributes__style",
+    "size": "product_attributes__size",
+}
+
+
+class ProductFacets:
+    """
+    Facet counts of the products matching a bound ``ProductFilter``.
+
+    Every facet is counted with the filters of the other facets applied,
+    so selecting a brand still reports the counts of the other brands.
+    All facets, including the price histogram, are grouped in a single
+    ``UNION ALL`` query.
+    """
+
+    price_filters = ("price_min", "price_max")
+
+    def __init__(self, filterset: ProductFilter):
+        self.filterset = filterset
+        self.bucket_size = Decimal(settings.PRODUCT_FACET_PRICE_BUCKET_SIZE)
+
+    def get_facet_queryset(self, facet: str, expression, excluded):
+        queryset = self.filterset.filter_queryset_excluding(
+            self.filterset.queryset, excluded
+        )
+        return (
+            queryset.order_by()
+            .annotate(facet=Value(facet), value=Cast(expression, CharField()))
+            .filter(value__isnull=False)
+            .values("facet", "value")
+            .annotate(count=Count("id"))
+        )
+
+    def counts(self) -> dict[str, list[dict]]:
+        querysets = [
+            self.get_facet_queryset(facet, F(field), [facet])
+            for facet, field in ATTRIBUTE_FACETS.items()
+        ]
+        querysets.append(
+            self.get_facet_queryset(
+                "price", Floor(F("price") / self.bucket_size), self.price_filters
+            )
+        )
+        rows = querysets[0].union(*querysets[1:], all=True)
+
+        facets = {facet: [] for facet in ATTRIBUTE_FACETS}
+        facets["price"] = []
+        for row in rows:
+            facets[row["facet"]].append(self.format_row(row))
+        for facet, items in facets.items():
+            if facet == "price":
+                items.sort(key=lambda item: Decimal(item["min"]))
+            else:
+                items.sort(key=lambda item: (-item["count"], item["value"]))
+        return facets
+
+    def format_row(self, row: dict) -> dict:
+        if row["facet"] == "price":
+            low = int(Decimal(row["value"])) * self.bucket_size
+            return {
+                "min": f"{low:.2f}",
+                "max": f"{low + self.bucket_size:.2f}",
+                "count": row["count"],
+            }
+        value = row["value"]
+        if row["facet"] == "size":
+            value = int(Decimal(value))
+        return {"value": value, "count": row["count"]}
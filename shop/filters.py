@@ -1,5 +1,7 @@
 import django_filters
 from shop.models import Product, Category
+from shop.search import get_product_search
+from shop.services import category_slugs
 
 
 class CategoryFilter(django_filters.FilterSet):
@@ -10,12 +12,45 @@ class CategoryFilter(django_filters.FilterSet):
         fields = ["name"]
 
 
+class CharInFilter(django_filters.BaseInFilter, django_filters.CharFilter):
+    pass
+
+
+class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    pass
+
+
 class ProductFilter(django_filters.FilterSet):
-    category = django_filters.CharFilter(
-        field_name="category__id", lookup_expr="iexact"
-    )
-    name = django_filters.CharFilter(field_name="name", lookup_expr="icontains")
+    category = django_filters.CharFilter(method="filter_category")
+    name = django_filters.CharFilter(method="search")
+    brand = CharInFilter(field_name="product_attributes__brand", lookup_expr="in")
+    material = CharInFilter(field_name="product_attributes__material", lookup_expr="in")
+    style = CharInFilter(field_name="product_attributes__style", lookup_expr="in")
+    size = NumberInFilter(field_name="product_attributes__size", lookup_expr="in")
+    price_min = django_filters.NumberFilter(field_name="price", lookup_expr="gte")
+    price_max = django_filters.NumberFilter(field_name="price", lookup_expr="lte")
 
     class Meta:
         model = Product
         fields = ["category"]
+
+    def filter_category(self, queryset, name, value):
+        category_id = category_slugs.resolve_key(value)
+        if category_id is None:
+            return queryset.filter(category__slug=value)
+        return queryset.filter(category_id=category_id)
+
+    def search(self, queryset, name, value):
+        return get_product_search().search(queryset, value)
+
+    def filter_queryset_excluding(self, queryset, excluded):
+        """
+        Apply the bound filters except the ``excluded`` ones, e.g. to count
+        the values of a facet regardless of the values selected in it.
+        """
+        if not self.is_valid():
+            return queryset.none()
+        for name, value in self.form.cleaned_data.items():
+            if name not in excluded:
+                queryset = self.filters[name].filter(queryset, value)
+        return queryset
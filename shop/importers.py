@@ -0,0 +1,270 @@
+import csv
+import json
+import os
+from itertools import islice
+from typing import IO, Iterator, Optional
+
+from django.db import transaction
+from django.utils import timezone
+from pytils.translit import slugify
+
+from shop.cache import catalog_generations, product_scopes
+from shop.models import Category, Product, ProductAttributes
+from shop.search import update_search_documents
+from shop.serializers import ProductImportSerializer
+from shop.services import (
+    CategoryProductCounts,
+    PopularProductsRanking,
+    product_slugs,
+)
+
+IMPORT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+PRODUCT_FIELDS = ("name", "price", "description")
+ATTRIBUTE_FIELDS = ProductImportSerializer.attribute_fields
+
+
+def get_import_format(filename: str, import_format: Optional[str] = None) -> str:
+    if import_format:
+        return import_format
+    _, extension = os.path.splitext(filename)
+    try:
+        return IMPORT_FORMATS[extension.lower()]
+    except KeyError:
+        raise ValueError(
+            f"Cannot detect the format of {filename!r}, expected csv or jsonl."
+        )
+
+
+def read_csv_rows(stream: IO[str]) -> Iterator[tuple[int, Optional[dict], str]]:
+    """Yield ``(line, row, error)`` for every CSV record. Empty cells are omitted."""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, {
+            key: value for key, value in row.items() if key and value
+        }, ""
+
+
+def read_jsonl_rows(stream: IO[str]) -> Iterator[tuple[int, Optional[dict], str]]:
+    """Yield ``(line, row, error)`` for every non-empty JSON Lines record."""
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None, "Invalid JSON."
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Expected a JSON object."
+            continue
+        yield line_number, {
+            key: value for key, value in row.items() if value not in ("", None)
+        }, ""
+
+
+ROW_READERS = {"csv": read_csv_rows, "jsonl": read_jsonl_rows}
+
+
+class ImportResult:
+    """Counters and the first ``max_errors`` row errors of an import."""
+
+    def __init__(self, max_errors: int):
+        self.max_errors = max_errors
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line: int, errors) -> None:
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "errors": errors})
+
+    def as_dict(self) -> dict:
+        return {
+            "created": self.created,
+            "updated": self.updated,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+class CatalogImporter:
+    """
+    Import products and their attributes from a CSV or JSON Lines stream.
+
+    Rows are read lazily and handled in batches of ``batch_size``: every
+    batch is validated, then written with ``bulk_create``/``bulk_update``
+    in one transaction. Products are matched by ``SKU`` and categories are
+    resolved by slug from a map loaded once, so memory use does not depend
+    on the size of the file. Invalid rows are skipped and reported.
+    """
+
+    def __init__(self, batch_size: int = 500, max_errors: int = 100):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.categories = dict(Category.objects.values_list("slug", "id"))
+
+    def import_stream(self, stream: IO[str], import_format: str) -> ImportResult:
+        rows = ROW_READERS[import_format](stream)
+        result = ImportResult(self.max_errors)
+        while batch := list(islice(rows, self.batch_size)):
+            self.import_batch(batch, result)
+        return result
+
+    def import_batch(self, batch, result: ImportResult) -> None:
+        rows = self.validate_rows(batch, result)
+        if not rows:
+            return
+        existing = Product.objects.filter(SKU__in=rows).in_bulk(field_name="SKU")
+        slugs = self.resolve_slugs(rows, existing, result)
+
+        now = timezone.now()
+        to_create, to_update, scopes, previous_categories = [], [], [], {}
+        previous_slugs = []
+        for sku, (line, data) in rows.items():
+            product = existing.get(sku)
+            if product is None:
+                product = Product(SKU=sku, slug=slugs[sku])
+                to_create.append(product)
+            else:
+                scopes.extend(product_scopes(product.id, product.category_id))
+                previous_categories[product.id] = product.category_id
+                if product.slug != slugs[sku]:
+                    previous_slugs.append(product.slug)
+                product.slug = slugs[sku]
+                product.updated_at = now
+                to_update.append(product)
+            for field in PRODUCT_FIELDS:
+                setattr(product, field, data[field])
+            if "category" in data:
+                product.category_id = self.categories[data["category"]]
+
+        with transaction.atomic():
+            Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+            Product.objects.bulk_update(
+                to_update,
+                [*PRODUCT_FIELDS, "slug", "category", "updated_at"],
+                batch_size=self.batch_size,
+            )
+            products = {product.SKU: product for product in to_create + to_update}
+            self.save_attributes(rows, products)
+            update_search_documents(product.id for product in products.values())
+            self.count_products(to_create, to_update, previous_categories)
+
+        if previous_slugs:
+            product_slugs.discard(*previous_slugs)
+        product_slugs.set_many(
+            {product.slug: product.id for product in products.values()}
+        )
+        PopularProductsRanking().update_many(
+            (product.id, product.category_id, product.views)
+            for product in products.values()
+        )
+        for product in products.values():
+            scopes.extend(product_scopes(product.id, product.category_id))
+        catalog_generations.bump(scopes)
+        result.created += len(to_create)
+        result.updated += len(to_update)
+
+    @staticmethod
+    def count_products(to_create, to_update, previous_categories: dict) -> None:
+        counts = CategoryProductCounts()
+        for product in to_create:
+            counts.add(product.category_id, products=1)
+        moved = [
+            product
+            for product in to_update
+            if product.category_id != previous_categories[product.id]
+        ]
+        with_images = counts.with_images(product.id for product in moved)
+        for product in moved:
+            counts.move(
+                previous_categories[product.id],
+                product.category_id,
+                with_images=int(product.id in with_images),
+            )
+        counts.save()
+
+    def validate_rows(self, batch, result: ImportResult) -> dict[int, tuple]:
+        rows = {}
+        for line, row, error in batch:
+            if error:
+                result.add_error(line, {"non_field_errors": [error]})
+                continue
+            serializer = ProductImportSerializer(data=row)
+            if not serializer.is_valid():
+                result.add_error(line, serializer.errors)
+                continue
+            data = serializer.validated_data
+            if "category" in data and data["category"] not in self.categories:
+                result.add_error(line, {"category": ["Unknown category slug."]})
+            elif data["SKU"] in rows:
+                result.add_error(line, {"SKU": ["Duplicate SKU in the batch."]})
+            else:
+                rows[data["SKU"]] = (line, data)
+        return rows
+
+    def resolve_slugs(self, rows, existing, result: ImportResult) -> dict[int, str]:
+        """
+        Choose the slug of every row, dropping the rows whose slug is
+        already used by another product.
+
+        Rows without a slug keep the slug of the existing product or get one
+        from the name, suffixed with the SKU when it is taken.
+        """
+        wanted = {}
+        for sku, (line, data) in rows.items():
+            if "slug" in data:
+                wanted[sku] = data["slug"]
+            elif sku in existing:
+                wanted[sku] = existing[sku].slug
+            else:
+                wanted[sku] = slugify(data["name"]) or str(sku)
+
+        fallbacks = {
+            sku: f"{slug}-{sku}"
+            for sku, slug in wanted.items()
+            if "slug" not in rows[sku][1] and sku not in existing
+        }
+        owners = dict(
+            Product.objects.filter(
+                slug__in=[*wanted.values(), *fallbacks.values()]
+            ).values_list("slug", "SKU")
+        )
+
+        slugs, used = {}, set()
+        for sku, slug in wanted.items():
+            if owners.get(slug, sku) != sku or slug in used:
+                slug = fallbacks.get(sku)
+            if slug is None or owners.get(slug, sku) != sku or slug in used:
+                result.add_error(rows[sku][0], {"slug": ["Slug is already in use."]})
+                continue
+            slugs[sku] = slug
+            used.add(slug)
+        for sku in set(rows) - set(slugs):
+            del rows[sku]
+        return slugs
+
+    @staticmethod
+    def save_attributes(rows, products) -> None:
+        attributes = {sku: data for sku, (_, data) in rows.items() if "brand" in data}
+        if not attributes:
+            return
+        existing = ProductAttributes.objects.filter(
+            product_id__in=[products[sku].id for sku in attributes]
+        ).in_bulk(field_name="product_id")
+        to_create, to_update = [], []
+        for sku, data in attributes.items():
+            product = products[sku]
+            item = existing.get(product.id)
+            if item is None:
+                item = ProductAttributes(product=product)
+                to_create.append(item)
+            else:
+                to_update.append(item)
+            for field in ATTRIBUTE_FIELDS:
+                setattr(item, field, data[field])
+        ProductAttributes.objects.bulk_create(to_create)
+        ProductAttributes.objects.bulk_update(to_update, ATTRIBUTE_FIELDS)
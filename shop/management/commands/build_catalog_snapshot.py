@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from shop.snapshot import CatalogSnapshotBuilder
+
+
+class Command(BaseCommand):
+    """Django command to build the memory-mapped catalog snapshot"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            help="Snapshot file, CATALOG_SNAPSHOT_PATH by default.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"] or settings.CATALOG_SNAPSHOT_PATH
+        if not path:
+            raise CommandError("Set CATALOG_SNAPSHOT_PATH or pass a path.")
+        count = CatalogSnapshotBuilder(path).build()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} products to {path}."))
@@ -0,0 +1,50 @@
+from django.core.management import BaseCommand
+
+from utils.media import OrphanedMediaCollector
+
+
+class Command(BaseCommand):
+    """Django command to delete the media files no row references any more"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list the orphaned files.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, help="Number of files deleted per batch."
+        )
+        parser.add_argument(
+            "--pause", type=float, help="Seconds to wait between batches."
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            help="Keep the files modified less than this many seconds ago.",
+        )
+
+    def handle(self, *args, **options):
+        collector = OrphanedMediaCollector(
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+            min_age=options["min_age"],
+        )
+        if not options["dry_run"]:
+            report = collector.collect()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Deleted {report['deleted']} of {report['orphans']} orphaned "
+                    f"files ({report['size']} bytes)."
+                )
+            )
+            return
+
+        count = size = 0
+        for name in collector.find_orphans():
+            file_size = collector.file_size(name)
+            count, size = count + 1, size + file_size
+            self.stdout.write(f"{name} {file_size}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Found {count} orphaned files ({size} bytes).")
+        )
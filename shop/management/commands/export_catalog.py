@@ -0,0 +1,34 @@
+from django.core.management import BaseCommand, CommandError
+
+from shop.exporters import CatalogExporter
+
+
+class Command(BaseCommand):
+    """Django command to export products to a CSV or JSON Lines file"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", nargs="?", default="-", help="Output file, or - for stdout."
+        )
+        parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of products fetched per query.",
+        )
+
+    def handle(self, *args, **options):
+        exporter = CatalogExporter(chunk_size=options["chunk_size"])
+        lines = exporter.iter_lines(options["format"])
+        if options["path"] == "-":
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+
+        try:
+            with open(options["path"], "w", newline="", encoding="utf-8") as stream:
+                stream.writelines(lines)
+        except OSError as error:
+            raise CommandError(error)
+        self.stderr.write(self.style.SUCCESS(f"Exported to {options['path']}."))
@@ -0,0 +1,57 @@
+import sys
+
+from django.core.management import BaseCommand, CommandError
+
+from shop.importers import CatalogImporter, get_import_format
+
+
+class Command(BaseCommand):
+    """Django command to import products from a CSV or JSON Lines file"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - to read stdin.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="File format, detected from the extension by default.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of rows validated and written at once.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            import_format = get_import_format(path, options["format"])
+        except ValueError as error:
+            raise CommandError(error)
+
+        importer = CatalogImporter(batch_size=options["batch_size"])
+        if path == "-":
+            result = importer.import_stream(sys.stdin, import_format)
+        else:
+            try:
+                with open(path, newline="", encoding="utf-8") as stream:
+                    result = importer.import_stream(stream, import_format)
+            except OSError as error:
+                raise CommandError(error)
+
+        for error in result.errors:
+            self.stdout.write(
+                self.style.ERROR(f"Line {error['line']}: {error['errors']}")
+            )
+        if result.error_count > len(result.errors):
+            self.stdout.write(
+                self.style.ERROR(
+                    f"... and {result.error_count - len(result.errors)} more errors."
+                )
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {result.created} and updated {result.updated} products, "
+                f"{result.error_count} rows skipped."
+            )
+        )
@@ -0,0 +1,40 @@
+from django.core.management import BaseCommand
+
+from shop.models import Category
+from shop.services import PopularProductsRanking
+
+
+class Command(BaseCommand):
+    """Django command to rebuild or check the popular products ranking"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only compare the ranking with the database.",
+        )
+
+    def handle(self, *args, **options):
+        ranking = PopularProductsRanking()
+        if not options["check"]:
+            count = ranking.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Ranked {count} products."))
+            return
+
+        scopes = [None] + list(Category.objects.values_list("id", flat=True))
+        consistent = True
+        for category_id in scopes:
+            mismatched = ranking.check(category_id)
+            if mismatched:
+                consistent = False
+                scope = (
+                    "all products" if category_id is None else f"category {category_id}"
+                )
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"Ranking of {scope} differs for products: "
+                        f"{', '.join(map(str, mismatched))}"
+                    )
+                )
+        if consistent:
+            self.stdout.write(self.style.SUCCESS("Ranking is consistent."))
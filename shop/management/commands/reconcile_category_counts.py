@@ -0,0 +1,29 @@
+from django.core.management import BaseCommand
+
+from shop.services import CategoryProductCounts
+
+
+class Command(BaseCommand):
+    """Django command to repair or check the product counts of categories"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only compare the counts with the database.",
+        )
+
+    def handle(self, *args, **options):
+        drifted = CategoryProductCounts.reconcile(check=options["check"])
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Category counts are consistent."))
+            return
+        categories = ", ".join(map(str, drifted))
+        if options["check"]:
+            self.stdout.write(
+                self.style.ERROR(f"Counts differ for categories: {categories}")
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"Repaired counts of categories: {categories}")
+            )
@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+
+from shop.services import category_slugs, product_slugs
+
+
+class Command(BaseCommand):
+    """Django command to load the slugs of products and categories in the cache"""
+
+    def handle(self, *args, **options):
+        products = product_slugs.warm()
+        categories = category_slugs.warm()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Cached the slugs of {products} products "
+                f"and {categories} categories."
+            )
+        )
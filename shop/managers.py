@@ -0,0 +1,38 @@
+from django.db import models
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.utils import timezone
+
+
+def primary_images():
+    """Return the images that are the first (latest) image of their product."""
+    from shop.models import ProductImage
+
+    primary_image_id = (
+        ProductImage.objects.filter(product=OuterRef("product"))
+        .order_by("-id")
+        .values("id")[:1]
+    )
+    return ProductImage.objects.filter(id=Subquery(primary_image_id))
+
+
+def primary_image_prefetch(lookup: str = "product_images") -> Prefetch:
+    """
+    Build a prefetch that loads only the first image of every product.
+
+    The images of a whole page of products are fetched in one query and
+    stored in the ``primary_images`` list attribute of each product.
+    ``lookup`` may traverse relations, e.g. ``product__product_images``.
+    """
+    return Prefetch(lookup, queryset=primary_images(), to_attr="primary_images")
+
+
+class ProductQuerySet(models.QuerySet):
+    """Define a queryset for Product model with catalog read helpers."""
+
+    def with_primary_image(self):
+        """Prefetch the first image of every product in a single query."""
+        return self.prefetch_related(primary_image_prefetch())
+
+    def touch(self) -> int:
+        """Mark the products as changed, e.g. when their images change."""
+        return self.update(updated_at=timezone.now())
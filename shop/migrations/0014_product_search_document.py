@@ -0,0 +1,85 @@
+from django.db import migrations, models
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX shop_product_search_idx ON shop_product "
+    "USING gin (to_tsvector('simple'::regconfig, COALESCE(search_document, '')))",
+    "CREATE INDEX shop_product_name_trgm_idx ON shop_product "
+    "USING gin (name gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS shop_product_search_idx",
+    "DROP INDEX IF EXISTS shop_product_name_trgm_idx",
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE shop_product_fts USING fts5("
+    "search_document, content='shop_product', content_rowid='id')",
+    "CREATE TRIGGER shop_product_fts_insert AFTER INSERT ON shop_product BEGIN "
+    "INSERT INTO shop_product_fts(rowid, search_document) "
+    "VALUES (new.id, new.search_document); END",
+    "CREATE TRIGGER shop_product_fts_delete AFTER DELETE ON shop_product BEGIN "
+    "INSERT INTO shop_product_fts(shop_product_fts, rowid, search_document) "
+    "VALUES ('delete', old.id, old.search_document); END",
+    "CREATE TRIGGER shop_product_fts_update AFTER UPDATE OF search_document "
+    "ON shop_product BEGIN "
+    "INSERT INTO shop_product_fts(shop_product_fts, rowid, search_document) "
+    "VALUES ('delete', old.id, old.search_document); "
+    "INSERT INTO shop_product_fts(rowid, search_document) "
+    "VALUES (new.id, new.search_document); END",
+    "INSERT INTO shop_product_fts(shop_product_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS shop_product_fts_insert",
+    "DROP TRIGGER IF EXISTS shop_product_fts_delete",
+    "DROP TRIGGER IF EXISTS shop_product_fts_update",
+    "DROP TABLE IF EXISTS shop_product_fts",
+]
+
+
+def fill_search_documents(apps, schema_editor):
+    Product = apps.get_model("shop", "Product")
+    ProductAttributes = apps.get_model("shop", "ProductAttributes")
+    attributes = {item.product_id: item for item in ProductAttributes.objects.all()}
+    products = list(Product.objects.select_related("category"))
+    for product in products:
+        parts = [product.name, product.description]
+        if product.category is not None:
+            parts.append(product.category.name)
+        if product.id in attributes:
+            item = attributes[product.id]
+            parts.extend([item.brand, item.material, item.style])
+        product.search_document = " ".join(part for part in parts if part)
+    Product.objects.bulk_update(products, ["search_document"], batch_size=500)
+
+
+def run_vendor_sql(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0013_alter_category_options_alter_product_options_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="search_document",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(
+            run_vendor_sql({"postgresql": POSTGRES_FORWARD, "sqlite": SQLITE_FORWARD}),
+            run_vendor_sql(
+                {"postgresql": POSTGRES_BACKWARD, "sqlite": SQLITE_BACKWARD}
+            ),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+# Adding a column rebuilds the table on SQLite, which drops the triggers
+# keeping the full-text table of 0014_product_search_document in sync.
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS shop_product_fts_insert AFTER INSERT "
+    "ON shop_product BEGIN "
+    "INSERT INTO shop_product_fts(rowid, search_document) "
+    "VALUES (new.id, new.search_document); END",
+    "CREATE TRIGGER IF NOT EXISTS shop_product_fts_delete AFTER DELETE "
+    "ON shop_product BEGIN "
+    "INSERT INTO shop_product_fts(shop_product_fts, rowid, search_document) "
+    "VALUES ('delete', old.id, old.search_document); END",
+    "CREATE TRIGGER IF NOT EXISTS shop_product_fts_update "
+    "AFTER UPDATE OF search_document ON shop_product BEGIN "
+    "INSERT INTO shop_product_fts(shop_product_fts, rowid, search_document) "
+    "VALUES ('delete', old.id, old.search_document); "
+    "INSERT INTO shop_product_fts(rowid, search_document) "
+    "VALUES (new.id, new.search_document); END",
+]
+
+
+def restore_sqlite_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in SQLITE_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0014_product_search_document"),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_sqlite_triggers),
+        migrations.AddField(
+            model_name="category",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(restore_sqlite_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0015_category_updated_at_product_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="image_renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="productimage",
+            name="image_renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:43
+
+import utils.media
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0016_category_image_renditions_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="category",
+            name="image",
+            field=utils.media.ContentAddressedImageField(
+                blank=True,
+                db_index=True,
+                max_length=255,
+                null=True,
+                upload_to="uploads/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="productimage",
+            name="image",
+            field=utils.media.ContentAddressedImageField(
+                blank=True,
+                db_index=True,
+                max_length=255,
+                null=True,
+                upload_to="uploads/",
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:50
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def count_products(apps, schema_editor):
+    Category = apps.get_model("shop", "Category")
+    categories = Category.objects.annotate(
+        products=Count("product", distinct=True),
+        products_with_images=Count(
+            "product",
+            filter=Q(product__product_images__isnull=False),
+            distinct=True,
+        ),
+    )
+    for category in categories:
+        category.product_count = category.products
+        category.products_with_images_count = category.products_with_images
+    Category.objects.bulk_update(
+        categories, ["product_count", "products_with_images_count"]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0017_alter_category_image_alter_productimage_image"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="product_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="products_with_images_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_products, migrations.RunPython.noop),
+    ]
@@ -4,7 +4,12 @@ import uuid
 from django.db import models
 from pytils.translit import slugify
 
+from shop.managers import ProductQuerySet
+from utils.media import ContentAddressedImageField
 
+
+# Upload path of the images stored before content addressing, used by
+# the migrations.
 def product_image_file_path(instance, filename):
     _, extension = os.path.splitext(filename)
     filename = f"{slugify(instance.product.name)}-{uuid.uuid4()}{extension}"
@@ -16,12 +21,20 @@ class Category(models.Model):
     name = models.CharField(max_length=100, db_index=True, unique=True)
     slug = models.SlugField(max_length=255, unique=True)
     description = models.TextField(null=True, blank=True)
-    image = models.ImageField(
+    image = ContentAddressedImageField(
         null=True,
         blank=True,
-        upload_to="uploads/category/",
+        upload_to="uploads/",
         max_length=255,
     )
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    # Maintained by the signals of products and images, see
+    # CategoryProductCounts.
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    products_with_images_count = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    count_fields = ("product_count", "products_with_images_count")
 
     def __str__(self):
         return self.name
@@ -31,6 +44,15 @@ class Category(models.Model):
             self.slug = slugify(self.name)
         return super().save(*args, **kwargs)
 
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, *args):
+        if update_fields is None:
+            # Counts loaded with the instance may be stale: they are only
+            # written when inserting the row or when named in update_fields.
+            values = [
+                value for value in values if value[0].name not in self.count_fields
+            ]
+        return super()._do_update(base_qs, using, pk_val, values, update_fields, *args)
+
     class Meta:
         app_label = "shop"
         ordering = ["-id"]
@@ -44,6 +66,10 @@ class Product(models.Model):
     SKU = models.IntegerField(unique=True, db_index=True)
     description = models.TextField()
     views = models.IntegerField(default=0)
+    search_document = models.TextField(blank=True, default="", editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -61,12 +87,13 @@ class Product(models.Model):
 
 
 class ProductImage(models.Model):
-    image = models.ImageField(
+    image = ContentAddressedImageField(
         null=True,
         blank=True,
-        upload_to=product_image_file_path,
+        upload_to="uploads/",
         max_length=255,
     )
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name="product_images"
     )
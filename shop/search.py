@@ -0,0 +1,133 @@
+import re
+from typing import Iterable
+
+from django.db import connection
+from django.db.models import F, QuerySet
+from django.db.models.expressions import RawSQL
+
+from shop.models import Product
+
+FTS_TABLE = "shop_product_fts"
+
+
+def get_search_terms(value: str) -> list[str]:
+    return re.findall(r"\w+", value.lower())
+
+
+def build_search_document(product: Product) -> str:
+    """
+    Combine the searchable text of a product into one denormalized document.
+    """
+    parts = [product.name, product.description]
+    if product.category is not None:
+        parts.append(product.category.name)
+    attributes = getattr(product, "product_attributes", None)
+    if attributes is not None:
+        parts.extend([attributes.brand, attributes.material, attributes.style])
+    return " ".join(part for part in parts if part)
+
+
+def update_search_documents(product_ids: Iterable[int]) -> None:
+    """
+    Rebuild the search document of the given products.
+
+    The full-text indexes follow the ``search_document`` column: the
+    PostgreSQL GIN index is an expression index and the SQLite FTS5 table
+    is kept in sync by triggers.
+    """
+    products = list(
+        Product.objects.filter(id__in=list(product_ids)).select_related(
+            "category", "product_attributes"
+        )
+    )
+    changed = []
+    for product in products:
+        document = build_search_document(product)
+        if product.search_document != document:
+            product.search_document = document
+            changed.append(product)
+    Product.objects.bulk_update(changed, ["search_document"], batch_size=500)
+
+
+class PostgresProductSearch:
+    """
+    Full-text search over the GIN-indexed ``to_tsvector`` of the search
+    document, combined with trigram similarity of the product name to
+    tolerate typos.
+    """
+
+    config = "simple"
+
+    def search(self, queryset: QuerySet, value: str) -> QuerySet:
+        from django.contrib.postgres.search import (
+            SearchQuery,
+            SearchRank,
+            SearchVector,
+            TrigramWordSimilarity,
+        )
+        from django.db.models import Q
+
+        terms = get_search_terms(value)
+        if not terms:
+            return queryset
+        vector = SearchVector("search_document", config=self.config)
+        query = SearchQuery(
+            " & ".join(f"{term}:*" for term in terms),
+            config=self.config,
+            search_type="raw",
+        )
+        search_text = " ".join(terms)
+        return (
+            queryset.annotate(search=vector)
+            .filter(Q(search=query) | Q(name__trigram_word_similar=search_text))
+            .annotate(
+                search_rank=SearchRank(vector, query)
+                + TrigramWordSimilarity(search_text, "name")
+            )
+            .order_by("-search_rank", "-id")
+        )
+
+
+class SqliteProductSearch:
+    """
+    Full-text search over the SQLite FTS5 table mirroring the search
+    document, ranked by bm25.
+    """
+
+    def search(self, queryset: QuerySet, value: str) -> QuerySet:
+        terms = get_search_terms(value)
+        if not terms:
+            return queryset
+        match = " ".join(f'"{term}"*' for term in terms)
+        rank = RawSQL(
+            f"SELECT bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid = {Product._meta.db_table}.id",
+            [match],
+        )
+        return (
+            queryset.filter(
+                id__in=RawSQL(
+                    f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                    [match],
+                )
+            )
+            .annotate(search_rank=rank)
+            .order_by(F("search_rank").asc(), "-id")
+        )
+
+
+class BasicProductSearch:
+    """Fallback for databases without a supported full-text engine."""
+
+    def search(self, queryset: QuerySet, value: str) -> QuerySet:
+        return queryset.filter(name__icontains=value)
+
+
+def get_product_search() -> (
+    PostgresProductSearch | SqliteProductSearch | BasicProductSearch
+):
+    if connection.vendor == "postgresql":
+        return PostgresProductSearch()
+    if connection.vendor == "sqlite":
+        return SqliteProductSearch()
+    return BasicProductSearch()
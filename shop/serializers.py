@@ -1,5 +1,37 @@
+import json
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from rest_framework import serializers
+from shop.cache import (
+    ORIGIN,
+    OriginPlaceholderRequest,
+    catalog_generations,
+    product_scopes,
+    request_origin,
+)
+from shop.managers import primary_images
 from shop.models import Category, Product, ProductAttributes, ProductImage
+from shop.services import CategoryProductCounts
+from shop.tasks.images import schedule_image_processing
+from utils.expand import ExpandableFieldsSerializerMixin
+from utils.images import ImageHeaderField, SrcsetField, build_srcset
+from utils.media import media_urls
+from utils.sparse_fields import SparseFieldsSerializerMixin
+
+
+def get_primary_image(product: Product) -> ProductImage | None:
+    """
+    Return the first image of a product.
+
+    Uses the image loaded by ``Product.objects.with_primary_image()`` when
+    available and falls back to a query otherwise.
+    """
+    if hasattr(product, "primary_images"):
+        return product.primary_images[0] if product.primary_images else None
+    return product.product_images.first()
 
 
 class CategoryImageSerializer(serializers.ModelSerializer):
@@ -12,19 +44,25 @@ class CategoryImageSerializer(serializers.ModelSerializer):
         if image is not None:
             instance.image = image
             instance.save()
+            schedule_image_processing(instance, "image")
         return instance
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    srcset = SrcsetField("image")
+
     class Meta:
         model = ProductImage
         fields = (
             "id",
             "image",
+            "srcset",
         )
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    image_srcset = SrcsetField("image")
+
     class Meta:
         model = Category
         fields = [
@@ -32,6 +70,17 @@ class CategorySerializer(serializers.ModelSerializer):
             "name",
             "description",
             "image",
+            "image_srcset",
+        ]
+
+
+class CategoryWithCountsSerializer(CategorySerializer):
+    """Category with its denormalized product counts, for the category views."""
+
+    class Meta(CategorySerializer.Meta):
+        fields = CategorySerializer.Meta.fields + [
+            "product_count",
+            "products_with_images_count",
         ]
 
 
@@ -43,28 +92,52 @@ class ProductAttributesSerializer(serializers.ModelSerializer):
 
 class ProductImageUploadSerializer(serializers.Serializer):
     uploaded_images = serializers.ListField(
-        child=serializers.ImageField(
+        child=ImageHeaderField(
             max_length=1000000, allow_empty_file=False, use_url=False
         ),
         write_only=True,
     )
 
+    def validate_uploaded_images(self, images):
+        pixels = sum(image.image_size[0] * image.image_size[1] for image in images)
+        if pixels > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            raise serializers.ValidationError(
+                f"The images have {pixels} pixels in total, "
+                f"the limit is {settings.IMAGE_UPLOAD_MAX_PIXELS}."
+            )
+        return images
+
     def create(self, validated_data):
         images = validated_data["uploaded_images"]
         product = self.context["product"]
         product_images = [
             ProductImage(product=product, image=image) for image in images
         ]
+        had_images = product.product_images.exists()
         ProductImage.objects.bulk_create(product_images)
+        if product_images and not had_images:
+            CategoryProductCounts().add(product.category_id, with_images=1).save()
+        for product_image in product_images:
+            schedule_image_processing(product_image, "image")
+        Product.objects.filter(pk=product.pk).touch()
+        catalog_generations.bump(product_scopes(product.id, product.category_id))
         return product_images
 
     def update(self, instance, validated_data):
-        instance.product_images.all().delete()
         images = validated_data["uploaded_images"]
         product_images = [
             ProductImage(product=instance, image=image) for image in images
         ]
-        ProductImage.objects.bulk_create(product_images)
+        # Files uploaded again are released only if unused after the commit.
+        with transaction.atomic():
+            instance.product_images.all().delete()
+            ProductImage.objects.bulk_create(product_images)
+            if product_images:
+                CategoryProductCounts().add(instance.category_id, with_images=1).save()
+        for product_image in product_images:
+            schedule_image_processing(product_image, "image")
+        Product.objects.filter(pk=instance.pk).touch()
+        catalog_generations.bump(product_scopes(instance.id, instance.category_id))
         return product_images
 
     class Meta:
@@ -74,7 +147,7 @@ class ProductImageUploadSerializer(serializers.Serializer):
         ]
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(ExpandableFieldsSerializerMixin, serializers.ModelSerializer):
     images = serializers.SerializerMethodField()
     category = CategorySerializer(read_only=True)
 
@@ -90,13 +163,222 @@ class ProductSerializer(serializers.ModelSerializer):
             "images",
         ]
         read_only_fields = ["slug"]
+        expandable_fields = {
+            "attributes": (
+                ProductAttributesSerializer,
+                {"source": "product_attributes", "read_only": True},
+            ),
+            "images": (
+                ProductImageSerializer,
+                {"source": "product_images", "many": True, "read_only": True},
+            ),
+            "category": (CategorySerializer, {"read_only": True}),
+        }
 
     def get_images(self, obj):
-        first_image = obj.product_images.first()
+        first_image = get_primary_image(obj)
         return ProductImageSerializer(first_image).data if first_image else None
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductValuesSerializer:
+    """
+    Read-only ``ProductSerializer`` working on ``values()`` rows.
+
+    Builds the same data as ``ProductSerializer(..., many=True).data`` for
+    the hot list endpoints without instantiating models or DRF fields per
+    product: the row is read from the columns listed by ``get_columns`` and
+    the primary images of all the rows are loaded in one extra query. A
+    ``prefix`` reads the product columns through a relation, e.g.
+    ``product__`` for cart items. ``fields`` restricts the output like the
+    ``fields``/``omit`` query parameters.
+
+    The JSON of every product with all its fields is cached as a fragment
+    keyed by the product id and the ``updated_at`` of the product and its
+    category, so only the products changed since they were last served
+    are rendered. Fragments hold ``ORIGIN`` in place of the request host.
+    """
+
+    fields = ProductSerializer.Meta.fields
+    category_fields = CategorySerializer.Meta.fields
+    # Category fields read from a differently named column.
+    category_sources = {"image_srcset": "image_renditions"}
+    price_field = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+    fragment_prefix = "catalog:fragment:product"
+
+    def __init__(
+        self,
+        instance=None,
+        many=True,
+        context=None,
+        fields=None,
+        prefix="",
+        fragments=True,
+    ):
+        assert many, "ProductValuesSerializer only serializes lists of rows."
+        self.instance = instance
+        self.context = context or {}
+        self.prefix = prefix
+        self.fields = [name for name in self.fields if fields is None or name in fields]
+        self.use_fragments = (
+            fragments
+            and bool(settings.PRODUCT_FRAGMENT_CACHE_TIMEOUT)
+            and self.fields == type(self).fields
+        )
+        request = self.context.get("request")
+        self.build_url = request.build_absolute_uri if request is not None else None
+        self.origin = request_origin(request) if request is not None else ""
+        self.storage = ProductImage._meta.get_field("image").storage
+        self.readers = [(name, self.get_reader(name)) for name in self.fields]
+
+    def get_columns(self) -> list[str]:
+        columns = [f"{self.prefix}id"]
+        for name in self.fields:
+            if name == "category":
+                columns.append(f"{self.prefix}category_id")
+                columns.extend(
+                    f"{self.prefix}category__{self.category_sources.get(field, field)}"
+                    for field in self.category_fields
+                    if field != "id"
+                )
+            elif name not in ("id", "images"):
+                columns.append(f"{self.prefix}{name}")
+        if self.use_fragments:
+            columns += [
+                f"{self.prefix}updated_at",
+                f"{self.prefix}category__updated_at",
+            ]
+        return columns
+
+    def values(self, queryset):
+        return queryset.values(*self.get_columns())
+
+    def instance_row(self, instance) -> dict:
+        """Read the ``values()`` row of an already loaded instance."""
+        row = {}
+        for column in self.get_columns():
+            *relations, name = column.split("__")
+            obj = instance
+            for relation in relations:
+                obj = getattr(obj, relation) if obj is not None else None
+            if obj is None:
+                row[column] = None
+                continue
+            field = obj._meta.get_field(name)
+            row[column] = field.get_prep_value(field.value_from_object(obj))
+        return row
+
+    def get_reader(self, name: str):
+        column = f"{self.prefix}{name}"
+        if name == "category":
+            return self.read_category
+        if name == "price":
+            to_representation = self.price_field.to_representation
+            return lambda row: to_representation(row[column])
+        if name == "images":
+            id_column = f"{self.prefix}id"
+            return lambda row: self.primary_images.get(row[id_column])
+        return lambda row: row[column]
+
+    def read_category(self, row: dict) -> dict | None:
+        prefix = f"{self.prefix}category"
+        category_id = row[f"{prefix}_id"]
+        if category_id is None:
+            return None
+        data = {}
+        for field in self.category_fields:
+            if field == "id":
+                data["id"] = category_id
+            elif field == "image":
+                data["image"] = self.image_url(row[f"{prefix}__image"])
+            elif field == "image_srcset":
+                data["image_srcset"] = build_srcset(
+                    row[f"{prefix}__image_renditions"], self.image_url
+                )
+            else:
+                data[field] = row[f"{prefix}__{field}"]
+        return data
+
+    def image_url(self, name: str | None, absolute: bool = True) -> str | None:
+        if not name:
+            return None
+        url = media_urls.url(self.storage, name)
+        return self.build_url(url) if absolute and self.build_url else url
+
+    def load_primary_images(self, rows: list[dict]) -> dict:
+        if "images" not in self.fields or not rows:
+            return {}
+        product_ids = [row[f"{self.prefix}id"] for row in rows]
+        images = primary_images().filter(product_id__in=product_ids)
+        # ProductSerializer.get_images does not pass the request on.
+        relative_url = partial(self.image_url, absolute=False)
+        return {
+            product_id: {
+                "id": image_id,
+                "image": relative_url(image),
+                "srcset": build_srcset(renditions, relative_url),
+            }
+            for image_id, product_id, image, renditions in images.values_list(
+                "id", "product_id", "image", "image_renditions"
+            )
+        }
+
+    def to_representation(self, rows) -> list[dict]:
+        rows = list(rows)
+        if not self.use_fragments:
+            return self.render(rows)
+        keys = [self.fragment_key(row) for row in rows]
+        fragments = cache.get_many(keys)
+        missing = {key: row for key, row in zip(keys, rows) if key not in fragments}
+        if missing:
+            renderer = type(self)(
+                context={"request": OriginPlaceholderRequest()},
+                prefix=self.prefix,
+                fragments=False,
+            )
+            rendered = renderer.render(missing.values())
+            fragments.update(
+                (key, json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+                for key, data in zip(missing, rendered)
+            )
+            cache.set_many(
+                {key: fragments[key] for key in missing},
+                timeout=settings.PRODUCT_FRAGMENT_CACHE_TIMEOUT,
+            )
+        data = "[" + ",".join(fragments[key] for key in keys) + "]"
+        return json.loads(data.replace(ORIGIN, self.origin))
+
+    def fragment_key(self, row: dict) -> str:
+        versions = (
+            row[f"{self.prefix}updated_at"],
+            row[f"{self.prefix}category__updated_at"],
+        )
+        version = "-".join(
+            str(value.timestamp()) if value else "0" for value in versions
+        )
+        return f"{self.fragment_prefix}:{row[f'{self.prefix}id']}:{version}"
+
+    def render(self, rows) -> list[dict]:
+        rows = list(rows)
+        self.primary_images = self.load_primary_images(rows)
+        return [{name: read(row) for name, read in self.readers} for row in rows]
+
+    def serialize(self, queryset) -> list[dict]:
+        """Load the rows of a product queryset and serialize them."""
+        return self.to_representation(self.values(queryset))
+
+    def serialize_instances(self, instances) -> list[dict]:
+        """Serialize loaded instances, e.g. from ``product_repository``."""
+        return self.to_representation(map(self.instance_row, instances))
+
+    @property
+    def data(self) -> list[dict]:
+        if not hasattr(self, "_data"):
+            self._data = self.to_representation(self.instance)
+        return self._data
+
+
+class ProductDetailSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     attributes = ProductAttributesSerializer(
         source="product_attributes", required=False
     )
@@ -165,3 +447,39 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
         if value <= 0:
             raise serializers.ValidationError("Price must be greater than 0.")
         return value
+
+
+class ProductImportSerializer(serializers.Serializer):
+    """Validate one row of a catalog import file."""
+
+    attribute_fields = ("brand", "material", "style", "size")
+
+    name = serializers.CharField(max_length=100)
+    slug = serializers.SlugField(max_length=255, required=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    SKU = serializers.IntegerField()
+    description = serializers.CharField()
+    category = serializers.SlugField(max_length=255, required=False)
+    brand = serializers.CharField(max_length=100, required=False)
+    material = serializers.CharField(max_length=100, required=False)
+    style = serializers.CharField(max_length=100, required=False)
+    size = serializers.IntegerField(required=False)
+
+    def validate_price(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Price must be greater than 0.")
+        return value
+
+    def validate(self, attrs):
+        given = [field for field in self.attribute_fields if field in attrs]
+        if given and len(given) != len(self.attribute_fields):
+            missing = [field for field in self.attribute_fields if field not in attrs]
+            raise serializers.ValidationError(
+                {field: "Required when other attributes are set." for field in missing}
+            )
+        return attrs
+
+
+class CatalogImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=["csv", "jsonl"], required=False)
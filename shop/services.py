@@ -0,0 +1,727 @@
+import copy
+import heapq
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from functools import partial
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.core.validators import slug_re
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.dispatch import receiver
+from django.utils import timezone
+
+from shop.cache import catalog_generations
+from shop.models import Category, Product, ProductImage
+
+
+class LocalViewCounterStore:
+    """
+    Process-local store for pending product views.
+
+    Only suitable for development and tests: the counts are invisible to
+    other processes, including the Celery worker that flushes them, so the
+    process that records the views flushes them itself once
+    ``PRODUCT_VIEWS_FLUSH_INTERVAL`` has passed since the last drain.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(int)
+        self._drained_at = time.monotonic()
+
+    def incr(self, product_id: int, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[product_id] += amount
+
+    def drain(self) -> dict[int, int]:
+        with self._lock:
+            counts, self._counts = dict(self._counts), defaultdict(int)
+            self._drained_at = time.monotonic()
+        return counts
+
+    def claim(self) -> dict[int, int]:
+        return self.drain()
+
+    def release(self, counts: dict[int, int], applied: bool) -> None:
+        if not applied:
+            for product_id, amount in counts.items():
+                self.incr(product_id, amount)
+
+    def flush_due(self, interval: float) -> bool:
+        return time.monotonic() - self._drained_at >= interval
+
+
+class RedisViewCounterStore:
+    """
+    Store for pending product views shared by all workers through Redis.
+
+    Counts live in a single hash. A flush takes a lock, then atomically
+    renames the hash to the flushing hash, so views recorded while it runs
+    end up in the next flush. The flushing hash is only deleted once its
+    views are committed: a flush that failed, or whose worker died, leaves it
+    to be applied by the next one.
+    """
+
+    key = "product_views:pending"
+    flushing_key = "product_views:flushing"
+    lock_key = "product_views:flush_lock"
+    lock_timeout = 300
+
+    # Move the pending views to the flushing hash, unless a failed flush left
+    # views there, and return the flushing hash.
+    claim_script = """
+        if redis.call("exists", KEYS[2]) == 0 then
+            if redis.call("exists", KEYS[1]) == 0 then
+                return {}
+            end
+            redis.call("rename", KEYS[1], KEYS[2])
+        end
+        return redis.call("hgetall", KEYS[2])
+    """
+    unlock_script = """
+        if redis.call("get", KEYS[1]) == ARGV[1] then
+            return redis.call("del", KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+
+        self.client = get_redis_connection("default")
+
+    def incr(self, product_id: int, amount: int = 1) -> None:
+        self.client.hincrby(self.key, product_id, amount)
+
+    def flush_due(self, interval: float) -> bool:
+        # Shared with the Celery worker, which flushes on its own schedule.
+        return False
+
+    def drain(self) -> dict[int, int]:
+        counts = self.claim()
+        if counts:
+            self.release(counts, applied=True)
+        return counts
+
+    def claim(self) -> dict[int, int]:
+        """
+        Take the flush lock and return the views to apply, or nothing while
+        another flush holds the lock.
+        """
+        self.token = uuid.uuid4().hex
+        if not self.client.set(
+            self.lock_key, self.token, nx=True, ex=self.lock_timeout
+        ):
+            return {}
+        fields = self.client.eval(self.claim_script, 2, self.key, self.flushing_key)
+        if not fields:
+            self.client.eval(self.unlock_script, 1, self.lock_key, self.token)
+        return {
+            int(product_id): int(amount)
+            for product_id, amount in zip(fields[::2], fields[1::2])
+        }
+
+    def release(self, counts: dict[int, int], applied: bool) -> None:
+        if applied:
+            self.client.delete(self.flushing_key)
+        self.client.eval(self.unlock_script, 1, self.lock_key, self.token)
+
+
+_local_view_counter_store = LocalViewCounterStore()
+
+
+def uses_redis_cache() -> bool:
+    return "django_redis" in settings.CACHES["default"]["BACKEND"]
+
+
+def get_view_counter_store() -> LocalViewCounterStore | RedisViewCounterStore:
+    if uses_redis_cache():
+        return RedisViewCounterStore()
+    return _local_view_counter_store
+
+
+class ProductViewCounter:
+    """
+    Write-behind counter for product views.
+
+    Views are buffered in the counter store and applied to ``Product.views``
+    by the ``flush_product_views`` task, so reading a product never writes
+    to the database. A process-local store cannot be reached by the task and
+    is flushed by ``register_view`` once the flush interval has passed.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or get_view_counter_store()
+
+    def register_view(self, product_id: int, request=None) -> bool:
+        """
+        Buffer a view of the product.
+
+        When ``PRODUCT_VIEWS_DEDUP_TIMEOUT`` is set, repeated views by the same
+        visitor within the timeout are ignored. Returns whether the view was
+        counted.
+        """
+        if request is not None and not self._is_first_view(product_id, request):
+            return False
+        self.store.incr(product_id)
+        if self.store.flush_due(settings.PRODUCT_VIEWS_FLUSH_INTERVAL):
+            self.flush()
+        return True
+
+    def flush(self) -> int:
+        """
+        Apply the buffered views to the database as batched increments.
+
+        Products with the same number of pending views are updated by one
+        query. Returns the number of views applied.
+        """
+        counts = self.store.claim()
+        if not counts:
+            return 0
+
+        try:
+            self._apply(counts)
+        except Exception:
+            self.store.release(counts, applied=False)
+            raise
+        transaction.on_commit(partial(self.store.release, counts, applied=True))
+
+        PopularProductsRanking().update_many(
+            Product.objects.filter(id__in=counts).values_list(
+                "id", "category_id", "views"
+            )
+        )
+        # Views are updated without signals: only the ranking changed.
+        catalog_generations.bump(["popular"])
+        return sum(counts.values())
+
+    @staticmethod
+    def _apply(counts: dict[int, int]) -> None:
+        products_by_amount = defaultdict(list)
+        for product_id, amount in counts.items():
+            products_by_amount[amount].append(product_id)
+        with transaction.atomic():
+            for amount, product_ids in products_by_amount.items():
+                Product.objects.filter(id__in=product_ids).update(
+                    views=F("views") + amount
+                )
+
+    @staticmethod
+    def _get_visitor_key(request) -> Optional[str]:
+        if request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        session_key = request.session.session_key
+        if session_key:
+            return f"session:{session_key}"
+        return None
+
+    def _is_first_view(self, product_id: int, request) -> bool:
+        timeout = settings.PRODUCT_VIEWS_DEDUP_TIMEOUT
+        visitor_key = self._get_visitor_key(request)
+        if not timeout or visitor_key is None:
+            return True
+        return cache.add(
+            f"product_views:seen:{visitor_key}:{product_id}", 1, timeout=timeout
+        )
+
+
+class LocalRankingStore:
+    """
+    Process-local store for the popular products ranking.
+
+    Only suitable for development and tests, like ``LocalViewCounterStore``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._scores = defaultdict(dict)
+        self._categories = {}
+        self._built = False
+
+    def set_scores(self, rows: Iterable[tuple[int, Optional[int], int]]) -> None:
+        with self._lock:
+            for product_id, category_id, views in rows:
+                self._discard_category(product_id, category_id)
+                self._scores[None][product_id] = views
+                if category_id is not None:
+                    self._scores[category_id][product_id] = views
+                self._categories[product_id] = category_id
+
+    def remove(self, product_id: int) -> None:
+        with self._lock:
+            self._discard_category(product_id, None)
+            self._scores[None].pop(product_id, None)
+            self._categories.pop(product_id, None)
+
+    def top(self, limit: int, category_id: Optional[int] = None) -> list[int]:
+        with self._lock:
+            scores = list(self._scores.get(category_id, {}).items())
+        return [
+            product_id
+            for product_id, _ in heapq.nlargest(
+                limit, scores, key=lambda item: (item[1], item[0])
+            )
+        ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scores.clear()
+            self._categories.clear()
+            self._built = False
+
+    def mark_built(self) -> None:
+        self._built = True
+
+    def is_built(self) -> bool:
+        return self._built
+
+    def _discard_category(self, product_id: int, category_id: Optional[int]) -> None:
+        previous = self._categories.get(product_id)
+        if previous is not None and previous != category_id:
+            self._scores[previous].pop(product_id, None)
+
+
+class RedisRankingStore:
+    """
+    Store for the popular products ranking kept in Redis sorted sets.
+
+    There is one sorted set for the whole catalog and one per category,
+    plus a hash remembering the category of every ranked product.
+
+    Members are zero-padded ids: Redis orders equal scores by member, so the
+    padding makes ties rank by descending id, like ``check`` and the
+    database fallback do.
+    """
+
+    prefix = "product_ranking:v2"
+    categories_key = "product_ranking:v2:categories"
+    built_key = "product_ranking:v2:built"
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+
+        self.client = get_redis_connection("default")
+
+    def _key(self, category_id: Optional[int] = None) -> str:
+        if category_id is None:
+            return f"{self.prefix}:all"
+        return f"{self.prefix}:category:{category_id}"
+
+    @staticmethod
+    def _member(product_id: int) -> str:
+        return f"{product_id:020d}"
+
+    def set_scores(self, rows: Iterable[tuple[int, Optional[int], int]]) -> None:
+        rows = list(rows)
+        if not rows:
+            return
+        previous_categories = self.client.hmget(
+            self.categories_key, [product_id for product_id, _, _ in rows]
+        )
+        pipe = self.client.pipeline()
+        for (product_id, category_id, views), previous in zip(
+            rows, previous_categories
+        ):
+            member = self._member(product_id)
+            if previous is not None and int(previous) != category_id:
+                pipe.zrem(self._key(int(previous)), member)
+            pipe.zadd(self._key(), {member: views})
+            if category_id is None:
+                pipe.hdel(self.categories_key, product_id)
+            else:
+                pipe.zadd(self._key(category_id), {member: views})
+                pipe.hset(self.categories_key, product_id, category_id)
+        pipe.execute()
+
+    def remove(self, product_id: int) -> None:
+        previous = self.client.hget(self.categories_key, product_id)
+        member = self._member(product_id)
+        pipe = self.client.pipeline()
+        if previous is not None:
+            pipe.zrem(self._key(int(previous)), member)
+        pipe.zrem(self._key(), member)
+        pipe.hdel(self.categories_key, product_id)
+        pipe.execute()
+
+    def top(self, limit: int, category_id: Optional[int] = None) -> list[int]:
+        product_ids = self.client.zrevrange(self._key(category_id), 0, limit - 1)
+        return [int(product_id) for product_id in product_ids]
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(f"{self.prefix}:*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def mark_built(self) -> None:
+        self.client.set(self.built_key, 1)
+
+    def is_built(self) -> bool:
+        return bool(self.client.exists(self.built_key))
+
+
+_local_ranking_store = LocalRankingStore()
+
+
+def get_ranking_store() -> LocalRankingStore | RedisRankingStore:
+    if uses_redis_cache():
+        return RedisRankingStore()
+    return _local_ranking_store
+
+
+class PopularProductsRanking:
+    """
+    Maintained ranking of products by views, globally and per category.
+
+    The ranking is updated when buffered views are flushed and when
+    products are saved or deleted, so the ``popular`` endpoint does not
+    need to sort the product table. Those updates only cover the products
+    they touch: the ranking is complete, and ``is_built``, once ``rebuild``
+    loaded every product into the store.
+    """
+
+    limit = 30
+
+    def __init__(self, store=None):
+        self.store = store or get_ranking_store()
+
+    def top(self, category_id: Optional[int] = None) -> list[int]:
+        return self.store.top(self.limit, category_id)
+
+    def is_built(self) -> bool:
+        return self.store.is_built()
+
+    def update(self, product: Product) -> None:
+        self.store.set_scores([(product.id, product.category_id, product.views)])
+
+    def update_many(self, rows: Iterable[tuple[int, Optional[int], int]]) -> None:
+        self.store.set_scores(rows)
+
+    def remove(self, product_id: int) -> None:
+        self.store.remove(product_id)
+
+    def rebuild(self, batch_size: int = 1000) -> int:
+        """
+        Reload the ranking of every product from the database.
+        """
+        self.store.clear()
+        rows = Product.objects.values_list("id", "category_id", "views")
+        batch = []
+        count = 0
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                self.store.set_scores(batch)
+                count += len(batch)
+                batch = []
+        self.store.set_scores(batch)
+        self.store.mark_built()
+        catalog_generations.bump(["popular"])
+        return count + len(batch)
+
+    def check(self, category_id: Optional[int] = None) -> list[int]:
+        """
+        Compare the ranked top products with the database.
+
+        Returns the ids of the products whose rank differs from the order
+        of the database top list; an empty list means the ranking is
+        consistent.
+        """
+        products = Product.objects.order_by("-views", "-id")
+        if category_id is not None:
+            products = products.filter(category_id=category_id)
+        expected = list(products.values_list("id", flat=True)[: self.limit])
+        ranked = self.top(category_id)
+        return [
+            product_id
+            for position, product_id in enumerate(expected)
+            if position >= len(ranked) or ranked[position] != product_id
+        ]
+
+
+class CategoryProductCounts:
+    """
+    Changes of the denormalized product counts of categories.
+
+    ``Category.product_count`` and ``products_with_images_count`` are
+    updated with the accumulated deltas in ``save``, through ``F()``
+    expressions so concurrent changes add up. The signals of products and
+    images keep them up to date; code writing products or images in bulk
+    records its changes itself. ``reconcile`` recounts every category.
+    """
+
+    def __init__(self):
+        self.deltas = defaultdict(lambda: [0, 0])
+
+    def add(
+        self, category_id: Optional[int], products: int = 0, with_images: int = 0
+    ) -> "CategoryProductCounts":
+        if category_id is not None:
+            self.deltas[category_id][0] += products
+            self.deltas[category_id][1] += with_images
+        return self
+
+    def move(
+        self,
+        from_category_id: Optional[int],
+        to_category_id: Optional[int],
+        products: int = 1,
+        with_images: int = 0,
+    ) -> "CategoryProductCounts":
+        if from_category_id != to_category_id:
+            self.add(from_category_id, -products, -with_images)
+            self.add(to_category_id, products, with_images)
+        return self
+
+    def save(self) -> None:
+        changed = {
+            category_id: delta
+            for category_id, delta in self.deltas.items()
+            if any(delta)
+        }
+        self.deltas.clear()
+        if not changed:
+            return
+        now = timezone.now()
+        for category_id, (products, with_images) in changed.items():
+            Category.objects.filter(pk=category_id).update(
+                product_count=F("product_count") + products,
+                products_with_images_count=F("products_with_images_count")
+                + with_images,
+                updated_at=now,
+            )
+        catalog_generations.bump(["categories"])
+
+    @staticmethod
+    def with_images(product_ids: Iterable[int]) -> set[int]:
+        """The ids of the given products having at least one image."""
+        return set(
+            ProductImage.objects.filter(product_id__in=product_ids)
+            .values_list("product_id", flat=True)
+            .distinct()
+        )
+
+    @staticmethod
+    def reconcile(check: bool = False) -> list[int]:
+        """
+        Recount the products of every category and repair the counts that
+        drifted, unless ``check``. Return the ids of the drifted categories.
+        """
+        categories = Category.objects.annotate(
+            products=Count("product", distinct=True),
+            products_with_images=Count(
+                "product",
+                filter=Q(product__product_images__isnull=False),
+                distinct=True,
+            ),
+        ).only("id", "product_count", "products_with_images_count")
+        drifted = [
+            category
+            for category in categories
+            if (category.product_count, category.products_with_images_count)
+            != (category.products, category.products_with_images)
+        ]
+        if drifted and not check:
+            for category in drifted:
+                category.product_count = category.products
+                category.products_with_images_count = category.products_with_images
+                category.updated_at = timezone.now()
+            Category.objects.bulk_update(
+                drifted,
+                ["product_count", "products_with_images_count", "updated_at"],
+            )
+            catalog_generations.bump(["categories"])
+        return [category.id for category in drifted]
+
+
+class ProductRepository:
+    """
+    Read-through cache of ``Product`` instances by id.
+
+    Lookups go through a process-local LRU of at most ``max_size``
+    products, then the shared cache, then one query for the remaining ids.
+    Entries are versioned by the ``product:<id>`` generation, which the
+    product signals and the bulk writers bump, so every process sees a
+    change at its next lookup; the signals also drop the local entry.
+    Every lookup queries while the generations are not shared by the
+    worker processes.
+    Products are loaded with their category, as it was when the product
+    was cached. The returned instances are copies and can be changed freely.
+    """
+
+    prefix = "catalog:object:product"
+
+    def __init__(self, max_size: Optional[int] = None, timeout: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._products = OrderedDict()
+        self.configure(max_size, timeout)
+
+    def configure(self, max_size: Optional[int] = None, timeout: Optional[int] = None):
+        self.max_size = settings.PRODUCT_CACHE_SIZE if max_size is None else max_size
+        self.timeout = settings.PRODUCT_CACHE_TIMEOUT if timeout is None else timeout
+        self.clear()
+
+    def _key(self, product_id: int, generation: int) -> str:
+        return f"{self.prefix}:{product_id}:{generation}"
+
+    def get(self, product_id: int) -> Product:
+        """Return the product, or raise ``Product.DoesNotExist``."""
+        product = self.get_many([product_id]).get(int(product_id))
+        if product is None:
+            raise Product.DoesNotExist("Product matching query does not exist.")
+        return product
+
+    def get_many(self, product_ids: Iterable[int]) -> dict[int, Product]:
+        """Return ``{id: product}`` for the given ids, skipping unknown ones."""
+        product_ids = list(dict.fromkeys(int(id) for id in product_ids))
+        if not product_ids:
+            return {}
+        if not catalog_generations.is_shared():
+            products = Product.objects.select_related("category").in_bulk(product_ids)
+            return {id: products[id] for id in product_ids if id in products}
+        generations = dict(
+            zip(
+                product_ids,
+                catalog_generations.get(f"product:{id}" for id in product_ids),
+            )
+        )
+        products = {}
+        with self._lock:
+            for product_id in product_ids:
+                entry = self._products.get(product_id)
+                if entry is not None and entry[0] == generations[product_id]:
+                    self._products.move_to_end(product_id)
+                    products[product_id] = entry[1]
+
+        missing = {
+            self._key(id, generations[id]): id
+            for id in product_ids
+            if id not in products
+        }
+        if missing:
+            cached = cache.get_many(missing)
+            found = {missing[key]: product for key, product in cached.items()}
+            queried = Product.objects.select_related("category").in_bulk(
+                [id for id in missing.values() if id not in found]
+            )
+            if queried:
+                cache.set_many(
+                    {self._key(id, generations[id]): p for id, p in queried.items()},
+                    self.timeout,
+                )
+            found.update(queried)
+            self._remember(found, generations)
+            products.update(found)
+        return {id: copy.copy(products[id]) for id in product_ids if id in products}
+
+    def _remember(self, products: dict[int, Product], generations: dict) -> None:
+        if not self.max_size:
+            return
+        with self._lock:
+            for product_id, product in products.items():
+                self._products[product_id] = (generations[product_id], product)
+                self._products.move_to_end(product_id)
+            while len(self._products) > self.max_size:
+                self._products.popitem(last=False)
+
+    def invalidate(self, *product_ids: int) -> None:
+        with self._lock:
+            for product_id in product_ids:
+                self._products.pop(product_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._products.clear()
+
+
+product_repository = ProductRepository()
+
+
+@receiver(setting_changed)
+def reconfigure_product_repository(setting, **kwargs):
+    if setting in ("PRODUCT_CACHE_SIZE", "PRODUCT_CACHE_TIMEOUT"):
+        product_repository.configure()
+
+
+# Largest value of the BigAutoField primary keys.
+MAX_ID = 2**63 - 1
+
+
+class SlugIndex:
+    """
+    Map of the slugs of a model to ids, kept in the shared cache.
+
+    Slug routes and filters resolve through it with a single cache read,
+    like the pk routes. The model signals and the bulk writers keep it up
+    to date, ``warm`` loads every slug at startup, and a slug missing from
+    the cache, e.g. evicted, is looked up in the database and cached again.
+    """
+
+    def __init__(self, model, name: str):
+        self.model = model
+        self.prefix = f"catalog:slug:{name}"
+
+    def _key(self, slug: str) -> str:
+        return f"{self.prefix}:{slug}"
+
+    def resolve(self, slug: str) -> Optional[int]:
+        return self.resolve_many([slug]).get(slug)
+
+    def resolve_many(self, slugs: Iterable[str]) -> dict[str, int]:
+        """Return ``{slug: id}`` for the given slugs, skipping unknown ones."""
+        keys = {self._key(slug): slug for slug in slugs if slug_re.match(slug)}
+        if not keys:
+            return {}
+        ids = {keys[key]: id for key, id in cache.get_many(keys).items()}
+        missing = [slug for slug in keys.values() if slug not in ids]
+        if missing:
+            found = dict(
+                self.model.objects.filter(slug__in=missing).values_list("slug", "id")
+            )
+            self.set_many(found)
+            ids.update(found)
+        return ids
+
+    def resolve_key(self, value: str) -> Optional[int]:
+        """
+        Resolve a query parameter holding an id or a slug. Digits are an id,
+        or a slug when no row has that id.
+        """
+        if (
+            value.isdigit()
+            and int(value) <= MAX_ID
+            and self.model.objects.filter(pk=value).exists()
+        ):
+            return int(value)
+        return self.resolve(value)
+
+    def set_many(self, ids: dict[str, int]) -> None:
+        if ids:
+            cache.set_many(
+                {self._key(slug): id for slug, id in ids.items()}, timeout=None
+            )
+
+    def discard(self, *slugs: str) -> None:
+        cache.delete_many([self._key(slug) for slug in slugs])
+
+    def warm(self, batch_size: int = 1000) -> int:
+        ids, count = {}, 0
+        for slug, id in self.model.objects.values_list("slug", "id").iterator(
+            chunk_size=batch_size
+        ):
+            ids[slug] = id
+            if len(ids) == batch_size:
+                self.set_many(ids)
+                count += len(ids)
+                ids = {}
+        self.set_many(ids)
+        return count + len(ids)
+
+
+product_slugs = SlugIndex(Product, "product")
+category_slugs = SlugIndex(Category, "category")
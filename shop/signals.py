@@ -0,0 +1,205 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from shop.cache import (
+    catalog_changed,
+    catalog_generations,
+    category_scopes,
+    product_scopes,
+)
+from shop.models import Category, Product, ProductAttributes, ProductImage
+from shop.search import update_search_documents
+from shop.services import (
+    CategoryProductCounts,
+    PopularProductsRanking,
+    category_slugs,
+    product_repository,
+    product_slugs,
+)
+from shop.tasks.snapshot import schedule_snapshot_rebuild
+
+SLUG_INDEXES = {Product: product_slugs, Category: category_slugs}
+
+
+@receiver(post_save, sender=Product)
+def update_product_ranking(sender, instance, **kwargs):
+    PopularProductsRanking().update(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_ranking(sender, instance, **kwargs):
+    PopularProductsRanking().remove(instance.id)
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_document(sender, instance, **kwargs):
+    update_search_documents([instance.id])
+
+
+@receiver(post_save, sender=ProductAttributes)
+@receiver(post_delete, sender=ProductAttributes)
+def update_attributes_search_document(sender, instance, **kwargs):
+    update_search_documents([instance.product_id])
+
+
+@receiver(post_save, sender=Category)
+def update_category_search_documents(sender, instance, **kwargs):
+    update_search_documents(instance.product_set.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=Category)
+def collect_category_products(sender, instance, **kwargs):
+    instance.deleted_product_ids = list(
+        instance.product_set.values_list("id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Category)
+def update_deleted_category_search_documents(sender, instance, **kwargs):
+    update_search_documents(getattr(instance, "deleted_product_ids", []))
+
+
+@receiver(pre_save, sender=Product)
+def collect_previous_category(sender, instance, **kwargs):
+    previous = (
+        Product.objects.filter(pk=instance.pk)
+        .values_list("category_id", "slug")
+        .first()
+        if instance.pk
+        else None
+    )
+    instance.previous_category_id, instance.previous_slug = previous or (None, None)
+
+
+@receiver(pre_save, sender=Category)
+def collect_previous_category_slug(sender, instance, **kwargs):
+    instance.previous_slug = (
+        Category.objects.filter(pk=instance.pk).values_list("slug", flat=True).first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def index_saved_slug(sender, instance, **kwargs):
+    slugs = SLUG_INDEXES[sender]
+    previous_slug = getattr(instance, "previous_slug", None)
+    if previous_slug not in (None, instance.slug):
+        slugs.discard(previous_slug)
+    slugs.set_many({instance.slug: instance.id})
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def unindex_deleted_slug(sender, instance, **kwargs):
+    SLUG_INDEXES[sender].discard(instance.slug)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def bump_product_generations(sender, instance, **kwargs):
+    catalog_generations.bump(
+        product_scopes(
+            instance.id,
+            instance.category_id,
+            getattr(instance, "previous_category_id", None),
+        )
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_cached_product(sender, instance, **kwargs):
+    product_repository.invalidate(instance.id)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductAttributes)
+@receiver(post_delete, sender=ProductAttributes)
+def bump_product_content_generations(sender, instance, **kwargs):
+    category_id = (
+        Product.objects.filter(pk=instance.product_id)
+        .values_list("category_id", flat=True)
+        .first()
+    )
+    catalog_generations.bump(product_scopes(instance.product_id, category_id))
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductAttributes)
+@receiver(post_delete, sender=ProductAttributes)
+def touch_product(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id).touch()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_category_generations(sender, instance, **kwargs):
+    catalog_generations.bump(category_scopes(instance.id))
+
+
+@receiver(post_save, sender=Product)
+def count_saved_product(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        CategoryProductCounts().add(instance.category_id, products=1).save()
+        return
+    previous_category_id = getattr(instance, "previous_category_id", None)
+    if previous_category_id == instance.category_id:
+        return
+    with_images = int(instance.product_images.exists())
+    CategoryProductCounts().move(
+        previous_category_id, instance.category_id, with_images=with_images
+    ).save()
+
+
+@receiver(post_delete, sender=Product)
+def count_deleted_product(sender, instance, **kwargs):
+    # The images are deleted first, they already counted themselves out.
+    CategoryProductCounts().add(instance.category_id, products=-1).save()
+
+
+@receiver(post_save, sender=ProductImage)
+def count_first_product_image(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    if (
+        ProductImage.objects.filter(product_id=instance.product_id)
+        .exclude(pk=instance.pk)
+        .exists()
+    ):
+        return
+    CategoryProductCounts().add(instance.product.category_id, with_images=1).save()
+
+
+@receiver(post_delete, sender=ProductImage)
+def count_last_product_image(sender, instance, origin=None, **kwargs):
+    # Images deleted together are all gone when the first signal is sent,
+    # so only the first one of each product counts.
+    counted = getattr(origin, "counted_image_products", None)
+    if counted is None:
+        counted = set()
+        if origin is not None:
+            origin.counted_image_products = counted
+    if instance.product_id in counted:
+        return
+    counted.add(instance.product_id)
+    if ProductImage.objects.filter(product_id=instance.product_id).exists():
+        return
+    category_id = (
+        Product.objects.filter(pk=instance.product_id)
+        .values_list("category_id", flat=True)
+        .first()
+    )
+    CategoryProductCounts().add(category_id, with_images=-1).save()
+
+
+@receiver(catalog_changed)
+def rebuild_catalog_snapshot(sender, scopes, **kwargs):
+    # Only the scopes the snapshot freshness is checked against.
+    if set(scopes) & {"products", "categories"}:
+        schedule_snapshot_rebuild()
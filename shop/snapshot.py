@@ -0,0 +1,225 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+from django.conf import settings
+
+from shop.cache import (
+    ORIGIN,
+    OriginPlaceholderRequest,
+    catalog_generations,
+    request_origin,
+)
+from shop.models import Product
+from shop.serializers import ProductDetailSerializer, ProductValuesSerializer
+
+# Magic, format version, generations of the products and categories scopes
+# the snapshot was built at, number of products.
+HEADER = struct.Struct("<4sHQQI")
+# Product id, offset and length of the list record, of the detail record.
+ENTRY = struct.Struct("<QQIQI")
+MAGIC = b"CTLG"
+VERSION = 1
+SCOPES = ["products", "categories"]
+RECORD_KINDS = ("list", "detail")
+
+
+class CatalogSnapshotBuilder:
+    """
+    Write the public data of every product to a snapshot file.
+
+    For every product the file holds the JSON of its list representation
+    (``ProductValuesSerializer``, as served by the list, popular and latest
+    endpoints) and of its detail representation (``ProductDetailSerializer``),
+    behind an index sorted by product id. The file is written next to the
+    target and renamed over it, so readers see either snapshot in full.
+    """
+
+    def __init__(self, path: Optional[str] = None, chunk_size: int = 500):
+        self.path = path or settings.CATALOG_SNAPSHOT_PATH
+        self.chunk_size = chunk_size
+
+    def build(self) -> int:
+        # Generations read first: a change during the build makes the
+        # snapshot stale instead of silently missing from it.
+        generations = catalog_generations.get(SCOPES)
+        entries, blobs, offset = [], [], 0
+        for chunk in self.iter_chunks():
+            for product_id, (list_record, detail_record) in chunk:
+                entries.append(
+                    (product_id, offset, len(list_record), len(detail_record))
+                )
+                blobs.extend((list_record, detail_record))
+                offset += len(list_record) + len(detail_record)
+
+        header = HEADER.pack(MAGIC, VERSION, *generations, len(entries))
+        data_start = HEADER.size + ENTRY.size * len(entries)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file:
+            try:
+                file.write(header)
+                for product_id, offset, list_length, detail_length in entries:
+                    list_offset = data_start + offset
+                    file.write(
+                        ENTRY.pack(
+                            product_id,
+                            list_offset,
+                            list_length,
+                            list_offset + list_length,
+                            detail_length,
+                        )
+                    )
+                file.writelines(blobs)
+                file.flush()
+                os.fsync(file.fileno())
+            except BaseException:
+                os.unlink(file.name)
+                raise
+        os.chmod(file.name, 0o644)
+        os.replace(file.name, self.path)
+        return len(entries)
+
+    def iter_chunks(self):
+        """Yield ``(product_id, (list_record, detail_record))`` by chunks."""
+        context = {"request": OriginPlaceholderRequest()}
+        product_ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+        for start in range(0, len(product_ids), self.chunk_size):
+            chunk_ids = product_ids[start : start + self.chunk_size]
+            products = (
+                Product.objects.filter(id__in=chunk_ids)
+                .order_by("id")
+                .select_related("category", "product_attributes")
+                .prefetch_related("product_images")
+            )
+            list_data = ProductValuesSerializer(context=context).serialize(
+                Product.objects.filter(id__in=chunk_ids).order_by("id")
+            )
+            detail_data = ProductDetailSerializer(
+                products, many=True, context=context
+            ).data
+            yield [
+                (item["id"], (self.encode(item), self.encode(detail)))
+                for item, detail in zip(list_data, detail_data)
+            ]
+
+    @staticmethod
+    def encode(data) -> bytes:
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class ProductIds:
+    """Sequence of the product ids of the snapshot index, for bisect."""
+
+    def __init__(self, buffer, count: int):
+        self.buffer = buffer
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, position: int) -> int:
+        return ENTRY.unpack_from(self.buffer, HEADER.size + position * ENTRY.size)[0]
+
+
+class CatalogSnapshot:
+    """
+    Read-only view of a snapshot file, mapped in memory.
+
+    The pages of the file live in the OS page cache and are shared by all
+    the worker processes mapping it. A rebuild replaces the file: the old
+    mapping stays valid for the requests using it and is unmapped once
+    unreferenced.
+    """
+
+    def __init__(self, buffer):
+        magic, version, *generations, count = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a catalog snapshot of the current version.")
+        self.buffer = buffer
+        self.generations = generations
+        self.ids = ProductIds(buffer, count)
+
+    @classmethod
+    def open(cls, path: str) -> "CatalogSnapshot":
+        with open(path, "rb") as file:
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def is_fresh(self) -> bool:
+        return self.generations == catalog_generations.get(SCOPES)
+
+    def get_record(self, product_id: int, kind: str = "list") -> Optional[bytes]:
+        position = bisect_left(self.ids, product_id)
+        if position == len(self.ids) or self.ids[position] != product_id:
+            return None
+        entry = ENTRY.unpack_from(self.buffer, HEADER.size + position * ENTRY.size)
+        index = RECORD_KINDS.index(kind)
+        offset, length = entry[1 + 2 * index], entry[2 + 2 * index]
+        return self.buffer[offset : offset + length]
+
+    def load(self, product_ids: Iterable[int], origin: str, kind: str = "list"):
+        """
+        Return the records of the products as a list, skipping unknown ids,
+        with their URLs made absolute with ``origin``.
+        """
+        records = filter(None, (self.get_record(id, kind) for id in product_ids))
+        data = b"[" + b",".join(records) + b"]"
+        return json.loads(data.replace(ORIGIN.encode(), origin.encode()))
+
+
+_snapshot = None
+_snapshot_key = None
+_snapshot_lock = threading.Lock()
+
+
+def get_catalog_snapshot() -> Optional[CatalogSnapshot]:
+    """
+    Return the catalog snapshot if it is up to date with the catalog,
+    ``None`` when it is stale, missing or disabled. Its freshness is
+    checked against the catalog generations, so it is disabled while they
+    are not shared by the worker processes. The file is mapped again when
+    a rebuild replaced it.
+    """
+    global _snapshot, _snapshot_key
+    path = settings.CATALOG_SNAPSHOT_PATH
+    if not path or not catalog_generations.is_shared():
+        return None
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _snapshot_lock:
+        if key != _snapshot_key:
+            try:
+                _snapshot = CatalogSnapshot.open(path)
+            except (OSError, ValueError, struct.error):
+                _snapshot = None
+            _snapshot_key = key
+        snapshot = _snapshot
+    return snapshot if snapshot is not None and snapshot.is_fresh() else None
+
+
+class SnapshotProductSerializer:
+    """
+    Serve product records from the catalog snapshot, given product ids or
+    ``values("id")`` rows. Like ``ProductValuesSerializer`` it is only used
+    for reads and exposes ``data``.
+    """
+
+    def __init__(self, instance=None, many=True, context=None, snapshot=None):
+        self.instance = instance
+        self.context = context or {}
+        self.snapshot = snapshot
+
+    @property
+    def data(self) -> list[dict]:
+        product_ids = [
+            row["id"] if isinstance(row, dict) else row for row in self.instance
+        ]
+        return self.snapshot.load(product_ids, request_origin(self.context["request"]))
@@ -0,0 +1,4 @@
+from shop.tasks.product_views import flush_product_views
+from shop.tasks.images import process_image
+from shop.tasks.media import collect_orphaned_media
+from shop.tasks.snapshot import rebuild_catalog_snapshot
@@ -0,0 +1,32 @@
+from functools import partial
+
+from celery import shared_task
+from django.apps import apps
+from django.db import transaction
+from PIL import Image
+
+from utils.images import process_image_field
+
+
+@shared_task
+def process_image(model_label: str, pk: int, field_name: str) -> dict:
+    """Normalize an uploaded image and generate its renditions."""
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not getattr(instance, field_name):
+        return {}
+    try:
+        return process_image_field(instance, field_name)
+    except (OSError, Image.DecompressionBombError):
+        # Only the header is validated on upload, an undecodable image keeps
+        # being served as uploaded, without renditions.
+        return {}
+
+
+def schedule_image_processing(instance, field_name: str) -> None:
+    """Queue the processing of an uploaded image once the upload is committed."""
+    transaction.on_commit(
+        partial(
+            process_image.delay, instance._meta.label_lower, instance.pk, field_name
+        )
+    )
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from utils.media import OrphanedMediaCollector
+
+
+@shared_task
+def collect_orphaned_media(dry_run: bool = False) -> dict:
+    """Delete the stored media files no row references any more."""
+    return OrphanedMediaCollector().collect(dry_run=dry_run)
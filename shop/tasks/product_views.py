@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from shop.services import ProductViewCounter
+
+
+@shared_task
+def flush_product_views() -> int:
+    return ProductViewCounter().flush()
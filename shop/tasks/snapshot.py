@@ -0,0 +1,32 @@
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from shop.snapshot import CatalogSnapshotBuilder
+
+SCHEDULED_KEY = "catalog:snapshot:scheduled"
+
+
+@shared_task
+def rebuild_catalog_snapshot() -> int:
+    """Rebuild the catalog snapshot file read by the storefront views."""
+    # Changes from now on schedule the next rebuild.
+    cache.delete(SCHEDULED_KEY)
+    return CatalogSnapshotBuilder().build()
+
+
+def schedule_snapshot_rebuild() -> None:
+    """
+    Queue a rebuild of the catalog snapshot once the change is committed.
+    Changes within ``CATALOG_SNAPSHOT_REBUILD_DELAY`` share one rebuild.
+    """
+    if not settings.CATALOG_SNAPSHOT_PATH:
+        return
+
+    def schedule():
+        delay = settings.CATALOG_SNAPSHOT_REBUILD_DELAY
+        if cache.add(SCHEDULED_KEY, True, timeout=delay + 60):
+            rebuild_catalog_snapshot.apply_async(countdown=delay)
+
+    transaction.on_commit(schedule)
@@ -0,0 +1,22 @@
+from factory import Faker, Sequence, SubFactory
+from factory.django import DjangoModelFactory
+
+from shop.models import Category, Product
+
+
+class CategoryFactory(DjangoModelFactory):
+    class Meta:
+        model = Category
+
+    name = Sequence(lambda n: f"Section {n}")
+
+
+class ProductFactory(DjangoModelFactory):
+    class Meta:
+        model = Product
+
+    name = Sequence(lambda n: f"Item {n}")
+    category = SubFactory(CategoryFactory)
+    price = Faker("random_number", digits=5)
+    SKU = Sequence(lambda n: 1_000_000 + n)
+    description = Faker("text")
@@ -1,16 +1,65 @@
+import json
+import os
+import tempfile
+import unittest
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage, default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from faker import factory
-from rest_framework.test import APIClient
+from PIL import ExifTags, Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework import status
-from shop.models import Category, Product
+
+from authentication.models import Customer
+from shop.importers import CatalogImporter
+from shop.models import Category, Product, ProductAttributes, ProductImage
 from shop.serializers import (
-    CategorySerializer,
+    CategoryWithCountsSerializer,
     ProductSerializer,
     ProductDetailSerializer,
+    ProductImageUploadSerializer,
+    ProductValuesSerializer,
+)
+from shop.services import (
+    CategoryProductCounts,
+    PopularProductsRanking,
+    ProductViewCounter,
+    RedisRankingStore,
+    RedisViewCounterStore,
+    category_slugs,
+    product_repository,
+    product_slugs,
 )
+from shop.snapshot import CatalogSnapshotBuilder, get_catalog_snapshot
 from django.urls import reverse
+from shop.tests import factories
 from shop.tests.test_model import CategoryFactory, ProductFactory
+from utils.tests.storages import IN_MEMORY_STORAGES, LOCAL_STORAGES
+from utils.images import process_image_field
+from utils.media import (
+    OrphanedMediaCollector,
+    count_references,
+    hash_content,
+    media_urls,
+    reuse_file,
+)
+
+REDIS_CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL"),
+    }
+}
+LOCAL_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
 
 
 class CategoryViewSetTest(TestCase):
@@ -22,18 +71,124 @@ class CategoryViewSetTest(TestCase):
     def test_list_categories(self):
         response = self.client.get(self.category_url)
         categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True)
+        serializer = CategoryWithCountsSerializer(categories, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, serializer.data)
 
     def test_retrieve_category(self):
         url = reverse("category-detail", args=[self.category.id])
         response = self.client.get(url)
-        serializer = CategorySerializer(self.category)
+        serializer = CategoryWithCountsSerializer(self.category)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, serializer.data)
 
 
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class CategoryProductCountsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.shoes = factories.CategoryFactory()
+        self.hats = factories.CategoryFactory(slug="hats")
+        self.product = factories.ProductFactory(category=self.shoes, SKU=1)
+
+    def assertCounts(self, category, product_count, products_with_images_count):
+        category.refresh_from_db()
+        self.assertEqual(
+            (category.product_count, category.products_with_images_count),
+            (product_count, products_with_images_count),
+        )
+
+    def add_image(self, product, name="photo.jpg"):
+        image = SimpleUploadedFile(name, name.encode(), content_type="image/jpeg")
+        return ProductImage.objects.create(product=product, image=image)
+
+    def test_counts_follow_products_and_images(self):
+        self.assertCounts(self.shoes, 1, 0)
+        self.add_image(self.product)
+        self.add_image(self.product, "other.jpg")
+        self.assertCounts(self.shoes, 1, 1)
+
+        self.product.category = self.hats
+        self.product.save()
+        self.assertCounts(self.shoes, 0, 0)
+        self.assertCounts(self.hats, 1, 1)
+
+        self.product.product_images.all().delete()
+        self.assertCounts(self.hats, 1, 0)
+        self.add_image(self.product)
+        self.product.delete()
+        self.assertCounts(self.hats, 0, 0)
+
+    def test_saving_a_stale_category_keeps_its_counts(self):
+        stale = Category.objects.get(pk=self.shoes.pk)
+        self.add_image(self.product)
+        stale.description = "Shoes and boots"
+        stale.save()
+        self.assertCounts(self.shoes, 1, 1)
+
+        Category.objects.filter(pk=self.hats.pk).delete()
+        self.hats.save()
+        self.assertTrue(Category.objects.filter(pk=self.hats.pk).exists())
+
+    def test_bulk_image_upload_and_import_are_counted(self):
+        for _ in range(2):
+            serializer = ProductImageUploadSerializer(
+                self.product,
+                data={"uploaded_images": [ImageProcessingTest.make_image()] * 2},
+            )
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            self.assertCounts(self.shoes, 1, 1)
+
+        CatalogImporter().import_stream(
+            StringIO(
+                '{"SKU": 1, "name": "Boots", "price": 10, "description": "D", '
+                '"category": "hats"}\n'
+                '{"SKU": 2, "name": "Cap", "price": 5, "description": "D", '
+                '"category": "hats"}\n'
+            ),
+            "jsonl",
+        )
+        self.assertCounts(self.shoes, 0, 0)
+        self.assertCounts(self.hats, 2, 1)
+
+    def test_reconcile_repairs_drift(self):
+        Category.objects.filter(pk=self.shoes.pk).update(product_count=7)
+        out = StringIO()
+        call_command("reconcile_category_counts", "--check", stdout=out)
+        self.assertIn(f"differ for categories: {self.shoes.id}", out.getvalue())
+        self.assertCounts(self.shoes, 7, 0)
+
+        call_command("reconcile_category_counts", stdout=out)
+        call_command("reconcile_category_counts", "--check", stdout=out)
+        self.assertCounts(self.shoes, 1, 0)
+        self.assertIn("consistent", out.getvalue())
+
+    def test_category_list_serves_counts_without_extra_queries(self):
+        self.add_image(self.product)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("all_categories"))
+        self.assertEqual(len(queries), 1)
+        counts = {
+            category["id"]: (
+                category["product_count"],
+                category["products_with_images_count"],
+            )
+            for category in response.data
+        }
+        self.assertEqual(counts, {self.shoes.id: (1, 1), self.hats.id: (0, 0)})
+
+
+class InitialDataCountsTest(TestCase):
+    @override_settings(DEBUG=True)
+    def test_migrate_loads_fixtures_with_product_counts(self):
+        call_command("migrate", verbosity=0)
+
+        self.assertTrue(Product.objects.exists())
+        self.assertEqual(CategoryProductCounts.reconcile(check=True), [])
+        self.assertTrue(Category.objects.filter(product_count__gt=0).exists())
+
+
 class ProductViewSetTest(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -86,3 +241,1551 @@ class ProductViewSetTest(TestCase):
         serializer = ProductSerializer(products, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, serializer.data)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class ProductBatchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse("product-list")
+        self.products = factories.ProductFactory.create_batch(4)
+        for product in self.products:
+            ProductImage.objects.create(product=product, image="products/a.jpg")
+        self.counter = ProductViewCounter()
+        self.counter.store.drain()
+
+    def test_returns_products_in_requested_order(self):
+        first, second, third, _ = self.products
+        ids = f"{third.id},{first.slug},{third.id},{second.id}"
+        # Slugs resolve from the cache.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {"ids": ids})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [product["id"] for product in response.data],
+            [third.id, first.id, second.id],
+        )
+        self.assertEqual(
+            response.data[0],
+            ProductValuesSerializer(
+                context={"request": response.wsgi_request}
+            ).serialize(Product.objects.filter(pk=third.pk))[0],
+        )
+        self.assertEqual(self.counter.flush(), 0)
+
+    def test_ids_only_use_one_query_and_one_prefetch(self):
+        ids = ",".join(str(product.id) for product in self.products)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {"ids": ids, "expand": "images"})
+        self.assertEqual(len(response.data), 4)
+
+    def test_unknown_keys_and_digit_slugs(self):
+        first, second, _, _ = self.products
+        second.slug = "123"
+        second.save()
+        ids = f"0,unknown,123,{first.id}"
+        response = self.client.get(self.url, {"ids": ids})
+
+        self.assertEqual(
+            [product["id"] for product in response.data], [second.id, first.id]
+        )
+        response = self.client.get(self.url, {"ids": "9" * 24})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(PRODUCT_BATCH_MAX_IDS=2)
+    def test_rejects_too_many_products(self):
+        ids = ",".join(str(product.id) for product in self.products[:3])
+        response = self.client.get(self.url, {"ids": ids})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CATALOG_CACHE_ALLOW_LOCAL=True)
+class SlugRoutesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.shoes = factories.CategoryFactory(slug="shoes")
+        self.hats = factories.CategoryFactory(slug="hats")
+        self.boot = factories.ProductFactory(slug="boot", category=self.shoes)
+        self.cap = factories.ProductFactory(slug="cap", category=self.hats)
+        self.counter = ProductViewCounter()
+        self.counter.store.drain()
+
+    def test_product_detail_by_slug(self):
+        url = reverse("product-detail-slug", args=["boot"])
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            self.client.get(reverse("product-detail", args=[self.boot.id])).data,
+        )
+        self.assertEqual(self.counter.flush(), 2)
+        # The slug resolves from the cache and the response is the one cached
+        # for the pk route, after the same version query.
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        missing = reverse("product-detail-slug", args=["unknown"])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_category_products_by_slug(self):
+        response = self.client.get(reverse("category-products", args=["hats"]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [product["id"] for product in response.data["items"]], [self.cap.id]
+        )
+        missing = reverse("category-products", args=["unknown"])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_category_filter_accepts_slug_or_id(self):
+        url = reverse("product-list")
+        for value in ("shoes", str(self.shoes.id)):
+            response = self.client.get(url, {"category": value})
+            self.assertEqual(
+                [product["id"] for product in response.data["items"]],
+                [self.boot.id],
+            )
+        response = self.client.get(url, {"category": "unknown"})
+        self.assertEqual(response.data["items"], [])
+
+    def test_category_filter_resolves_digit_slugs(self):
+        digits = factories.CategoryFactory(slug="2024")
+        self.cap.category = digits
+        self.cap.save()
+        url = reverse("product-list")
+        response = self.client.get(url, {"category": "2024"})
+        self.assertEqual(
+            [product["id"] for product in response.data["items"]], [self.cap.id]
+        )
+        # An id takes precedence over a slug made of the same digits.
+        self.shoes.slug = str(digits.id)
+        self.shoes.save()
+        response = self.client.get(url, {"category": str(digits.id)})
+        self.assertEqual(
+            [product["id"] for product in response.data["items"]], [self.cap.id]
+        )
+        response = self.client.get(url, {"category": str(2**64)})
+        self.assertEqual(response.data["items"], [])
+
+    def test_saves_keep_slugs_up_to_date(self):
+        self.boot.slug = "ankle-boot"
+        self.boot.save()
+        self.cap.delete()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                product_slugs.resolve_many(["boot", "ankle-boot", "cap"]),
+                {"ankle-boot": self.boot.id},
+            )
+        category = factories.CategoryFactory(slug="bags")
+        cache.clear()
+        self.assertEqual(category_slugs.warm(), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(category_slugs.resolve("bags"), category.id)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class ProductPrimaryImageQueryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = factories.CategoryFactory()
+        self.product_list_url = reverse("product-list")
+
+    def create_products(self, count):
+        for product in factories.ProductFactory.create_batch(
+            count, category=self.category
+        ):
+            ProductImage.objects.create(product=product, image="first.jpg")
+            ProductImage.objects.create(product=product, image="primary.jpg")
+
+    def test_list_products_query_count_does_not_depend_on_page_size(self):
+        # Count, products, primary images and facet counts.
+        self.create_products(2)
+        with self.assertNumQueries(4):
+            small_page = self.client.get(self.product_list_url)
+
+        self.create_products(8)
+        cache.clear()
+        with self.assertNumQueries(4):
+            full_page = self.client.get(self.product_list_url)
+
+        self.assertEqual(len(small_page.data["items"]), 2)
+        self.assertEqual(len(full_page.data["items"]), 10)
+
+    def test_list_products_returns_latest_image(self):
+        self.create_products(1)
+        response = self.client.get(self.product_list_url)
+        image = ProductImage.objects.filter(image="primary.jpg").get()
+        self.assertEqual(response.data["items"][0]["images"]["id"], image.id)
+
+
+class ProductViewCounterTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.product = factories.ProductFactory()
+        self.counter = ProductViewCounter()
+        self.counter.store.drain()
+        self.product_detail_url = reverse("product-detail", args=[self.product.id])
+
+    def test_retrieve_product_does_not_write_views(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.product_detail_url)
+
+        self.assertFalse(
+            any(query["sql"].startswith("UPDATE") for query in queries.captured_queries)
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views, 0)
+
+    def test_flush_applies_buffered_views(self):
+        other_product = factories.ProductFactory()
+        for _ in range(3):
+            self.client.get(self.product_detail_url)
+        self.client.get(reverse("product-detail", args=[other_product.id]))
+
+        self.assertEqual(self.counter.flush(), 4)
+        self.product.refresh_from_db()
+        other_product.refresh_from_db()
+        self.assertEqual(self.product.views, 3)
+        self.assertEqual(other_product.views, 1)
+        self.assertEqual(self.counter.flush(), 0)
+
+    def test_local_store_is_flushed_by_the_process_recording_views(self):
+        # The Celery worker cannot see a process-local store.
+        self.client.get(self.product_detail_url)
+        with override_settings(PRODUCT_VIEWS_FLUSH_INTERVAL=0):
+            self.client.get(self.product_detail_url)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views, 2)
+        self.assertEqual(self.counter.flush(), 0)
+
+    @override_settings(PRODUCT_VIEWS_DEDUP_TIMEOUT=60)
+    def test_repeated_views_by_same_visitor_are_counted_once(self):
+        user = Customer.objects.create_user(
+            email="test@example.com", password="password"
+        )
+        self.client.force_authenticate(user=user)
+        for _ in range(3):
+            self.client.get(self.product_detail_url)
+
+        self.assertEqual(self.counter.flush(), 1)
+
+
+@override_settings(CATALOG_CACHE_ALLOW_LOCAL=True)
+class ProductRepositoryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        product_repository.clear()
+        self.products = [
+            factories.ProductFactory(name=f"Product {index}") for index in range(3)
+        ]
+        self.ids = [product.id for product in self.products]
+
+    def test_get_many_reads_through_both_levels(self):
+        with self.assertNumQueries(1):
+            products = product_repository.get_many([*self.ids, 0])
+        self.assertEqual(sorted(products), self.ids)
+        self.assertEqual(products[self.ids[0]].name, "Product 0")
+
+        with self.assertNumQueries(0):
+            product_repository.get_many(self.ids)
+        # Another process only has the shared cache.
+        product_repository.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(product_repository.get(self.ids[1]).slug, "product-1")
+        with self.assertNumQueries(1), self.assertRaises(Product.DoesNotExist):
+            product_repository.get(0)
+
+    def test_changes_invalidate_cached_products(self):
+        product_repository.get_many(self.ids)
+        product = self.products[0]
+        product.price = 25
+        product.save()
+        Product.objects.filter(pk=self.ids[1]).delete()
+
+        with self.assertNumQueries(1):
+            products = product_repository.get_many(self.ids)
+        self.assertEqual(sorted(products), [self.ids[0], self.ids[2]])
+        self.assertEqual(products[self.ids[0]].price, 25)
+
+    def test_returns_copies(self):
+        product_repository.get(self.ids[0]).name = "Changed"
+        self.assertEqual(product_repository.get(self.ids[0]).name, "Product 0")
+
+    @override_settings(CACHES=LOCAL_CACHES, CATALOG_CACHE_ALLOW_LOCAL=False)
+    def test_process_local_cache_is_bypassed(self):
+        product_repository.get_many(self.ids)
+        # Changed by another worker process, whose own cache gets the bump.
+        Product.objects.filter(pk=self.ids[0]).update(price=25)
+
+        with self.assertNumQueries(1):
+            products = product_repository.get_many(self.ids)
+        self.assertEqual(products[self.ids[0]].price, 25)
+
+
+class PopularProductsRankingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.ranking = PopularProductsRanking()
+        self.ranking.store.clear()
+        self.category = factories.CategoryFactory()
+        self.other_category = factories.CategoryFactory()
+        self.products = [
+            factories.ProductFactory(
+                category=self.category if index % 2 else self.other_category,
+                views=views,
+            )
+            for index, views in enumerate([5, 50, 20, 0])
+        ]
+        self.popular_url = reverse("product-popular")
+
+    def test_popular_products_are_served_from_ranking(self):
+        self.ranking.rebuild()
+        with self.assertNumQueries(2):
+            response = self.client.get(self.popular_url)
+        ids = [product["id"] for product in response.data]
+        self.assertEqual(ids, [self.products[index].id for index in (1, 2, 0, 3)])
+
+    def test_cached_popular_products_follow_flushed_views(self):
+        self.ranking.rebuild()
+        response = self.client.get(self.popular_url)
+        self.assertEqual(response.data[0]["id"], self.products[1].id)
+
+        counter = ProductViewCounter()
+        counter.store.drain()
+        for _ in range(100):
+            counter.register_view(self.products[3].id)
+        counter.flush()
+        response = self.client.get(self.popular_url)
+        self.assertEqual(response.data[0]["id"], self.products[3].id)
+
+    def test_partial_ranking_is_not_served_until_rebuilt(self):
+        # After a restart, only the products saved since are ranked.
+        self.ranking.store.clear()
+        self.products[3].save()
+        self.assertEqual(self.ranking.top(), [self.products[3].id])
+
+        response = self.client.get(self.popular_url)
+        ids = [product["id"] for product in response.data]
+        self.assertEqual(ids, [self.products[index].id for index in (1, 2, 0, 3)])
+
+    def test_popular_products_by_category(self):
+        self.ranking.rebuild()
+        response = self.client.get(self.popular_url, {"category": self.category.id})
+        ids = [product["id"] for product in response.data]
+        self.assertEqual(ids, [self.products[1].id, self.products[3].id])
+
+    def test_ranking_follows_flushed_views_and_category_changes(self):
+        counter = ProductViewCounter()
+        counter.store.drain()
+        for _ in range(100):
+            counter.register_view(self.products[3].id)
+        counter.flush()
+        self.assertEqual(self.ranking.top()[0], self.products[3].id)
+
+        self.products[3].category = self.other_category
+        self.products[3].views = 100
+        self.products[3].save()
+        self.assertNotIn(self.products[3].id, self.ranking.top(self.category.id))
+        self.assertEqual(
+            self.ranking.top(self.other_category.id)[0], self.products[3].id
+        )
+
+    def test_rebuild_and_check_against_database(self):
+        Product.objects.filter(id=self.products[0].id).update(views=500)
+        self.assertEqual(
+            self.ranking.check(),
+            [self.products[0].id, self.products[1].id, self.products[2].id],
+        )
+
+        out = StringIO()
+        call_command("rebuild_popular_ranking", stdout=out)
+        call_command("rebuild_popular_ranking", "--check", stdout=out)
+        self.assertIn("Ranking is consistent.", out.getvalue())
+
+
+@unittest.skipUnless(os.getenv("REDIS_URL"), "Needs a Redis server in REDIS_URL")
+@override_settings(CACHES=REDIS_CACHES)
+class RedisViewCounterStoreTest(TestCase):
+    def setUp(self):
+        self.store = RedisViewCounterStore()
+        self.clear()
+        self.addCleanup(self.clear)
+        self.product = factories.ProductFactory()
+
+    def clear(self):
+        self.store.client.delete(
+            self.store.key, self.store.flushing_key, self.store.lock_key
+        )
+
+    def test_concurrent_flushes_claim_the_views_once(self):
+        self.store.incr(self.product.id, 3)
+        other = RedisViewCounterStore()
+        self.assertEqual(self.store.claim(), {self.product.id: 3})
+        self.assertEqual(other.claim(), {})
+        self.store.release({self.product.id: 3}, applied=True)
+        self.assertEqual(other.claim(), {})
+
+    def test_views_of_a_failed_flush_are_applied_by_the_next_one(self):
+        counter = ProductViewCounter(self.store)
+        self.store.incr(self.product.id, 2)
+        with patch.object(
+            ProductViewCounter, "_apply", side_effect=DatabaseError
+        ), self.assertRaises(DatabaseError):
+            counter.flush()
+        self.store.incr(self.product.id, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(counter.flush(), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(counter.flush(), 1)
+        self.assertEqual(counter.flush(), 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views, 3)
+
+
+@unittest.skipUnless(os.getenv("REDIS_URL"), "Needs a Redis server in REDIS_URL")
+@override_settings(CACHES=REDIS_CACHES)
+class RedisRankingStoreTest(TestCase):
+    def setUp(self):
+        self.store = RedisRankingStore()
+        self.store.clear()
+        self.addCleanup(self.store.clear)
+        self.ranking = PopularProductsRanking(self.store)
+        self.category = factories.CategoryFactory()
+        for product_id, views in [(9, 0), (10, 0), (100, 0), (11, 5)]:
+            factories.ProductFactory(id=product_id, category=self.category, views=views)
+
+    def test_ties_are_ranked_by_descending_id(self):
+        self.ranking.rebuild()
+        self.assertEqual(self.ranking.top(), [11, 100, 10, 9])
+        self.assertEqual(self.ranking.top(self.category.id), [11, 100, 10, 9])
+        self.assertEqual(self.ranking.check(), [])
+        self.assertEqual(self.ranking.check(self.category.id), [])
+
+    def test_moved_and_removed_products_leave_the_ranking(self):
+        self.ranking.rebuild()
+        other_category = factories.CategoryFactory()
+        self.store.set_scores([(100, other_category.id, 0)])
+        self.store.remove(11)
+        self.assertEqual(self.ranking.top(), [100, 10, 9])
+        self.assertEqual(self.ranking.top(self.category.id), [10, 9])
+        self.assertEqual(self.ranking.top(other_category.id), [100])
+
+
+class ProductSearchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.product_list_url = reverse("product-list")
+        self.category = factories.CategoryFactory(name="Outerwear")
+        self.jacket = factories.ProductFactory(
+            name="Winter jacket",
+            category=self.category,
+            description="Warm jacket for cold days",
+        )
+        self.boots = factories.ProductFactory(
+            name="Hiking boots", description="Boots with a jacket pocket"
+        )
+        ProductAttributes.objects.create(
+            product=self.boots,
+            brand="Trekker",
+            material="Leather",
+            style="Sport",
+            size=42,
+        )
+
+    def search(self, value):
+        response = self.client.get(self.product_list_url, {"name": value})
+        return [product["id"] for product in response.data["items"]]
+
+    def test_search_by_name_prefix_is_ranked_by_relevance(self):
+        self.assertEqual(self.search("jack"), [self.jacket.id, self.boots.id])
+
+    def test_search_by_category_and_attributes(self):
+        self.assertEqual(self.search("outerwear"), [self.jacket.id])
+        self.assertEqual(self.search("trekker leather"), [self.boots.id])
+        self.assertEqual(self.search("sandals"), [])
+
+    def test_search_index_follows_changes(self):
+        self.category.name = "Coats"
+        self.category.save()
+        self.assertEqual(self.search("coats"), [self.jacket.id])
+        self.assertEqual(self.search("outerwear"), [])
+
+        self.boots.product_attributes.brand = "Mountain"
+        self.boots.product_attributes.save()
+        self.assertEqual(self.search("mountain"), [self.boots.id])
+
+        self.jacket.delete()
+        self.assertEqual(self.search("coats"), [])
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES, CATALOG_CACHE_ALLOW_LOCAL=True)
+class CatalogResponseCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = factories.CategoryFactory()
+        self.other_category = factories.CategoryFactory()
+        self.product = factories.ProductFactory(category=self.category)
+        self.product_list_url = reverse("product-list")
+        self.product_detail_url = reverse("product-detail", args=[self.product.id])
+
+    def test_repeated_requests_are_served_from_cache(self):
+        # The product detail reads its row version for conditional requests.
+        for url, queries in [
+            (self.product_list_url, 0),
+            (self.product_detail_url, 1),
+            (reverse("product-popular"), 0),
+            (reverse("product-latest-arrival"), 0),
+            (reverse("category-list"), 0),
+            (reverse("all_categories"), 0),
+        ]:
+            first = self.client.get(url, {"ordering": "price"})
+            with self.assertNumQueries(queries):
+                second = self.client.get(url, {"ordering": "price"})
+            self.assertEqual(first.data, second.data)
+
+    def test_product_changes_invalidate_cached_responses(self):
+        self.client.get(self.product_detail_url)
+        self.client.get(self.product_list_url, {"category": self.category.id})
+        self.client.get(self.product_list_url, {"category": self.other_category.id})
+
+        ProductImage.objects.create(product=self.product, image="image.jpg")
+        response = self.client.get(self.product_detail_url)
+        self.assertEqual(len(response.data["images"]), 1)
+
+        self.product.category = self.other_category
+        self.product.save()
+        response = self.client.get(
+            self.product_list_url, {"category": self.category.id}
+        )
+        self.assertEqual(response.data["items"], [])
+        response = self.client.get(
+            self.product_list_url, {"category": self.other_category.id}
+        )
+        self.assertEqual(len(response.data["items"]), 1)
+
+    def test_category_changes_invalidate_cached_responses(self):
+        self.client.get(reverse("all_categories"))
+        self.client.get(self.product_detail_url)
+
+        self.category.name = "Renamed Category"
+        self.category.save()
+
+        response = self.client.get(reverse("all_categories"))
+        self.assertIn("Renamed Category", [item["name"] for item in response.data])
+        response = self.client.get(self.product_detail_url)
+        self.assertEqual(response.data["category"]["name"], "Renamed Category")
+
+    @override_settings(ALLOWED_HOSTS=["a.example", "b.example"])
+    def test_cached_responses_keep_the_host_of_the_request(self):
+        ProductImage.objects.create(product=self.product, image="image.jpg")
+        for host in ["a.example", "b.example", "a.example"]:
+            response = self.client.get(self.product_detail_url, HTTP_HOST=host)
+            self.assertEqual(
+                response.data["images"][0]["image"], f"http://{host}/image.jpg"
+            )
+
+    def test_cached_product_detail_still_counts_views(self):
+        counter = ProductViewCounter()
+        counter.store.drain()
+        self.client.get(self.product_detail_url)
+        self.client.get(self.product_detail_url)
+        self.assertEqual(counter.flush(), 2)
+
+    @override_settings(CACHES=LOCAL_CACHES, CATALOG_CACHE_ALLOW_LOCAL=False)
+    def test_process_local_cache_serves_fresh_responses(self):
+        self.client.get(self.product_list_url)
+        self.client.get(self.product_detail_url)
+        # Saved by another worker process, whose own cache gets the bump.
+        with patch("shop.signals.catalog_generations.bump"):
+            self.product.name = "Renamed Product"
+            self.product.save()
+
+        response = self.client.get(self.product_list_url)
+        self.assertEqual(response.data["items"][0]["name"], "Renamed Product")
+        # No validators from generations the other processes do not see.
+        self.assertNotIn("ETag", response)
+        response = self.client.get(self.product_detail_url)
+        self.assertEqual(response.data["name"], "Renamed Product")
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES, CATALOG_CACHE_ALLOW_LOCAL=True)
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = factories.CategoryFactory()
+        self.product = factories.ProductFactory(category=self.category)
+        self.urls = [
+            reverse("product-list"),
+            reverse("product-detail", args=[self.product.id]),
+            reverse("category-list"),
+            reverse("category-detail", args=[self.category.id]),
+        ]
+
+    def test_responses_have_validators(self):
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.has_header("ETag"))
+            self.assertTrue(response.has_header("Last-Modified"))
+
+    def test_matching_etag_returns_not_modified(self):
+        # Lists are versioned by the catalog generations, details by their row.
+        for url, queries in zip(self.urls, [0, 1, 0, 1]):
+            etag = self.client.get(url)["ETag"]
+            with self.assertNumQueries(queries):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response["ETag"], etag)
+
+    def test_if_modified_since_returns_not_modified(self):
+        for url in self.urls:
+            last_modified = self.client.get(url)["Last-Modified"]
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_with_catalog(self):
+        etags = [self.client.get(url)["ETag"] for url in self.urls[:2]]
+        ProductImage.objects.create(product=self.product, image="image.jpg")
+        for url, etag in zip(self.urls[:2], etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(response["ETag"], etag)
+
+        etags = [self.client.get(url)["ETag"] for url in self.urls]
+        self.category.name = "Renamed Category"
+        self.category.save()
+        for url, etag in zip(self.urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_not_modified_product_detail_counts_views(self):
+        counter = ProductViewCounter()
+        counter.store.drain()
+        etag = self.client.get(self.urls[1])["ETag"]
+        self.client.get(self.urls[1], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(counter.flush(), 2)
+
+
+class ProductFacetsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product_list_url = reverse("product-list")
+        for index, (brand, material, size, price) in enumerate(
+            [
+                ("Nike", "Leather", 42, 50),
+                ("Nike", "Textile", 43, 150),
+                ("Adidas", "Leather", 42, 120),
+                ("Puma", "Textile", 44, 250),
+            ]
+        ):
+            product = factories.ProductFactory(name=f"Product {index}", price=price)
+            ProductAttributes.objects.create(
+                product=product,
+                brand=brand,
+                material=material,
+                style="Sport",
+                size=size,
+            )
+        factories.ProductFactory(price=10)
+
+    def get_list(self, params):
+        response = self.client.get(self.product_list_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_filter_by_attributes_and_price(self):
+        data = self.get_list({"brand": "Nike,Adidas", "material": "Leather"})
+        self.assertEqual(
+            sorted(item["name"] for item in data["items"]), ["Product 0", "Product 2"]
+        )
+        data = self.get_list({"size": "43,44", "price_min": 100, "price_max": 200})
+        self.assertEqual([item["name"] for item in data["items"]], ["Product 1"])
+
+    def test_facet_counts(self):
+        facets = self.get_list({})["facets"]
+        self.assertEqual(
+            facets["brand"],
+            [
+                {"value": "Nike", "count": 2},
+                {"value": "Adidas", "count": 1},
+                {"value": "Puma", "count": 1},
+            ],
+        )
+        self.assertEqual(facets["style"], [{"value": "Sport", "count": 4}])
+        self.assertEqual(
+            facets["size"],
+            [
+                {"value": 42, "count": 2},
+                {"value": 43, "count": 1},
+                {"value": 44, "count": 1},
+            ],
+        )
+        self.assertEqual(
+            facets["price"],
+            [
+                {"min": "0.00", "max": "100.00", "count": 2},
+                {"min": "100.00", "max": "200.00", "count": 2},
+                {"min": "200.00", "max": "300.00", "count": 1},
+            ],
+        )
+
+    def test_facets_ignore_their_own_filter(self):
+        facets = self.get_list({"brand": "Nike", "material": "Leather"})["facets"]
+        self.assertEqual(
+            facets["brand"],
+            [{"value": "Adidas", "count": 1}, {"value": "Nike", "count": 1}],
+        )
+        self.assertEqual(
+            facets["material"],
+            [{"value": "Leather", "count": 1}, {"value": "Textile", "count": 1}],
+        )
+        self.assertEqual(
+            facets["price"], [{"min": "0.00", "max": "100.00", "count": 1}]
+        )
+
+    def test_facets_are_counted_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_list({"brand": "Nike", "name": "product"})
+        facet_queries = [
+            query["sql"] for query in queries if "UNION ALL" in query["sql"]
+        ]
+        self.assertEqual(len(facet_queries), 1)
+
+
+class CatalogImportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = Customer.objects.create_superuser(
+            email="admin@example.com", password="password"
+        )
+        self.import_url = reverse("product-import-catalog")
+        self.category = factories.CategoryFactory(slug="shoes")
+        self.product = factories.ProductFactory(slug="boots", SKU=1)
+
+    def upload(self, name, content):
+        self.client.force_authenticate(self.admin)
+        return self.client.post(
+            self.import_url,
+            {"file": SimpleUploadedFile(name, content.encode())},
+            format="multipart",
+        )
+
+    def test_import_csv_creates_and_updates_products(self):
+        content = (
+            "SKU,name,price,description,category,brand,material,style,size\n"
+            "1,Boots,120,Leather boots,shoes,Trekker,Leather,Sport,42\n"
+            "2,Boots,80,Summer boots,shoes,,,,\n"
+            "3,Sandals,0,Sandals,shoes,,,,\n"
+            "4,Slippers,10,Slippers,unknown,,,,\n"
+        )
+        response = self.upload("catalog.csv", content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(response.data["error_count"], 2)
+        self.assertEqual(
+            [
+                (error["line"], list(error["errors"]))
+                for error in response.data["errors"]
+            ],
+            [(4, ["price"]), (5, ["category"])],
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, "Boots")
+        self.assertEqual(self.product.category, self.category)
+        self.assertEqual(self.product.product_attributes.brand, "Trekker")
+        created = Product.objects.get(SKU=2)
+        self.assertEqual(created.slug, "boots-2")
+        self.assertIn("Summer boots", created.search_document)
+
+    def test_import_jsonl(self):
+        content = (
+            '{"SKU": 5, "name": "Hat", "price": "15.50", "description": "Hat"}\n'
+            "not json\n"
+            '{"SKU": 6, "name": "Cap", "price": 5, "description": "Cap", '
+            '"brand": "Brand"}\n'
+        )
+        response = self.upload("catalog.jsonl", content)
+
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(
+            [
+                (error["line"], list(error["errors"]))
+                for error in response.data["errors"]
+            ],
+            [(2, ["non_field_errors"]), (3, ["material", "style", "size"])],
+        )
+        self.assertEqual(Product.objects.get(SKU=5).slug, "hat")
+
+    def test_import_requires_admin(self):
+        response = self.client.post(self.import_url, {}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_import_command_writes_in_batches(self):
+        rows = "\n".join(
+            f'{{"SKU": {sku}, "name": "Product {sku}", "price": 10, '
+            f'"description": "Description"}}'
+            for sku in range(10, 30)
+        )
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as file:
+            file.write(rows)
+            file.flush()
+            out = StringIO()
+            with CaptureQueriesContext(connection) as queries:
+                call_command(
+                    "import_catalog", file.name, "--batch-size", "5", stdout=out
+                )
+        self.assertIn("Created 20 and updated 0 products", out.getvalue())
+        self.assertEqual(Product.objects.filter(SKU__gte=10).count(), 20)
+        inserts = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('INSERT INTO "shop_product"')
+        ]
+        self.assertEqual(len(inserts), 4)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class CatalogExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = Customer.objects.create_superuser(
+            email="admin@example.com", password="password"
+        )
+        self.export_url = reverse("product-export-catalog")
+        category = factories.CategoryFactory(slug="shoes")
+        for index in range(3):
+            product = factories.ProductFactory(
+                name=f"Product {index}",
+                category=category,
+                price=10,
+                SKU=index,
+                description="Description",
+            )
+            ProductImage.objects.create(product=product, image=f"{index}.jpg")
+        ProductAttributes.objects.create(
+            product=product, brand="Brand", material="Leather", style="Sport", size=42
+        )
+
+    def export(self, params):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(self.export_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b"".join(response.streaming_content).decode()
+
+    def test_export_csv(self):
+        lines = self.export({}).splitlines()
+        self.assertEqual(
+            lines[0],
+            "SKU,name,slug,price,description,category,brand,material,style,size,images",
+        )
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(
+            lines[3].startswith(
+                "2,Product 2,product-2,10.00,Description,shoes,Brand,Leather,Sport,42,"
+            )
+        )
+
+    def test_export_jsonl_can_be_imported(self):
+        rows = [
+            json.loads(line)
+            for line in self.export({"file_format": "jsonl"}).splitlines()
+        ]
+        self.assertEqual([row["SKU"] for row in rows], [0, 1, 2])
+        self.assertEqual(rows[0]["brand"], None)
+        self.assertEqual(len(rows[0]["images"]), 1)
+
+        content = "".join(json.dumps(row) + "\n" for row in rows)
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(
+            reverse("product-import-catalog"),
+            {"file": SimpleUploadedFile("catalog.jsonl", content.encode())},
+            format="multipart",
+        )
+        self.assertEqual(response.data["updated"], 3)
+        self.assertEqual(response.data["error_count"], 0)
+
+    def test_export_queries_per_chunk(self):
+        # One streamed product query and one image query per chunk.
+        out = StringIO()
+        with self.assertNumQueries(3):
+            call_command("export_catalog", "--chunk-size", "2", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+
+    def test_export_requires_admin(self):
+        response = self.client.get(self.export_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class SparseFieldsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = factories.CategoryFactory(name="Shoes")
+        self.product = factories.ProductFactory(category=self.category)
+        ProductImage.objects.create(product=self.product, image="image.jpg")
+        ProductAttributes.objects.create(
+            product=self.product,
+            brand="Brand",
+            material="Leather",
+            style="Sport",
+            size=42,
+        )
+        self.product_list_url = reverse("product-list")
+        self.product_detail_url = reverse("product-detail", args=[self.product.id])
+
+    def test_list_fields_narrow_the_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                self.product_list_url, {"fields": "id,name,price"}
+            )
+        self.assertEqual(set(response.data["items"][0]), {"id", "name", "price"})
+        product_query = next(
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith(
+                'SELECT "shop_product"."id", "shop_product"."name"'
+            )
+        )
+        self.assertNotIn("shop_category", product_query)
+        self.assertNotIn("description", product_query)
+        self.assertFalse(any("shop_productimage" in query["sql"] for query in queries))
+
+    def test_detail_omit(self):
+        response = self.client.get(
+            self.product_detail_url, {"omit": "images,description"}
+        )
+        self.assertNotIn("images", response.data)
+        self.assertNotIn("description", response.data)
+        self.assertEqual(response.data["attributes"]["brand"], "Brand")
+        self.assertEqual(response.data["category"]["name"], "Shoes")
+
+    def test_detail_loads_relations_in_one_query(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(self.product_detail_url)
+        self.assertEqual(len(response.data["images"]), 1)
+        self.assertEqual(response.data["attributes"]["size"], 42)
+
+    def test_fields_keep_selected_relations(self):
+        # Django 5.1+ rejects relations both deferred and selected.
+        for url, params in (
+            (self.product_detail_url, {"fields": "id,attributes"}),
+            (self.product_detail_url, {"fields": "id,category"}),
+            (self.product_list_url, {"fields": "id", "expand": "attributes"}),
+        ):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, params)
+
+    def test_cursor_pages_with_fields(self):
+        response = self.client.get(
+            self.product_list_url,
+            {"fields": "id", "ordering": "price", "cursor": ""},
+        )
+        self.assertEqual(response.data["items"], [{"id": self.product.id}])
+
+    def test_category_fields(self):
+        response = self.client.get(reverse("category-list"), {"fields": "name"})
+        self.assertEqual(response.data["items"], [{"name": "Shoes"}])
+
+    def test_unknown_field(self):
+        response = self.client.get(self.product_list_url, {"omit": "password"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class ProductExpandTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product_list_url = reverse("product-list")
+        category = factories.CategoryFactory(name="Shoes")
+        for index in range(3):
+            product = factories.ProductFactory(category=category)
+            ProductImage.objects.create(product=product, image=f"{index}-1.jpg")
+            ProductImage.objects.create(product=product, image=f"{index}-2.jpg")
+            ProductAttributes.objects.create(
+                product=product,
+                brand=f"Brand {index}",
+                material="Leather",
+                style="Sport",
+                size=42,
+            )
+
+    def get_items(self, params):
+        response = self.client.get(self.product_list_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["items"]
+
+    def test_expand_attributes_and_images(self):
+        items = self.get_items({"expand": "attributes,images,category"})
+        self.assertEqual(items[0]["attributes"]["brand"], "Brand 2")
+        self.assertEqual(len(items[0]["images"]), 2)
+        self.assertEqual(items[0]["category"]["name"], "Shoes")
+
+    def test_without_expand_the_list_is_unchanged(self):
+        item = self.get_items({})[0]
+        self.assertNotIn("attributes", item)
+        self.assertIsInstance(item["images"], dict)
+
+    def test_expanded_page_has_bounded_queries(self):
+        # Count, products with category and attributes, images and facets.
+        with self.assertNumQueries(4):
+            self.get_items({"expand": "attributes,images"})
+
+        for index in range(3, 10):
+            product = factories.ProductFactory()
+            ProductImage.objects.create(product=product, image=f"{index}.jpg")
+        cache.clear()
+        with self.assertNumQueries(4):
+            items = self.get_items({"expand": "attributes,images"})
+        self.assertEqual(len(items), 10)
+        self.assertIsNone(items[0]["attributes"])
+
+    def test_expand_with_sparse_fields(self):
+        items = self.get_items({"fields": "id", "expand": "attributes"})
+        self.assertEqual(set(items[0]), {"id", "attributes"})
+
+    def test_unknown_expansion(self):
+        response = self.client.get(self.product_list_url, {"expand": "reviews"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class ProductValuesSerializerTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product_list_url = reverse("product-list")
+        shoes = factories.CategoryFactory(
+            name="Shoes",
+            description="All shoes",
+            image="categories/shoes.jpg",
+            image_renditions={"webp": {"640": "shoes-640w.webp", "320": "shoes.webp"}},
+        )
+        bags = factories.CategoryFactory()
+        first = factories.ProductFactory(name="Sneakers", category=shoes, price="12.5")
+        ProductImage.objects.create(product=first, image="sneakers-1.jpg")
+        ProductImage.objects.create(
+            product=first,
+            image="sneakers-2.jpg",
+            image_renditions={
+                "webp": {"320": "sneakers-2-320w.webp"},
+                "jpeg": {"320": "sneakers-2-320w.jpg"},
+            },
+        )
+        second = factories.ProductFactory(name="Tote", category=bags, price=1999)
+        ProductImage.objects.create(product=second, image=None)
+        factories.ProductFactory(name="Gift card", category=None, price="0.99")
+
+    @staticmethod
+    def render(data) -> bytes:
+        return JSONRenderer().render(data)
+
+    def assert_same_output(self, context):
+        products = Product.objects.order_by("id")
+        expected = ProductSerializer(
+            products.select_related("category").with_primary_image(),
+            many=True,
+            context=context,
+        ).data
+        actual = ProductValuesSerializer(
+            context=context, fields=context.get("sparse_fields")
+        ).serialize(products)
+        self.assertEqual(self.render(actual), self.render(expected))
+
+    def test_matches_product_serializer(self):
+        self.assert_same_output({})
+
+    def test_matches_product_serializer_with_request(self):
+        request = APIRequestFactory().get(self.product_list_url)
+        self.assert_same_output({"request": request})
+
+    def test_matches_product_serializer_with_sparse_fields(self):
+        self.assert_same_output({"sparse_fields": {"name", "price", "images"}})
+
+    def test_list_matches_product_serializer(self):
+        response = self.client.get(self.product_list_url, {"ordering": "price"})
+        request = response.wsgi_request
+        expected = ProductSerializer(
+            Product.objects.order_by("price"),
+            many=True,
+            context={"request": request},
+        ).data
+        self.assertEqual(self.render(response.data["items"]), self.render(expected))
+
+    def test_fragments_are_shared_across_requests_and_versions(self):
+        products = Product.objects.order_by("id")
+        request = APIRequestFactory().get(self.product_list_url)
+        ProductValuesSerializer().serialize(products)
+        with CaptureQueriesContext(connection) as queries:
+            self.assert_same_output({"request": request})
+        # ProductSerializer queries the products and their images, the
+        # fragments only need the rows.
+        self.assertEqual(len(queries), 3)
+
+        category = Category.objects.get(name="Shoes")
+        category.name = "Footwear"
+        category.save()
+        (first, *_) = ProductValuesSerializer().serialize(products)
+        self.assertEqual(first["category"]["name"], "Footwear")
+
+    def test_cursor_pagination_with_sparse_fields(self):
+        for index in range(10):
+            factories.ProductFactory(price=5000 + index)
+        params = {"cursor": "", "ordering": "-price", "fields": "name"}
+        response = self.client.get(self.product_list_url, params)
+        self.assertEqual(len(response.data["items"]), 10)
+        self.assertEqual(set(response.data["items"][0]), {"name"})
+
+        params["cursor"] = response.data["pagination"]["next_page"]
+        response = self.client.get(self.product_list_url, params)
+        self.assertEqual(
+            [item["name"] for item in response.data["items"]],
+            ["Tote", "Sneakers", "Gift card"],
+        )
+
+
+@override_settings(
+    STORAGES=IN_MEMORY_STORAGES,
+    CATALOG_SNAPSHOT_REBUILD_DELAY=0,
+    CATALOG_CACHE_ALLOW_LOCAL=True,
+)
+class CatalogSnapshotTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "catalog.snapshot")
+        self.client = APIClient()
+        # Staff users bypass the response cache.
+        self.client.force_authenticate(
+            Customer.objects.create_superuser(
+                email="admin@example.com", password="password"
+            )
+        )
+        shoes = factories.CategoryFactory(
+            image="categories/shoes.jpg",
+            image_renditions={"webp": {"320": "shoes-320w.webp"}},
+        )
+        self.product = factories.ProductFactory(category=shoes, price="12.5")
+        ProductImage.objects.create(product=self.product, image="sneakers.jpg")
+        ProductAttributes.objects.create(
+            product=self.product,
+            brand="Brand",
+            material="Canvas",
+            style="Sport",
+            size=42,
+        )
+        for price in range(2, 5):
+            factories.ProductFactory(price=price)
+        self.urls = [
+            reverse("product-list") + "?ordering=price",
+            reverse("product-detail", args=[self.product.id]),
+            reverse("product-popular"),
+            reverse("product-latest-arrival"),
+        ]
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return JSONRenderer().render(response.data)
+
+    def test_snapshot_serves_the_same_data(self):
+        expected = [self.get(url) for url in self.urls]
+        with override_settings(CATALOG_SNAPSHOT_PATH=self.path):
+            CatalogSnapshotBuilder().build()
+            self.assertIsNotNone(get_catalog_snapshot())
+            self.assertEqual([self.get(url) for url in self.urls], expected)
+
+    def test_snapshot_saves_queries(self):
+        url = reverse("product-detail", args=[self.product.id])
+        with CaptureQueriesContext(connection) as database:
+            self.client.get(url)
+        with override_settings(CATALOG_SNAPSHOT_PATH=self.path):
+            CatalogSnapshotBuilder().build()
+            with CaptureQueriesContext(connection) as snapshot:
+                self.client.get(url)
+        self.assertLess(len(snapshot), len(database))
+
+    def test_stale_snapshot_is_not_served_until_rebuilt(self):
+        url = reverse("product-detail", args=[self.product.id])
+        with override_settings(CATALOG_SNAPSHOT_PATH=self.path):
+            CatalogSnapshotBuilder().build()
+            self.product.name = "Runners"
+            self.product.save()
+            self.assertIsNone(get_catalog_snapshot())
+            self.assertEqual(self.client.get(url).data["name"], "Runners")
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product.name = "Trainers"
+                self.product.save()
+            snapshot = get_catalog_snapshot()
+            self.assertIsNotNone(snapshot)
+            record = snapshot.get_record(self.product.id, "detail")
+            self.assertEqual(json.loads(record)["name"], "Trainers")
+
+    def test_snapshot_is_not_served_with_a_process_local_cache(self):
+        with override_settings(CATALOG_SNAPSHOT_PATH=self.path):
+            CatalogSnapshotBuilder().build()
+            # Its freshness could not see the changes of the other workers.
+            with override_settings(
+                CACHES=LOCAL_CACHES, CATALOG_CACHE_ALLOW_LOCAL=False
+            ):
+                self.assertIsNone(get_catalog_snapshot())
+            self.assertIsNotNone(get_catalog_snapshot())
+
+
+class ImageProcessingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        storage_settings = override_settings(
+            MEDIA_ROOT=media_root.name,
+            STORAGES=LOCAL_STORAGES,
+            IMAGE_RENDITION_WIDTHS=[320, 640, 1280],
+        )
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=Customer.objects.create_superuser(
+                email="admin@example.com", password="password"
+            )
+        )
+        self.category = factories.CategoryFactory()
+        self.product = factories.ProductFactory(category=self.category)
+
+    @staticmethod
+    def make_image(
+        name="photo.jpg", size=(800, 600), orientation=None, color=(200, 30, 30)
+    ):
+        image = Image.new("RGB", size, color)
+        exif = Image.Exif()
+        if orientation:
+            exif[ExifTags.Base.Orientation] = orientation
+        exif[ExifTags.Base.Make] = "Camera"
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG", exif=exif.tobytes())
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+    def upload_product_images(self, *images):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("product-upload-images", args=[self.product.id]),
+                {"uploaded_images": list(images)},
+                format="multipart",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_upload_generates_renditions(self):
+        self.upload_product_images(self.make_image())
+
+        image = ProductImage.objects.get()
+        self.assertEqual(set(image.image_renditions), {"webp", "jpeg"})
+        self.assertEqual(set(image.image_renditions["webp"]), {"320", "640", "800"})
+        rendition = image.image_renditions["jpeg"]["320"]
+        with default_storage.open(rendition) as file:
+            self.assertEqual(Image.open(file).size, (320, 240))
+
+        response = self.client.get(reverse("product-list"))
+        srcset = response.data["items"][0]["images"]["srcset"]
+        self.assertEqual(srcset["webp"].count("w, "), 2)
+        self.assertTrue(srcset["webp"].endswith(" 800w"))
+
+    def test_original_is_rotated_and_stripped(self):
+        self.upload_product_images(self.make_image(orientation=6))
+
+        image = ProductImage.objects.get()
+        with image.image.open() as file:
+            original = Image.open(file)
+            self.assertEqual(original.size, (600, 800))
+            self.assertEqual(len(original.getexif()), 0)
+        with default_storage.open(image.image_renditions["webp"]["600"]) as file:
+            self.assertEqual(len(Image.open(file).getexif()), 0)
+
+    def test_category_image_srcset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("category-upload-image", args=[self.category.id]),
+                {"image": self.make_image(size=(400, 300))},
+                format="multipart",
+            )
+        response = self.client.get(reverse("category-detail", args=[self.category.id]))
+        self.assertEqual(
+            set(response.data["image_srcset"]), {"webp", "jpeg"}, response.data
+        )
+        self.assertIn(" 320w, ", response.data["image_srcset"]["jpeg"])
+
+    def test_replaced_image_discards_stale_renditions(self):
+        product_image = ProductImage.objects.create(
+            product=self.product, image=self.make_image()
+        )
+        stale = ProductImage.objects.get()
+        # Replaced while the stale task runs, before the old file is released.
+        with self.captureOnCommitCallbacks() as callbacks:
+            product_image.image = self.make_image("other.jpg", color=(0, 0, 0))
+            product_image.save()
+
+        self.assertEqual(process_image_field(stale, "image"), {})
+        for callback in callbacks:
+            callback()
+        product_image.refresh_from_db()
+        self.assertEqual(product_image.image_renditions, {})
+        # The stale original, its rewrite and the renditions are all gone.
+        stored = [
+            file for _, _, files in os.walk(settings.MEDIA_ROOT) for file in files
+        ]
+        self.assertEqual(stored, [os.path.basename(product_image.image.name)])
+
+    def test_rewritten_original_gets_its_own_address(self):
+        other = factories.ProductFactory()
+        first, second = (
+            ProductImage.objects.create(product=product, image=self.make_image())
+            for product in (self.product, other)
+        )
+        shared = first.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            process_image_field(first, "image")
+
+        first.refresh_from_db()
+        self.assertNotEqual(first.image.name, shared)
+        with first.image.open() as file:
+            digest = hash_content(file)
+        self.assertIn(digest, first.image.name)
+        # The row sharing the original keeps its file, untouched.
+        second.refresh_from_db()
+        self.assertEqual(second.image.name, shared)
+        with second.image.open() as file:
+            self.assertEqual(len(Image.open(file).getexif()), 1)
+
+    def test_upload_is_validated_from_the_image_header(self):
+        # Truncated image data is not decoded, the header is enough.
+        image = self.make_image()
+        image.file.truncate(2048)
+        self.upload_product_images(image)
+        self.assertEqual(ProductImage.objects.count(), 1)
+
+        response = self.client.post(
+            reverse("product-upload-images", args=[self.product.id]),
+            {"uploaded_images": [SimpleUploadedFile("text.jpg", b"not an image")]},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_limits(self):
+        url = reverse("product-upload-images", args=[self.product.id])
+        images = [self.make_image(f"{index}.jpg") for index in range(3)]
+        with self.settings(IMAGE_UPLOAD_MAX_PIXELS=800 * 600 * 2):
+            response = self.client.post(
+                url, {"uploaded_images": images}, format="multipart"
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        for image in images:
+            image.seek(0)
+        with self.settings(IMAGE_UPLOAD_MAX_BYTES=4096):
+            response = self.client.post(
+                url, {"uploaded_images": images}, format="multipart"
+            )
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(ProductImage.objects.exists())
+
+    def test_identical_uploads_share_one_file(self):
+        other = factories.ProductFactory()
+        images = [
+            ProductImage.objects.create(product=product, image=self.make_image(name))
+            for product, name in ((self.product, "a.jpg"), (other, "b.JPG"))
+        ]
+        self.category.image = self.make_image("category.jpg")
+        self.category.save()
+        customer = Customer.objects.get()
+        customer.avatar = self.make_image("avatar.jpg")
+        customer.save()
+
+        name = images[0].image.name
+        self.assertEqual(
+            {images[1].image.name, self.category.image.name, customer.avatar.name},
+            {name},
+        )
+        self.assertEqual(count_references(name), 4)
+        _, files = default_storage.listdir(os.path.dirname(name))
+        self.assertEqual(files, [os.path.basename(name)])
+
+    def test_file_is_deleted_with_its_last_reference(self):
+        self.upload_product_images(self.make_image())
+        product_image = ProductImage.objects.get()
+        name = product_image.image.name
+        renditions = product_image.image_renditions["webp"].values()
+        with self.captureOnCommitCallbacks(execute=True):
+            # The normalized original, as stored by the upload.
+            self.category.image = name
+            self.category.save()
+            product_image.delete()
+        self.assertTrue(default_storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.image = None
+            self.category.save()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(any(map(default_storage.exists, renditions)))
+
+    def test_reupload_keeps_the_stored_file(self):
+        self.upload_product_images(self.make_image(), self.make_image(color=(0, 0, 0)))
+        names = set(ProductImage.objects.values_list("image", flat=True))
+
+        serializer = ProductImageUploadSerializer(
+            self.product, data={"uploaded_images": [self.make_image()]}
+        )
+        serializer.is_valid(raise_exception=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            serializer.save()
+
+        kept = ProductImage.objects.get().image.name
+        self.assertIn(kept, names)
+        self.assertTrue(default_storage.exists(kept))
+        self.assertFalse(default_storage.exists((names - {kept}).pop()))
+
+    def test_reupload_references_the_normalized_file(self):
+        self.upload_product_images(self.make_image())
+        product_image = ProductImage.objects.get()
+        stored = {
+            os.path.join(root, file)
+            for root, _, files in os.walk(settings.MEDIA_ROOT)
+            for file in files
+        }
+
+        serializer = ProductImageUploadSerializer(
+            self.product, data={"uploaded_images": [self.make_image()]}
+        )
+        serializer.is_valid(raise_exception=True)
+        with patch.object(
+            FileSystemStorage,
+            "_save",
+            autospec=True,
+            side_effect=FileSystemStorage._save,
+        ) as save, self.captureOnCommitCallbacks(execute=True):
+            serializer.save()
+
+        save.assert_not_called()
+        reuploaded = ProductImage.objects.get()
+        self.assertEqual(reuploaded.image.name, product_image.image.name)
+        self.assertEqual(reuploaded.image_renditions, product_image.image_renditions)
+        self.assertTrue(all(map(os.path.exists, stored)))
+
+    def test_reused_file_is_not_released(self):
+        product_image = ProductImage.objects.create(
+            product=self.product, image=self.make_image()
+        )
+        name = product_image.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            product_image.delete()
+        self.assertFalse(default_storage.exists(name))
+
+        product_image = ProductImage.objects.create(
+            product=self.product, image=self.make_image()
+        )
+        # Stored again, then reused by an upload whose row is not committed.
+        self.assertTrue(reuse_file(default_storage, name))
+        with self.captureOnCommitCallbacks(execute=True):
+            product_image.delete()
+        self.assertTrue(default_storage.exists(name))
+
+    def test_collect_orphaned_media(self):
+        self.upload_product_images(self.make_image(), self.make_image(color=(0, 0, 0)))
+        kept, orphan = ProductImage.objects.order_by("id")
+        # Released on commit, which never happens in the test.
+        orphan.delete()
+        legacy = default_storage.save("uploads/products/old.jpg", BytesIO(b"old"))
+        orphans = {
+            orphan.image.name,
+            legacy,
+            *orphan.image_renditions["webp"].values(),
+            *orphan.image_renditions["jpeg"].values(),
+        }
+
+        out = StringIO()
+        call_command("collect_orphaned_media", "--dry-run", "--min-age=0", stdout=out)
+        listed = {line.split()[0] for line in out.getvalue().splitlines()[:-1]}
+        self.assertEqual(listed, orphans)
+        self.assertTrue(all(map(default_storage.exists, orphans)))
+
+        collector = OrphanedMediaCollector(batch_size=2, pause=0, min_age=0)
+        report = collector.collect()
+        self.assertEqual(report["deleted"], len(orphans))
+        self.assertFalse(any(map(default_storage.exists, orphans)))
+        self.assertTrue(default_storage.exists(kept.image.name))
+        self.assertTrue(
+            all(map(default_storage.exists, kept.image_renditions["webp"].values()))
+        )
+
+    def test_collect_keeps_files_referenced_since_the_walk(self):
+        self.upload_product_images(self.make_image())
+        image = ProductImage.objects.get()
+        collector = OrphanedMediaCollector(min_age=0)
+        rendition = image.image_renditions["webp"]["320"]
+        self.assertEqual(
+            collector.still_orphaned([image.image.name, rendition, "uploads/x.jpg"]),
+            ["uploads/x.jpg"],
+        )
+        self.assertEqual(collector.collect(), {"orphans": 0, "deleted": 0, "size": 0})
+
+    def test_dry_run_counts_unknown_sizes_as_zero(self):
+        orphans = {
+            default_storage.save(f"uploads/products/old-{i}.jpg", BytesIO(b"old"))
+            for i in range(3)
+        }
+        collector = OrphanedMediaCollector(batch_size=2, pause=0, min_age=0)
+        with patch.object(collector.storage, "size", return_value=None), patch.object(
+            collector, "delete_batch"
+        ) as delete_batch:
+            report = collector.collect(dry_run=True)
+        self.assertEqual(report, {"orphans": 3, "deleted": 0, "size": 0})
+        delete_batch.assert_not_called()
+        self.assertTrue(all(map(default_storage.exists, orphans)))
+
+    def test_files_of_unknown_age_are_kept(self):
+        orphan = default_storage.save("uploads/products/new.jpg", BytesIO(b"new"))
+        collector = OrphanedMediaCollector(pause=0, min_age=60)
+        with patch.object(
+            collector.storage, "get_modified_time", side_effect=NotImplementedError
+        ):
+            self.assertEqual(collector.collect()["orphans"], 0)
+        self.assertTrue(default_storage.exists(orphan))
+
+        collector.min_age = 0
+        self.assertEqual(collector.collect()["deleted"], 1)
+        self.assertFalse(default_storage.exists(orphan))
+
+    def test_media_urls_are_cached_until_the_file_changes(self):
+        self.upload_product_images(self.make_image())
+        media_urls.clear()
+        url = reverse("product-detail", args=[self.product.id])
+        first = self.client.get(url).data["images"]
+        second = self.client.get(url).data["images"]
+        self.assertEqual(first, second)
+        stats = media_urls.stats()
+        self.assertEqual(stats["hits"], stats["misses"])
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+        name = ProductImage.objects.get().image.name
+        self.assertIn(name, media_urls._urls)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductImage.objects.get().delete()
+        self.assertNotIn(name, media_urls._urls)
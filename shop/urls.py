@@ -8,5 +8,15 @@ router.register("products", ProductViewSet)
 
 urlpatterns = [
     path("categories/all/", ListCategories.as_view(), name="all_categories"),
+    path(
+        "categories/<slug:category_slug>/products/",
+        ProductViewSet.as_view({"get": "list"}),
+        name="category-products",
+    ),
+    path(
+        "products/slug/<slug:slug>/",
+        ProductViewSet.as_view({"get": "retrieve"}),
+        name="product-detail-slug",
+    ),
     path("", include(router.urls)),
 ]
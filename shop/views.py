@@ -1,23 +1,53 @@
+import io
+from typing import Optional, Sequence
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, OpenApiParameter, extend_schema_view
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.filters import OrderingFilter
 from rest_framework.generics import ListAPIView
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 
+from shop.cache import CatalogCacheMixin, cache_catalog_response, request_origin
+from shop.conditional import ConditionalGetMixin, conditional_get
+from shop.exporters import EXPORT_CONTENT_TYPES, CatalogExporter
+from shop.facets import ProductFacets
 from shop.filters import ProductFilter, CategoryFilter
+from shop.importers import CatalogImporter, get_import_format
 from shop.models import Category, Product, ProductImage
 from shop.serializers import (
-    CategorySerializer,
+    CategoryWithCountsSerializer,
     ProductSerializer,
     ProductDetailSerializer,
+    ProductValuesSerializer,
     CategoryImageSerializer,
     ProductCreateUpdateSerializer,
     ProductImageUploadSerializer,
+    CatalogImportSerializer,
+)
+from shop.services import (
+    MAX_ID,
+    PopularProductsRanking,
+    ProductViewCounter,
+    SlugIndex,
+    category_slugs,
+    product_slugs,
 )
+from shop.snapshot import (
+    CatalogSnapshot,
+    SnapshotProductSerializer,
+    get_catalog_snapshot,
+)
+from utils.expand import ExpandMixin
 from utils.pagination import Pagination
+from utils.sparse_fields import SparseFieldsMixin
+from utils.uploads import SpooledMultiPartParser
 from utils.permissions import IsAdminUserOrReadOnly
 
 
@@ -28,24 +58,51 @@ from utils.permissions import IsAdminUserOrReadOnly
     "list of all categories. "
     "Doesn't support pagination.",
 )
-class ListCategories(ListAPIView):
+class ListCategories(CatalogCacheMixin, ListAPIView):
     queryset = Category.objects.all()
-    serializer_class = CategorySerializer
+    serializer_class = CategoryWithCountsSerializer
+    cache_scopes = ["categories"]
+
+    @cache_catalog_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
 
 @extend_schema(tags=["categories"])
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(
+    SparseFieldsMixin, ConditionalGetMixin, CatalogCacheMixin, viewsets.ModelViewSet
+):
     queryset = Category.objects.all()
     pagination_class = Pagination
     filter_backends = [DjangoFilterBackend,]
     filterset_class = CategoryFilter
     permission_classes = (IsAdminUserOrReadOnly,)
     filterset_class = CategoryFilter
+    sparse_field_sources = {"image_srcset": ["image_renditions"]}
+    cache_scopes = ["categories"]
 
     def get_serializer_class(self):
         if self.action == "upload_image":
             return CategoryImageSerializer
-        return CategorySerializer
+        return CategoryWithCountsSerializer
+
+    def get_queryset(self):
+        return self.only_requested_fields(super().get_queryset())
+
+    def get_version_data(self):
+        if self.action == "retrieve":
+            try:
+                updated_at = (
+                    Category.objects.filter(pk=self.kwargs["pk"])
+                    .values_list("updated_at", flat=True)
+                    .first()
+                )
+            except ValueError:
+                return None
+            if updated_at is None:
+                return None
+            return (updated_at,), updated_at
+        return self.get_catalog_version()
 
     @extend_schema(
         summary="Retrieve a list of categories",
@@ -59,6 +116,8 @@ class CategoryViewSet(viewsets.ModelViewSet):
             )
         ]
     )
+    @conditional_get
+    @cache_catalog_response
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
@@ -73,6 +132,8 @@ class CategoryViewSet(viewsets.ModelViewSet):
         summary="Retrieve a specific category",
         description="This endpoint returns the details of a specific category identified by its ID.",
     )
+    @conditional_get
+    @cache_catalog_response
     def retrieve(self, request, *args, **kwargs):
         return super().retrieve(request, *args, **kwargs)
 
@@ -120,7 +181,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
         parameters=[
             OpenApiParameter(
                 name="category",
-                description="Specify the category slug to filter the products.",
+                description="Specify the category slug or ID to filter the products.",
                 required=False,
                 type=str,
             ),
@@ -140,15 +201,52 @@ class CategoryViewSet(viewsets.ModelViewSet):
     ),
 )
 @extend_schema(tags=["products"])
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.select_related("category").all()
+class ProductViewSet(
+    ExpandMixin,
+    SparseFieldsMixin,
+    ConditionalGetMixin,
+    CatalogCacheMixin,
+    viewsets.ModelViewSet,
+):
+    queryset = Product.objects.all()
     permission_classes = (IsAdminUserOrReadOnly,)
     pagination_class = Pagination
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = ProductFilter
     ordering_fields = ["views", "price"]
+    pagination_count_strategy = "cached"
     http_method_names = ["get", "post", "patch", "delete", "head", "options"]
 
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Slug routes continue as the pk routes, sharing their caches.
+        if "slug" in self.kwargs:
+            product_id = self.resolve_slug(product_slugs, self.kwargs.pop("slug"))
+            self.kwargs["pk"] = str(product_id)
+        if "category_slug" in self.kwargs:
+            self.kwargs["category_id"] = self.resolve_slug(
+                category_slugs, self.kwargs.pop("category_slug")
+            )
+
+    @staticmethod
+    def resolve_slug(slugs: SlugIndex, slug: str) -> int:
+        object_id = slugs.resolve(slug)
+        if object_id is None:
+            raise NotFound
+        return object_id
+
+    def get_category_id(self) -> Optional[int]:
+        """Category of the listing, from the route or the ``category`` parameter."""
+        if "category_id" in self.kwargs:
+            return self.kwargs["category_id"]
+        value = self.request.query_params.get("category")
+        return category_slugs.resolve_key(value) if value else None
+
+    def scope_queryset(self, queryset):
+        if "category_id" in self.kwargs:
+            queryset = queryset.filter(category_id=self.kwargs["category_id"])
+        return queryset
+
     def get_serializer_class(self):
         if self.action == "retrieve":
             return ProductDetailSerializer
@@ -158,15 +256,102 @@ class ProductViewSet(viewsets.ModelViewSet):
             return ProductCreateUpdateSerializer
         elif self.action == "upload_images":
             return ProductImageUploadSerializer
+        elif self.action == "import_catalog":
+            return CatalogImportSerializer
         return ProductSerializer
 
+    def use_values_serializer(self) -> bool:
+        """
+        Serialize list actions from ``values()`` rows unless relations are
+        expanded, which needs the model serializer.
+        """
+        return (
+            self.action in ("list", "popular", "latest_arrival")
+            and not getattr(self, "swagger_fake_view", False)
+            and not self.get_expand()
+        )
+
+    def get_catalog_snapshot(self) -> Optional[CatalogSnapshot]:
+        """
+        The up to date catalog snapshot serving the storefront reads, which
+        hold every field of the product and no expanded relation.
+        """
+        if not hasattr(self, "_catalog_snapshot"):
+            usable = (
+                self.action in ("list", "popular", "latest_arrival", "retrieve")
+                and not getattr(self, "swagger_fake_view", False)
+                and self.get_sparse_fields() is None
+                and not self.get_expand()
+            )
+            self._catalog_snapshot = get_catalog_snapshot() if usable else None
+        return self._catalog_snapshot
+
+    def get_values_serializer(self, *args, **kwargs):
+        kwargs.setdefault("context", self.get_serializer_context())
+        return ProductValuesSerializer(*args, fields=self.get_sparse_fields(), **kwargs)
+
+    def get_serializer(self, *args, **kwargs):
+        snapshot = self.get_catalog_snapshot()
+        if snapshot is not None and self.action != "retrieve":
+            kwargs.setdefault("context", self.get_serializer_context())
+            return SnapshotProductSerializer(*args, snapshot=snapshot, **kwargs)
+        if self.use_values_serializer():
+            return self.get_values_serializer(*args, **kwargs)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = self.scope_queryset(super().get_queryset())
+        if self.get_catalog_snapshot() is not None and self.action != "retrieve":
+            return queryset.values("id")
+        if self.use_values_serializer():
+            return self.get_values_serializer().values(queryset)
+        if self.field_requested("category") or self.expanded("category"):
+            queryset = queryset.select_related("category")
+        if self.action in ("list", "popular", "latest_arrival"):
+            if self.expanded("attributes"):
+                queryset = queryset.select_related("product_attributes")
+            if self.expanded("images"):
+                queryset = queryset.prefetch_related("product_images")
+            elif self.field_requested("images"):
+                queryset = queryset.with_primary_image()
+        elif self.action == "retrieve":
+            if self.field_requested("attributes"):
+                queryset = queryset.select_related("product_attributes")
+            if self.field_requested("images"):
+                queryset = queryset.prefetch_related("product_images")
+        return self.only_requested_fields(queryset, *self.get_expand())
+
+    def get_cache_scopes(self):
+        if self.action == "retrieve":
+            return [f"product:{self.kwargs['pk']}", "categories"]
+        scopes = ["popular"] if self.action == "popular" else []
+        category_id = self.get_category_id()
+        if category_id is not None:
+            return [*scopes, f"category:{category_id}"]
+        return [*scopes, "products", "categories"]
+
+    def get_version_data(self):
+        if self.action == "retrieve":
+            try:
+                row = (
+                    Product.objects.filter(pk=self.kwargs["pk"])
+                    .values_list("updated_at", "category__updated_at", "views")
+                    .first()
+                )
+            except ValueError:
+                return None
+            if row is None:
+                return None
+            return row, max(filter(None, row[:2]))
+        return self.get_catalog_version()
+
     @extend_schema(
         summary="Retrieve a list of products",
-        description="This endpoint returns a list of products. You can filter by category slug and product name, and sort by fields such as 'views' or 'price'.",
+        description="This endpoint returns a list of products. You can filter by category slug, product name, attributes and price, and sort by fields such as 'views' or 'price'. The response includes facet counts of the attributes and a price histogram for the current filters.",
         parameters=[
             OpenApiParameter(
                 name="category",
-                description="Specify the category slug to filter the products.",
+                description="Specify the category slug or ID to filter the products.",
                 required=False,
                 type=str,
             ),
@@ -182,10 +367,136 @@ class ProductViewSet(viewsets.ModelViewSet):
                 required=False,
                 type=str,
             ),
+            OpenApiParameter(
+                name="brand",
+                description="Comma separated brands to filter the products.",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="material",
+                description="Comma separated materials to filter the products.",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="style",
+                description="Comma separated styles to filter the products.",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="size",
+                description="Comma separated sizes to filter the products.",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="price_min",
+                description="Minimum product price.",
+                required=False,
+                type=float,
+            ),
+            OpenApiParameter(
+                name="price_max",
+                description="Maximum product price.",
+                required=False,
+                type=float,
+            ),
+            OpenApiParameter(
+                name="expand",
+                description="Comma separated relations to nest in every product: 'attributes', 'images' (all images instead of the first one), 'category'.",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="ids",
+                description="Comma separated ids or slugs of the products to return, in this order, instead of a page of the catalog. Filters, ordering and pagination are ignored and unknown products are skipped. Views are not counted.",
+                required=False,
+                type=str,
+            ),
         ],
     )
+    @conditional_get
+    @cache_catalog_response
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        if "ids" in request.query_params:
+            return self.batch(request)
+        response = super().list(request, *args, **kwargs)
+        response.data["facets"] = self.get_facets(request)
+        return response
+
+    def batch(self, request):
+        """The products of the ``ids`` parameter, in the requested order."""
+        keys = [
+            key.strip()
+            for key in request.query_params["ids"].split(",")
+            if key.strip()
+        ]
+        keys = list(dict.fromkeys(keys))
+        if len(keys) > settings.PRODUCT_BATCH_MAX_IDS:
+            raise ValidationError(
+                {
+                    "ids": [
+                        f"At most {settings.PRODUCT_BATCH_MAX_IDS} products "
+                        "can be requested."
+                    ]
+                }
+            )
+        ids = {key: int(key) for key in keys if key.isdigit()}
+        if any(product_id > MAX_ID for product_id in ids.values()):
+            raise ValidationError({"ids": ["Product ids must be at most 2^63 - 1."]})
+        slugs = product_slugs.resolve_many(key for key in keys if key not in ids)
+        products = self.get_products_by_id({*ids.values(), *slugs.values()})
+        # Keys made of digits are slugs when no product has that id.
+        missing = [
+            key for key, product_id in ids.items() if product_id not in products
+        ]
+        if missing:
+            digit_slugs = product_slugs.resolve_many(missing)
+            products.update(
+                self.get_products_by_id(set(digit_slugs.values()) - set(products))
+            )
+            slugs.update(digit_slugs)
+
+        product_ids = []
+        for key in keys:
+            product_id = ids.get(key)
+            if product_id not in products:
+                product_id = slugs.get(key)
+            if product_id in products and product_id not in product_ids:
+                product_ids.append(product_id)
+        serializer = self.get_serializer(
+            [products[product_id] for product_id in product_ids], many=True
+        )
+        return Response(serializer.data)
+
+    def get_products_by_id(self, product_ids) -> dict:
+        """``{id: product}`` for the products of the view queryset, in one query."""
+        if not product_ids:
+            return {}
+        return {
+            product["id"] if isinstance(product, dict) else product.id: product
+            for product in self.get_queryset().filter(id__in=product_ids)
+        }
+
+    def get_products_in_order(self, product_ids: Sequence[int]) -> Sequence:
+        """
+        The products of the view queryset with the given ids, in the order
+        of the ids, from a single query. Unknown ids are skipped.
+        """
+        products = self.get_products_by_id(product_ids)
+        return [
+            products[product_id]
+            for product_id in product_ids
+            if product_id in products
+        ]
+
+    def get_facets(self, request):
+        filterset = DjangoFilterBackend().get_filterset(
+            request, self.scope_queryset(Product.objects.all()), self
+        )
+        return ProductFacets(filterset).counts()
 
     @extend_schema(
         summary="Create a new product",
@@ -199,11 +510,22 @@ class ProductViewSet(viewsets.ModelViewSet):
         description="This endpoint returns the details of a specific product identified by its ID. It also increments the view count of the product.",
     )
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        instance.views += 1
-        instance.save()
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        response = self.get_product_response(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            ProductViewCounter().register_view(int(kwargs["pk"]), request)
+        return response
+
+    @conditional_get
+    @cache_catalog_response
+    def get_product_response(self, request, *args, **kwargs):
+        snapshot = self.get_catalog_snapshot()
+        if snapshot is not None and kwargs["pk"].isdigit():
+            products = snapshot.load(
+                [int(kwargs["pk"])], request_origin(request), kind="detail"
+            )
+            if products:
+                return Response(products[0])
+        return super().retrieve(request, *args, **kwargs)
 
     @extend_schema(
         summary="Update an existing product",
@@ -226,10 +548,30 @@ class ProductViewSet(viewsets.ModelViewSet):
     @extend_schema(
         summary="Retrieve popular products",
         description="This endpoint returns the top 30 most viewed products.",
+        parameters=[
+            OpenApiParameter(
+                name="category",
+                description="Specify the category slug or ID to get the most viewed products of the category.",
+                required=False,
+                type=str,
+            ),
+        ],
     )
     @action(detail=False, methods=["get"])
+    @cache_catalog_response
     def popular(self, request):
-        popular_products = self.queryset.order_by("-views")[:30]
+        category_id = self.get_category_id()
+        ranking = PopularProductsRanking()
+        # Until rebuilt, the ranking only holds the products changed since
+        # the store was emptied.
+        product_ids = ranking.top(category_id) if ranking.is_built() else []
+        if product_ids:
+            popular_products = self.get_products_in_order(product_ids)
+        else:
+            popular_products = self.get_queryset().order_by("-views", "-id")
+            if category_id is not None:
+                popular_products = popular_products.filter(category_id=category_id)
+            popular_products = popular_products[: ranking.limit]
         serializer = self.get_serializer(popular_products, many=True)
         return Response(serializer.data)
 
@@ -238,8 +580,9 @@ class ProductViewSet(viewsets.ModelViewSet):
         description="This endpoint returns the latest 30 products based on their creation date.",
     )
     @action(detail=False, methods=["get"])
+    @cache_catalog_response
     def latest_arrival(self, request):
-        latest_arrival_products = self.queryset.order_by("-pk")[:30]
+        latest_arrival_products = self.get_queryset().order_by("-pk")[:30]
         serializer = self.get_serializer(latest_arrival_products, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -248,6 +591,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         detail=True,
         url_path="upload-images",
         permission_classes=[IsAdminUser],
+        parser_classes=[SpooledMultiPartParser],
     )
     def upload_images(self, request, pk=None):
         product = self.get_object()
@@ -261,6 +605,67 @@ class ProductViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        summary="Import products",
+        description="This endpoint imports products and their attributes from a CSV or JSON Lines file. Products are matched by SKU and categories by slug. Invalid rows are skipped and reported with their line numbers.",
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=[IsAdminUser],
+        parser_classes=[MultiPartParser],
+    )
+    def import_catalog(self, request):
+        serializer = CatalogImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data["file"]
+        try:
+            import_format = get_import_format(
+                upload.name, serializer.validated_data.get("format")
+            )
+        except ValueError as error:
+            raise ValidationError({"format": [str(error)]})
+
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8", newline="")
+        try:
+            result = CatalogImporter().import_stream(stream, import_format)
+        except UnicodeDecodeError:
+            raise ValidationError({"file": ["The file must be UTF-8 encoded."]})
+        return Response(result.as_dict(), status=status.HTTP_200_OK)
+
+    @extend_schema(
+        summary="Export products",
+        description="This endpoint streams all products with their category, attributes and image URLs as a CSV or JSON Lines file, in the import format.",
+        parameters=[
+            OpenApiParameter(
+                name="file_format",
+                description="Export format: 'csv' (default) or 'jsonl'.",
+                required=False,
+                type=str,
+                enum=["csv", "jsonl"],
+            ),
+        ],
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="export",
+        permission_classes=[IsAdminUser],
+    )
+    def export_catalog(self, request):
+        export_format = request.query_params.get("file_format", "csv")
+        if export_format not in EXPORT_CONTENT_TYPES:
+            raise ValidationError({"file_format": ["Expected csv or jsonl."]})
+        response = StreamingHttpResponse(
+            CatalogExporter().iter_lines(export_format),
+            content_type=EXPORT_CONTENT_TYPES[export_format],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="catalog.{export_format}"'
+        )
+        return response
+
     @extend_schema(
         summary="Delete a product image",
         description="This endpoint allows you to delete a specific image of a product identified by its image ID.",
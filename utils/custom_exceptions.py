@@ -60,6 +60,12 @@ class InvalidCredentialsError(APIException):
     default_code = "invalid_credentials"
 
 
+class UploadTooLargeError(APIException):
+    status_code = 413
+    default_detail = "The upload is too large."
+    default_code = "upload_too_large"
+
+
 class CartExceptionHandler(ExceptionHandler):
     def convert_known_exceptions(self, exc: Exception) -> Exception:
         if isinstance(exc, requests.Timeout):
@@ -0,0 +1,71 @@
+from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+
+from utils.sparse_fields import SparseFieldsMixin, SparseFieldsSerializerMixin
+
+
+class ExpandableFieldsSerializerMixin(SparseFieldsSerializerMixin):
+    """
+    Serializer mixin adding the nested fields requested with ``expand``.
+
+    ``Meta.expandable_fields`` maps a field name to a serializer class and
+    its keyword arguments. The expansions listed in ``context["expand"]``
+    are added to (or replace) the top level fields, whatever the sparse
+    field selection.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expand = self.context.get("expand")
+        if not expand or not self.is_root_serializer():
+            return fields
+        for name, (serializer_class, kwargs) in self.Meta.expandable_fields.items():
+            if name in expand:
+                fields[name] = serializer_class(**kwargs)
+        return fields
+
+
+class ExpandMixin:
+    """
+    View mixin for the ``expand`` query parameter.
+
+    ``?expand=attributes,images`` nests the listed relations in the
+    response. Views load every expansion for the whole page at once with
+    ``select_related``/``prefetch_related``, checking ``expanded``.
+    """
+
+    expand_query_param = "expand"
+
+    def get_expand(self) -> set[str]:
+        if not hasattr(self, "_expand"):
+            self._expand = self.parse_expand()
+        return self._expand
+
+    def parse_expand(self) -> set[str]:
+        if self.request.method not in permissions.SAFE_METHODS:
+            return set()
+        expand = SparseFieldsMixin.split_param(
+            self.request.query_params.get(self.expand_query_param)
+        )
+        if not expand:
+            return expand
+        meta = getattr(self.get_serializer_class(), "Meta", None)
+        available = set(getattr(meta, "expandable_fields", ()))
+        unknown = expand - available
+        if unknown:
+            raise ValidationError(
+                {
+                    self.expand_query_param: [
+                        f"Unknown expansions: {', '.join(sorted(unknown))}."
+                    ]
+                }
+            )
+        return expand
+
+    def expanded(self, name: str) -> bool:
+        return name in self.get_expand()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["expand"] = self.get_expand()
+        return context
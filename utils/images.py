@@ -0,0 +1,231 @@
+import io
+import os
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from utils.media import (
+    delete_file,
+    hash_content,
+    media_urls,
+    release_file,
+    renditions_field_name,
+    reuse_file,
+    save_file,
+    set_normalized_name,
+)
+
+# Rendition format name: (Pillow format, file extension).
+RENDITION_FORMATS = {
+    "webp": ("WEBP", "webp"),
+    "jpeg": ("JPEG", "jpg"),
+}
+# Image info keys holding metadata rather than pixels.
+METADATA_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "comment", "photoshop")
+
+
+def build_srcset(renditions: Optional[dict], url: Callable[[str], str]) -> dict:
+    """
+    Turn stored ``{format: {width: name}}`` renditions into
+    ``{format: "url 320w, url 640w"}`` maps usable as ``srcset``.
+    """
+    return {
+        image_format: ", ".join(
+            f"{url(names[width])} {width}w" for width in sorted(names, key=int)
+        )
+        for image_format, names in (renditions or {}).items()
+    }
+
+
+class SrcsetField(serializers.ReadOnlyField):
+    """Read-only srcset map of the renditions of the ``image_field`` image."""
+
+    def __init__(self, image_field: str, **kwargs):
+        kwargs.setdefault("source", renditions_field_name(image_field))
+        self.image_field = image_field
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        model = self.parent.Meta.model
+        storage = model._meta.get_field(self.image_field).storage
+        request = self.context.get("request")
+
+        def url(name):
+            url = media_urls.url(storage, name)
+            return request.build_absolute_uri(url) if request is not None else url
+
+        return build_srcset(value, url)
+
+
+class ImageHeaderField(serializers.FileField):
+    """
+    Image upload field validated from the image header only.
+
+    Unlike ``ImageField`` the file is neither verified nor decoded: Pillow
+    reads the format and dimensions from the first bytes of the file. They
+    are kept in the ``image_format`` and ``image_size`` attributes of the
+    returned file.
+    """
+
+    default_error_messages = {
+        "invalid_image": (
+            "Upload a valid image. The file is not an image or is corrupted."
+        ),
+        "unsupported_format": "Unsupported image format {image_format}.",
+    }
+    formats = ("JPEG", "MPO", "PNG", "WEBP", "GIF")
+
+    def to_internal_value(self, data):
+        file = super().to_internal_value(data)
+        try:
+            with Image.open(file) as image:
+                file.image_format, file.image_size = image.format, image.size
+        except (OSError, ValueError, Image.DecompressionBombError):
+            self.fail("invalid_image")
+        finally:
+            file.seek(0)
+        if file.image_format not in self.formats:
+            self.fail("unsupported_format", image_format=file.image_format)
+        return file
+
+
+class ImageProcessor:
+    """
+    Normalize a stored image and generate its resized renditions.
+
+    The image is rotated according to its EXIF orientation and every
+    metadata block is dropped. The original is rewritten only when it had
+    metadata or a rotation to apply; the WebP and JPEG renditions are
+    written next to it, in a ``renditions`` directory, at each of
+    ``IMAGE_RENDITION_WIDTHS`` capped to the width of the original.
+
+    With a ``content_address`` function, as given by a
+    ``ContentAddressedImageField``, the rewritten original is stored under
+    the address of its own bytes: the file it replaces may be shared by
+    other rows and is left to ``release_file``. The rewritten name is
+    remembered for the replaced one, so uploads of the same bytes reference
+    it directly.
+    """
+
+    original_quality = 95
+
+    def __init__(
+        self,
+        storage: Storage,
+        widths: Optional[list[int]] = None,
+        quality: Optional[int] = None,
+        content_address: Optional[Callable[[str, str], str]] = None,
+    ):
+        self.storage = storage
+        self.content_address = content_address
+        self.widths = widths or settings.IMAGE_RENDITION_WIDTHS
+        self.quality = quality or settings.IMAGE_RENDITION_QUALITY
+
+    def process(self, name: str) -> tuple[str, dict]:
+        """Return the name of the normalized original and the renditions."""
+        with self.storage.open(name, "rb") as file:
+            image = Image.open(file)
+            image.load()
+        source_format = image.format
+        needs_rewrite = self.has_metadata(image)
+        image = ImageOps.exif_transpose(image)
+        image.info = {}
+        if needs_rewrite and source_format:
+            name = self.replace(name, image, source_format)
+        return name, self.save_renditions(name, image)
+
+    @staticmethod
+    def has_metadata(image: Image.Image) -> bool:
+        return bool(image.getexif()) or any(key in image.info for key in METADATA_KEYS)
+
+    def replace(self, name: str, image: Image.Image, image_format: str) -> str:
+        content = self.encode(image, image_format, self.original_quality)
+        if self.content_address is None:
+            delete_file(self.storage, name)
+            return save_file(self.storage, name, content)
+        _, extension = os.path.splitext(name)
+        address = self.content_address(hash_content(content), extension)
+        if not reuse_file(self.storage, address):
+            address = save_file(self.storage, address, content)
+        set_normalized_name(name, address)
+        return address
+
+    def save_renditions(self, name: str, image: Image.Image) -> dict:
+        directory, filename = os.path.split(name)
+        stem, _ = os.path.splitext(filename)
+        widths = sorted({min(width, image.width) for width in self.widths})
+        renditions = {image_format: {} for image_format in RENDITION_FORMATS}
+        for width in widths:
+            resized = None
+            for image_format, (pillow_format, extension) in RENDITION_FORMATS.items():
+                rendition_name = os.path.join(
+                    directory, "renditions", f"{stem}-{width}w.{extension}"
+                )
+                # Content-addressed images share their renditions.
+                if not self.storage.exists(rendition_name):
+                    if resized is None:
+                        resized = image.copy()
+                        resized.thumbnail(
+                            (width, image.height), Image.Resampling.LANCZOS
+                        )
+                    rendition_name = save_file(
+                        self.storage,
+                        rendition_name,
+                        self.encode(resized, pillow_format, self.quality),
+                    )
+                renditions[image_format][str(width)] = rendition_name
+        return renditions
+
+    @staticmethod
+    def encode(image: Image.Image, image_format: str, quality: int) -> ContentFile:
+        if image_format == "JPEG" and image.mode != "RGB":
+            image = flatten(image)
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, quality=quality)
+        return ContentFile(buffer.getvalue())
+
+
+def flatten(image: Image.Image) -> Image.Image:
+    """Convert to RGB, painting transparent pixels white."""
+    image = image.convert("RGBA")
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def process_image_field(instance, field_name: str) -> dict:
+    """
+    Process the image stored in ``field_name`` of ``instance`` and save its
+    renditions in the ``<field_name>_renditions`` field.
+
+    The instance is saved only if the image was not replaced in the
+    meantime, otherwise the files just written are released. A rewritten
+    original replaced on the instance is released by the save.
+    """
+    model = type(instance)
+    field_file = getattr(instance, field_name)
+    processor = ImageProcessor(
+        field_file.storage,
+        content_address=getattr(field_file.field, "content_address", None),
+    )
+    name, renditions = processor.process(field_file.name)
+
+    current = model.objects.filter(pk=instance.pk, **{field_name: field_file.name})
+    if not current.exists():
+        release_file(field_file.storage, name, renditions)
+        return {}
+
+    setattr(instance, field_name, name)
+    setattr(instance, renditions_field_name(field_name), renditions)
+    update_fields = [field_name, renditions_field_name(field_name)]
+    update_fields += [
+        field.name
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False)
+    ]
+    instance.save(update_fields=update_fields)
+    return renditions
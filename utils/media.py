@@ -0,0 +1,566 @@
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Iterator, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.signals import setting_changed
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.fields.files import ImageFieldFile
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+
+def renditions_field_name(field_name: str) -> str:
+    return f"{field_name}_renditions"
+
+
+def hash_content(content) -> str:
+    """Return the SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class MediaURLCache:
+    """
+    Process-local LRU cache of the URLs of stored files, keyed by name.
+
+    Building a URL can be costly, the Cloudinary storage signs it in
+    Python, and pages serialize dozens of them. At most ``max_size`` URLs
+    are kept, each for ``timeout`` seconds; the URL of a file is dropped
+    when the file is saved or deleted through ``save_file`` or
+    ``delete_file``, in this process. Other processes see the change once
+    their entry expires, which only matters for names that are reused:
+    content-addressed names are not.
+
+    ``stats()`` returns the hits and misses since the last ``clear()``.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, timeout: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._urls = OrderedDict()
+        self.configure(max_size, timeout)
+
+    def configure(self, max_size: Optional[int] = None, timeout: Optional[int] = None):
+        self.max_size = settings.MEDIA_URL_CACHE_SIZE if max_size is None else max_size
+        self.timeout = settings.MEDIA_URL_CACHE_TIMEOUT if timeout is None else timeout
+        self.clear()
+
+    def url(self, storage, name: str) -> str:
+        if not self.max_size:
+            return storage.url(name)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._urls.get(name)
+            if entry is not None and entry[1] > now:
+                self._urls.move_to_end(name)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        url = storage.url(name)
+        with self._lock:
+            self._urls[name] = (url, now + self.timeout)
+            self._urls.move_to_end(name)
+            while len(self._urls) > self.max_size:
+                self._urls.popitem(last=False)
+        return url
+
+    def invalidate(self, *names: str) -> None:
+        with self._lock:
+            for name in names:
+                self._urls.pop(name, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._urls.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._urls),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+media_urls = MediaURLCache()
+
+
+@receiver(setting_changed)
+def reconfigure_media_urls(setting, **kwargs):
+    if setting in (
+        "STORAGES",
+        "MEDIA_URL",
+        "MEDIA_URL_CACHE_SIZE",
+        "MEDIA_URL_CACHE_TIMEOUT",
+    ):
+        media_urls.configure()
+
+
+def save_file(storage, name: str, content, max_length: Optional[int] = None) -> str:
+    name = storage.save(name, content, max_length=max_length)
+    media_urls.invalidate(name)
+    return name
+
+
+def delete_file(storage, name: str) -> None:
+    storage.delete(name)
+    media_urls.invalidate(name)
+
+
+# Seconds a release may hold a stored file before uploads reuse it anyway.
+RELEASE_TIMEOUT = 60
+# Seconds an upload waits for a release in progress. A release is a single
+# delete, a longer one is left to finish on its own instead of holding the
+# request.
+RELEASE_WAIT = 1
+
+
+def _reuse_key(name: str) -> str:
+    return f"media:reused:{name}"
+
+
+def _release_key(name: str) -> str:
+    return f"media:releasing:{name}"
+
+
+def reuse_file(storage, name: str) -> bool:
+    """
+    Return whether ``name`` is stored and can be referenced as is.
+
+    A stored file is marked as reused for ``MEDIA_REUSE_TIMEOUT`` seconds,
+    so that a release starting now leaves it alone until the new reference
+    is committed, and a release in progress is waited for, up to
+    ``RELEASE_WAIT`` seconds.
+    """
+    if not storage.exists(name):
+        return False
+    cache.set(_reuse_key(name), 1, settings.MEDIA_REUSE_TIMEOUT)
+    deadline = time.monotonic() + RELEASE_WAIT
+    while cache.get(_release_key(name)) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return storage.exists(name)
+
+
+def delete_unused_file(storage, name: str) -> bool:
+    """
+    Delete a stored file unless an upload is reusing it or another release
+    holds it. Return whether it was deleted.
+
+    The release mark is set before the reuse mark is read, and ``reuse_file``
+    sets its mark before reading the release one: either the upload waits
+    for the deletion and stores the file again, or the file is kept.
+    """
+    if not cache.add(_release_key(name), 1, RELEASE_TIMEOUT):
+        return False
+    try:
+        if cache.get(_reuse_key(name)):
+            return False
+        delete_file(storage, name)
+        return True
+    finally:
+        cache.delete(_release_key(name))
+
+
+def _normalized_key(name: str) -> str:
+    return f"media:normalized:{name}"
+
+
+def get_normalized_name(name: str) -> Optional[str]:
+    """The name of the normalized copy of an uploaded file, if one was stored."""
+    return cache.get(_normalized_key(name))
+
+
+def set_normalized_name(name: str, normalized_name: str) -> None:
+    cache.set(_normalized_key(name), normalized_name, timeout=None)
+
+
+class ContentAddressedFieldFile(ImageFieldFile):
+    @property
+    def url(self):
+        self._require_file()
+        return media_urls.url(self.storage, self.name)
+
+    def save(self, name, content, save=True):
+        _, extension = os.path.splitext(name)
+        address = self.field.content_address(hash_content(content), extension)
+        # Identical bytes are already stored, possibly normalized: only the
+        # reference is saved.
+        for name in filter(None, (get_normalized_name(address), address)):
+            if reuse_file(self.storage, name):
+                break
+        else:
+            name = save_file(
+                self.storage, address, content, max_length=self.field.max_length
+            )
+        self.name = name
+        setattr(self.instance, self.field.attname, self.name)
+        self._committed = True
+
+        if save:
+            self.instance.save()
+
+    save.alters_data = True
+
+
+class ContentAddressedImageField(models.ImageField):
+    """
+    ImageField storing each file under the SHA-256 of its content, as
+    ``<upload_to>/<2 first digits>/<digest><extension>``.
+
+    Uploading bytes that are already stored costs a hash and an existence
+    check instead of a storage upload, and rows with identical images share
+    one stored file, across models when their fields have the same
+    ``upload_to``. Bytes whose normalized copy is stored, see
+    ``ImageProcessor``, reference that copy. A stored file, with its
+    renditions, is deleted once no row of any content-addressed field
+    references it any more.
+    """
+
+    attr_class = ContentAddressedFieldFile
+
+    def __init__(self, *args, upload_to: str = "", **kwargs):
+        kwargs.setdefault("db_index", True)
+        super().__init__(*args, upload_to=upload_to, **kwargs)
+
+    def content_address(self, digest: str, extension: str) -> str:
+        return os.path.join(self.upload_to, digest[:2], f"{digest}{extension.lower()}")
+
+
+@functools.cache
+def content_addressed_fields(model) -> tuple[str, ...]:
+    return tuple(
+        field.name
+        for field in model._meta.concrete_fields
+        if isinstance(field, ContentAddressedImageField)
+    )
+
+
+def media_references():
+    """Yield ``(model, field_name)`` for every content-addressed field."""
+    for model in apps.get_models():
+        for field_name in content_addressed_fields(model):
+            yield model, field_name
+
+
+def count_references(name: str) -> int:
+    """Count the rows referencing a stored file, across all the models."""
+    return sum(
+        model._default_manager.filter(**{field_name: name}).count()
+        for model, field_name in media_references()
+    )
+
+
+def stored_renditions(storage, name: str) -> list[str]:
+    """
+    List the renditions stored for a file, named ``<stem>-<width>w.<ext>``
+    in the ``renditions`` directory next to it.
+    """
+    directory, filename = os.path.split(name)
+    stem, _ = os.path.splitext(filename)
+    renditions_directory = os.path.join(directory, "renditions")
+    try:
+        _, files = storage.listdir(renditions_directory)
+    except FileNotFoundError:
+        return []
+    return [
+        os.path.join(renditions_directory, file)
+        for file in files
+        if file.startswith(f"{stem}-")
+    ]
+
+
+def release_file(storage, name: str, renditions: dict | None = None) -> bool:
+    """
+    Delete a stored file and its renditions if no row references it.
+    Return whether it was deleted.
+
+    Renditions are shared by the rows referencing a file, but may be
+    recorded only on rows already deleted, so the stored ones are looked up
+    besides the recorded ``renditions``. A file reused by an upload in the
+    meantime is kept, see ``delete_unused_file``; if that upload is rolled
+    back, the file is left to ``OrphanedMediaCollector``.
+    """
+    if not name or count_references(name):
+        return False
+    if not delete_unused_file(storage, name):
+        return False
+    recorded = {
+        rendition
+        for names in (renditions or {}).values()
+        for rendition in names.values()
+    }
+    for rendition in recorded | set(stored_renditions(storage, name)):
+        delete_file(storage, rendition)
+    return True
+
+
+def get_media_state(instance_or_row, field_name: str) -> tuple:
+    """Return the stored name and renditions of a field of an instance or row."""
+    renditions_field = renditions_field_name(field_name)
+    if isinstance(instance_or_row, dict):
+        return instance_or_row[field_name], instance_or_row.get(renditions_field)
+    return (
+        getattr(instance_or_row, field_name).name,
+        getattr(instance_or_row, renditions_field, None),
+    )
+
+
+def schedule_release(model, field_name: str, name: str, renditions) -> None:
+    storage = model._meta.get_field(field_name).storage
+    # After commit, so a file detached and attached again in the same
+    # transaction is kept.
+    transaction.on_commit(lambda: release_file(storage, name, renditions))
+
+
+def media_columns(model) -> list[str]:
+    """The content-addressed fields of a model and their renditions fields."""
+    columns = {field.name for field in model._meta.concrete_fields}
+    fields = content_addressed_fields(model)
+    return [
+        *fields,
+        *(
+            renditions_field_name(name)
+            for name in fields
+            if renditions_field_name(name) in columns
+        ),
+    ]
+
+
+@receiver(pre_save)
+def collect_previous_media(sender, instance, raw=False, update_fields=None, **kwargs):
+    fields = content_addressed_fields(sender)
+    if raw or not fields or instance.pk is None:
+        return
+    if update_fields is not None and not set(fields) & set(update_fields):
+        return
+    instance._previous_media = (
+        sender._default_manager.filter(pk=instance.pk)
+        .values(*media_columns(sender))
+        .first()
+    )
+
+
+@receiver(post_save)
+def release_replaced_media(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, "_previous_media", None)
+    if raw or not previous:
+        return
+    del instance._previous_media
+    for field_name in content_addressed_fields(sender):
+        name, renditions = get_media_state(previous, field_name)
+        if name and name != getattr(instance, field_name).name:
+            schedule_release(sender, field_name, name, renditions)
+
+
+@receiver(post_delete)
+def release_deleted_media(sender, instance, **kwargs):
+    for field_name in content_addressed_fields(sender):
+        name, renditions = get_media_state(instance, field_name)
+        if name:
+            schedule_release(sender, field_name, name, renditions)
+
+
+class OrphanedMediaCollector:
+    """
+    Delete the stored media files that no row references any more.
+
+    The storage is walked directory by directory under the ``upload_to``
+    roots of the content-addressed fields and the names listed, in pages,
+    are diffed against the set of names referenced by those fields. A
+    rendition is referenced when its original is. Orphans are deleted in
+    batches of ``batch_size`` with a ``pause`` (seconds) between batches,
+    to bound the load on the storage; every batch is checked against the
+    database again first, for files referenced since the walk started.
+
+    Files modified less than ``min_age`` seconds ago are kept, since their
+    row may not be committed yet, and so are the files of storages without
+    modification times unless ``min_age`` is 0.
+
+    A storage with a ``list_files(path)`` method, yielding the name, size and
+    modification time of every file under ``path``, is listed once per root
+    and its sizes and times are used as listed; other storages are walked
+    with ``listdir`` and asked for them file by file.
+    """
+
+    def __init__(
+        self,
+        storage=None,
+        page_size: int = 1000,
+        batch_size: Optional[int] = None,
+        pause: Optional[float] = None,
+        min_age: Optional[int] = None,
+    ):
+        self.storage = storage or default_storage
+        self.page_size = page_size
+        self.batch_size = batch_size or settings.MEDIA_GC_BATCH_SIZE
+        self.pause = settings.MEDIA_GC_BATCH_PAUSE if pause is None else pause
+        self.min_age = settings.MEDIA_GC_MIN_AGE if min_age is None else min_age
+        # Sizes and modification times listed with the current page.
+        self.listed = {}
+
+    def get_roots(self) -> list[str]:
+        return sorted(
+            {
+                model._meta.get_field(field_name).upload_to.strip("/").split("/")[0]
+                for model, field_name in media_references()
+            }
+        )
+
+    def iter_files(self) -> Iterator[tuple[str, Optional[int], Optional[datetime]]]:
+        """
+        Yield the name, size and modification time of the stored files, with
+        ``None`` for what the listing does not tell.
+        """
+        if hasattr(self.storage, "list_files"):
+            for root in self.get_roots():
+                yield from self.storage.list_files(root)
+            return
+        directories = deque(self.get_roots())
+        while directories:
+            directory = directories.popleft()
+            try:
+                subdirectories, files = self.storage.listdir(directory)
+            except FileNotFoundError:
+                continue
+            directories.extend(os.path.join(directory, name) for name in subdirectories)
+            for name in files:
+                yield os.path.join(directory, name), None, None
+
+    def iter_pages(self) -> Iterator[set[str]]:
+        """
+        Yield the names of the stored files, ``page_size`` at a time, and
+        keep their listed sizes and modification times in ``listed``.
+        """
+        page = {}
+        for name, size, modified in self.iter_files():
+            page[name] = (size, modified)
+            if len(page) == self.page_size:
+                self.listed = page
+                yield set(page)
+                page = {}
+        if page:
+            self.listed = page
+            yield set(page)
+
+    @staticmethod
+    def original_stem(name: str) -> Optional[str]:
+        """
+        ``<directory>/<stem>`` of the original of a ``<stem>-<width>w``
+        rendition, ``None`` for an original.
+        """
+        directory, filename = os.path.split(name)
+        parent, basename = os.path.split(directory)
+        if basename != "renditions" or "-" not in filename:
+            return None
+        return os.path.join(parent, filename.rsplit("-", 1)[0])
+
+    def referenced_names(self) -> set[str]:
+        names = set()
+        for model, field_name in media_references():
+            names.update(
+                model._default_manager.exclude(**{field_name: ""})
+                .values_list(field_name, flat=True)
+                .iterator(chunk_size=self.page_size)
+            )
+        return names
+
+    def find_orphans(self) -> Iterator[str]:
+        names = self.referenced_names()
+        stems = {os.path.splitext(name)[0] for name in names}
+        for page in self.iter_pages():
+            originals = {name for name in page if self.original_stem(name) is None}
+            renditions = {
+                name for name in page - originals if self.original_stem(name) in stems
+            }
+            orphans = page - (originals & names) - renditions
+            yield from sorted(name for name in orphans if self.is_old(name))
+
+    def is_old(self, name: str) -> bool:
+        if not self.min_age:
+            return True
+        _, modified = self.listed.get(name, (None, None))
+        if modified is not None:
+            return (timezone.now() - modified).total_seconds() >= self.min_age
+        try:
+            modified = self.storage.get_modified_time(name)
+        except NotImplementedError:
+            return False
+        except FileNotFoundError:
+            return True
+        return (timezone.now() - modified).total_seconds() >= self.min_age
+
+    def still_orphaned(self, names: list[str]) -> list[str]:
+        """Drop the names referenced since the walk started."""
+        stems = {name: self.original_stem(name) for name in names}
+        referenced = set()
+        for model, field_name in media_references():
+            condition = Q(**{f"{field_name}__in": names})
+            for stem in set(filter(None, stems.values())):
+                condition |= Q(**{f"{field_name}__startswith": f"{stem}."})
+            referenced.update(
+                model._default_manager.filter(condition).values_list(
+                    field_name, flat=True
+                )
+            )
+        referenced_stems = {os.path.splitext(name)[0] for name in referenced}
+        return [
+            name
+            for name, stem in stems.items()
+            if name not in referenced and stem not in referenced_stems
+        ]
+
+    def collect(self, dry_run: bool = False) -> dict:
+        """
+        Delete the orphaned files and return the number of orphans, of
+        deleted files and the size of the orphans in bytes. With
+        ``dry_run`` nothing is deleted.
+        """
+        report = {"orphans": 0, "deleted": 0, "size": 0}
+        batch = []
+        for name in self.find_orphans():
+            report["orphans"] += 1
+            report["size"] += self.file_size(name)
+            if dry_run:
+                continue
+            batch.append(name)
+            if len(batch) == self.batch_size:
+                report["deleted"] += self.delete_batch(
+                    batch, pause=report["deleted"] > 0
+                )
+                batch = []
+        if batch and not dry_run:
+            report["deleted"] += self.delete_batch(batch, pause=report["deleted"] > 0)
+        return report
+
+    def file_size(self, name: str) -> int:
+        """
+        Size of a stored file in bytes, 0 when the storage cannot tell:
+        the Cloudinary storage returns None when the request fails.
+        """
+        size, _ = self.listed.get(name, (None, None))
+        if size is not None:
+            return size
+        return self.storage.size(name) or 0
+
+    def delete_batch(self, names: list[str], pause: bool = False) -> int:
+        if pause and self.pause:
+            time.sleep(self.pause)
+        names = self.still_orphaned(names)
+        return sum(delete_unused_file(self.storage, name) for name in names)
@@ -1,9 +1,340 @@
+import base64
+import hashlib
+import json
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, OrderBy, Q
+from django.utils.functional import cached_property
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 
 
+class ExactCount:
+    """Count the rows with ``COUNT(*)``."""
+
+    # Whether page numbers and page sizes may be bounded by the count.
+    bounds_pages = True
+
+    def count(self, queryset) -> tuple[int, bool]:
+        return queryset.count(), False
+
+
+class CachedCount:
+    """
+    Cache the exact count per filter signature (the SQL of the query).
+
+    A cached count is reported as exact but may lag behind writes for up to
+    ``PAGINATION_COUNT_CACHE_TIMEOUT``, so pages are bounded by their rows
+    rather than by the count.
+    """
+
+    bounds_pages = False
+
+    def count(self, queryset) -> tuple[int, bool]:
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            # A filter that can never match, such as an empty ``__in``.
+            return 0, False
+        signature = hashlib.sha1(f"{sql}:{params}".encode()).hexdigest()
+        cache_key = f"pagination_count:{signature}"
+        count = cache.get(cache_key)
+        if count is not None:
+            return count, False
+        count = queryset.count()
+        cache.set(cache_key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count, False
+
+
+class EstimatedCount:
+    """
+    Use the PostgreSQL planner estimate (``pg_class.reltuples`` for an
+    unfiltered table, ``EXPLAIN`` rows otherwise) when it is above
+    ``PAGINATION_COUNT_ESTIMATE_THRESHOLD``, and an exact count below it
+    or on other databases.
+    """
+
+    bounds_pages = False
+
+    def count(self, queryset) -> tuple[int, bool]:
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql":
+            estimate = self.estimate(queryset, connection)
+            if estimate >= settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD:
+                return estimate, True
+        return queryset.count(), False
+
+    @staticmethod
+    def estimate(queryset, connection) -> int:
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute(
+                    "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+                if row and row[0] >= 0:
+                    return int(row[0])
+            try:
+                sql, params = queryset.query.sql_with_params()
+            except EmptyResultSet:
+                return 0
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+COUNT_STRATEGIES = {
+    "exact": ExactCount,
+    "cached": CachedCount,
+    "estimated": EstimatedCount,
+}
+
+
+class CountStrategyPaginator(Paginator):
+    """
+    Paginator whose ``count`` comes from a count strategy.
+
+    When the strategy does not bound the pages, as with a cached or
+    estimated count, page numbers past the last page of the count are still
+    served as long as they have rows, and pages are not truncated to the
+    count.
+    """
+
+    def __init__(self, *args, count_strategy: str = "exact", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_strategy = COUNT_STRATEGIES[count_strategy]()
+
+    @cached_property
+    def count_result(self) -> tuple[int, bool]:
+        return self.count_strategy.count(self.object_list)
+
+    @property
+    def count(self) -> int:
+        return self.count_result[0]
+
+    @property
+    def count_is_approximate(self) -> bool:
+        return self.count_result[1]
+
+    def validate_number(self, number):
+        if self.count_strategy.bounds_pages:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages["invalid_page"])
+        if number < 1:
+            raise EmptyPage(self.error_messages["min_page"])
+        return number
+
+    def page(self, number):
+        if self.count_strategy.bounds_pages:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        page = self._get_page(
+            self.object_list[bottom : bottom + self.per_page], number, self
+        )
+        if number > 1 and not page.object_list:
+            raise EmptyPage(self.error_messages["no_results"])
+        return page
+
+
 class Pagination(pagination.PageNumberPagination):
+    """
+    Page number pagination with an opt-in keyset (cursor) mode.
+
+    Sending the ``cursor`` query parameter (empty for the first page) switches
+    the request to keyset pagination: pages are fetched with a ``WHERE`` on
+    the ordering fields instead of ``OFFSET`` and no ``COUNT(*)`` is made.
+    The response keeps the same envelope; ``next_page`` and ``previous_page``
+    then hold opaque cursors.
+
+    Views may set ``pagination_count_strategy`` to ``"cached"`` or
+    ``"estimated"`` (see ``COUNT_STRATEGIES``) to avoid an exact count on
+    every page; ``items_count_is_approximate`` tells whether the count is
+    exact.
+    """
+
     page_size = 10
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            count_strategy = getattr(
+                view,
+                "pagination_count_strategy",
+                settings.PAGINATION_COUNT_STRATEGY,
+            )
+            self.django_paginator_class = partial(
+                CountStrategyPaginator, count_strategy=count_strategy
+            )
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = self.get_keyset_ordering(queryset)
+        names, defer = queryset.query.deferred_loading
+        if names and not defer:
+            # Columns narrowed with only() must still include the cursor fields.
+            queryset = queryset.only(*names, *(name for name, _ in self.ordering))
+        if queryset.query.values_select:
+            # So must the columns of values() rows.
+            columns = (
+                *queryset.query.values_select,
+                *(name for name, _ in self.ordering),
+            )
+            queryset = queryset.values(*dict.fromkeys(columns))
+        cursor = self.decode_cursor(request.query_params[self.cursor_query_param])
+        self.current_cursor = request.query_params[self.cursor_query_param] or None
+        page_size = self.get_page_size(request)
+
+        reverse = False
+        if cursor is not None:
+            reverse = cursor["reverse"]
+            values = self.get_cursor_values(queryset, cursor["values"])
+            queryset = queryset.filter(self.get_keyset_filter(values, reverse))
+        if reverse:
+            queryset = queryset.order_by(
+                *self.get_order_by([(name, not desc) for name, desc in self.ordering])
+            )
+        else:
+            queryset = queryset.order_by(*self.get_order_by(self.ordering))
+
+        results = list(queryset[: page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_cursor = None
+        self.previous_cursor = None
+        if results:
+            has_next = has_more if not reverse else True
+            has_previous = has_more if reverse else cursor is not None
+            if has_next:
+                self.next_cursor = self.encode_cursor(results[-1], reverse=False)
+            if has_previous:
+                self.previous_cursor = self.encode_cursor(results[0], reverse=True)
+        return results
+
+    def get_keyset_ordering(self, queryset):
+        """
+        Return the ordering of the queryset as ``(field, descending)`` pairs,
+        ending with the primary key so that every row has a unique position.
+        """
+        order_by = queryset.query.order_by or queryset.model._meta.ordering
+        ordering = []
+        for item in order_by:
+            if isinstance(item, str):
+                ordering.append((item.lstrip("-"), item.startswith("-")))
+            elif isinstance(item, OrderBy) and isinstance(item.expression, F):
+                ordering.append((item.expression.name, item.descending))
+            else:
+                raise ValidationError(
+                    {
+                        "ordering": [
+                            "Cursor pagination is not supported for this ordering."
+                        ]
+                    }
+                )
+        ordering = [("id" if name == "pk" else name, desc) for name, desc in ordering]
+        if "id" not in [name for name, _ in ordering]:
+            descending = ordering[-1][1] if ordering else True
+            ordering.append(("id", descending))
+        return ordering
+
+    def get_cursor_values(self, queryset, values):
+        """
+        Convert the values of a decoded cursor with the ordering fields, so a
+        tampered cursor is rejected instead of failing in the query.
+        """
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        converted = []
+        for (name, _), value in zip(self.ordering, values):
+            if value is None or isinstance(value, (dict, list)):
+                raise NotFound(self.invalid_cursor_message)
+            field = self.get_ordering_field(queryset, name)
+            try:
+                if field is not None:
+                    value = field.to_python(value)
+                    field.run_validators(value)
+            except (DjangoValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            converted.append(value)
+        return converted
+
+    @staticmethod
+    def get_ordering_field(queryset, name):
+        """
+        Return the model field (or annotation output field) an ordering name
+        refers to, following ``__`` relations, or ``None`` if unknown.
+        """
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        model = queryset.model
+        field = None
+        for part in name.split("__"):
+            if model is None:
+                return None
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                return None
+            model = field.related_model
+        if field is not None and field.is_relation:
+            field = field.target_field
+        return field
+
+    @staticmethod
+    def get_order_by(ordering):
+        return [f"-{name}" if desc else name for name, desc in ordering]
+
+    def get_keyset_filter(self, values, reverse):
+        """
+        Build ``(a > x) OR (a = x AND b > y) ...`` for the ordering fields,
+        with the comparison flipped for descending fields and previous pages.
+        """
+        condition = Q()
+        for index, (name, desc) in enumerate(self.ordering):
+            lookup = "lt" if desc != reverse else "gt"
+            term = Q(**{f"{name}__{lookup}": values[index]})
+            for previous_index in range(index):
+                previous_name = self.ordering[previous_index][0]
+                term &= Q(**{previous_name: values[previous_index]})
+            condition |= term
+        return condition
+
+    def encode_cursor(self, instance, reverse):
+        if isinstance(instance, dict):
+            values = [instance[name] for name, _ in self.ordering]
+        else:
+            values = [getattr(instance, name) for name, _ in self.ordering]
+        data = json.dumps({"values": values, "reverse": reverse}, cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            return {"values": list(data["values"]), "reverse": bool(data["reverse"])}
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
 
     def get_next_link(self):
         if not self.page.has_next():
@@ -18,6 +349,20 @@ class Pagination(pagination.PageNumberPagination):
         return page_number
 
     def get_paginated_response(self, data):
+        if self.cursor_mode:
+            return Response(
+                {
+                    "pagination": {
+                        "next_page": self.next_cursor,
+                        "current_page": self.current_cursor,
+                        "previous_page": self.previous_cursor,
+                        "num_pages": None,
+                    },
+                    "items_count": None,
+                    "items_count_is_approximate": False,
+                    "items": data,
+                }
+            )
         return Response(
             {
                 "pagination": {
@@ -27,6 +372,21 @@ class Pagination(pagination.PageNumberPagination):
                     "num_pages": self.page.paginator.num_pages,
                 },
                 "items_count": self.page.paginator.count,
+                "items_count_is_approximate": self.page.paginator.count_is_approximate,
                 "items": data,
             }
         )
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append(
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Keyset pagination cursor. Send it empty to get "
+                "the first page, then pass the returned next_page/previous_page.",
+                "schema": {"type": "string"},
+            }
+        )
+        return parameters
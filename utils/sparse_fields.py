@@ -0,0 +1,120 @@
+from typing import Iterable, Optional
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ListSerializer
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Serializer mixin keeping only the fields selected by the view.
+
+    The selection is read from ``context["sparse_fields"]`` (``None`` keeps
+    every field) and only applies to the top level serializer, not to the
+    serializers nested in it.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.context.get("sparse_fields")
+        if selected is None or not self.is_root_serializer():
+            return fields
+        return {name: field for name, field in fields.items() if name in selected}
+
+    def is_root_serializer(self) -> bool:
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+
+class SparseFieldsMixin:
+    """
+    View mixin for the ``fields`` and ``omit`` query parameters.
+
+    ``?fields=id,name`` returns only the listed fields and ``?omit=images``
+    every field but the listed ones. Views narrow their queryset with
+    ``field_requested`` and ``only_requested_fields`` so unrequested data
+    is neither loaded nor serialized. Only safe methods are affected.
+    """
+
+    fields_query_param = "fields"
+    omit_query_param = "omit"
+    # Maps serializer fields to the model fields they read, for fields
+    # whose name is not a model field.
+    sparse_field_sources = {}
+
+    def get_sparse_fields(self) -> Optional[set[str]]:
+        if not hasattr(self, "_sparse_fields"):
+            self._sparse_fields = self.parse_sparse_fields()
+        return self._sparse_fields
+
+    def parse_sparse_fields(self) -> Optional[set[str]]:
+        if self.request.method not in permissions.SAFE_METHODS:
+            return None
+        params = self.request.query_params
+        fields = self.split_param(params.get(self.fields_query_param))
+        omit = self.split_param(params.get(self.omit_query_param))
+        if not fields and not omit:
+            return None
+
+        available = set(self.get_serializer_class().Meta.fields)
+        unknown = (fields | omit) - available
+        if unknown:
+            param = (
+                self.fields_query_param if fields & unknown else self.omit_query_param
+            )
+            raise ValidationError(
+                {param: [f"Unknown fields: {', '.join(sorted(unknown))}."]}
+            )
+        return (fields or available) - omit
+
+    @staticmethod
+    def split_param(value: Optional[str]) -> set[str]:
+        if not value:
+            return set()
+        return {name.strip() for name in value.split(",") if name.strip()}
+
+    def field_requested(self, *names: str) -> bool:
+        fields = self.get_sparse_fields()
+        return fields is None or any(name in fields for name in names)
+
+    def only_requested_fields(self, queryset, *extra_fields: str):
+        """
+        Load only the model fields read by the requested serializer fields
+        and ``extra_fields``, and the relations followed by
+        ``select_related``, which cannot be deferred.
+        """
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return queryset
+        only = set(self.get_selected_relations(queryset.query.select_related))
+        for name in fields | set(extra_fields):
+            only.update(self.get_field_sources(queryset.model, name))
+        return queryset.only(*only)
+
+    @classmethod
+    def get_selected_relations(cls, select_related, prefix: str = "") -> list[str]:
+        """Paths of the relations of a ``query.select_related`` tree."""
+        if not isinstance(select_related, dict):
+            return []
+        paths = []
+        for name, nested in select_related.items():
+            paths.append(f"{prefix}{name}")
+            paths.extend(cls.get_selected_relations(nested, f"{prefix}{name}__"))
+        return paths
+
+    def get_field_sources(self, model, name: str) -> Iterable[str]:
+        if name in self.sparse_field_sources:
+            return self.sparse_field_sources[name]
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return ()
+        return (name,) if field.concrete else ()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["sparse_fields"] = self.get_sparse_fields()
+        return context
@@ -0,0 +1,84 @@
+import os
+import re
+
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.uploader
+from cloudinary_storage.storage import RawMediaCloudinaryStorage
+from django.utils.dateparse import parse_datetime
+
+# Names of content-addressed files and of their renditions start with the
+# SHA-256 of the original.
+CONTENT_ADDRESS_RE = re.compile(r"^[0-9a-f]{64}")
+
+
+class ContentAddressedCloudinaryStorage(RawMediaCloudinaryStorage):
+    """
+    Cloudinary storage keeping the names of content-addressed files.
+
+    The default upload adds a random suffix to the file name, so the
+    address of a file stored earlier is never found and identical uploads
+    are stored again. Content-addressed names are uploaded as their exact
+    public id, without overwriting a file already stored under it; other
+    names keep the default behaviour.
+
+    The upload time of a file is its modification time, since stored files
+    are never overwritten.
+
+    ``list_files`` lists the files under a path with their size and upload
+    time from the paginated resource listing, so walking the storage does
+    not cost an Admin API request per file.
+    """
+
+    list_page_size = 500
+
+    def _upload(self, name, content):
+        folder, filename = os.path.split(name)
+        if not CONTENT_ADDRESS_RE.match(filename):
+            return super()._upload(name, content)
+        options = {
+            "public_id": filename,
+            "use_filename": False,
+            "unique_filename": False,
+            "overwrite": False,
+            "resource_type": self._get_resource_type(name),
+            "tags": self.TAG,
+        }
+        if folder:
+            options["folder"] = folder
+        return cloudinary.uploader.upload(content, **options)
+
+    def get_modified_time(self, name):
+        try:
+            resource = cloudinary.api.resource(
+                self._prepend_prefix(name),
+                resource_type=self._get_resource_type(name),
+            )
+        except cloudinary.exceptions.NotFound:
+            raise FileNotFoundError(name)
+        return parse_datetime(resource["created_at"])
+
+    def list_files(self, path):
+        """
+        Yield the name, size and upload time of the files stored under
+        ``path``, at any depth.
+        """
+        options = {
+            "type": "upload",
+            "prefix": self._normalize_path(path),
+            "resource_type": self.RESOURCE_TYPE,
+            "max_results": self.list_page_size,
+            "tags": True,
+        }
+        while True:
+            response = cloudinary.api.resources(**options)
+            for resource in response["resources"]:
+                if self.TAG in resource["tags"]:
+                    yield (
+                        resource["public_id"],
+                        resource["bytes"],
+                        parse_datetime(resource["created_at"]),
+                    )
+            if not response.get("next_cursor"):
+                return
+            options["next_cursor"] = response["next_cursor"]
@@ -0,0 +1,67 @@
+import time
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, InMemoryStorage
+from django.test import TestCase
+
+from utils.media import (
+    RELEASE_WAIT,
+    MediaURLCache,
+    _release_key,
+    delete_unused_file,
+    reuse_file,
+)
+
+
+class MediaURLCacheTest(TestCase):
+    class CountingStorage(FileSystemStorage):
+        calls = 0
+
+        def url(self, name):
+            self.calls += 1
+            return super().url(name)
+
+    def setUp(self):
+        self.storage = self.CountingStorage(base_url="/media/")
+
+    def test_least_recently_used_urls_are_evicted(self):
+        urls = MediaURLCache(max_size=2, timeout=60)
+        for name in ("a.jpg", "b.jpg", "a.jpg", "c.jpg", "a.jpg", "b.jpg"):
+            self.assertEqual(urls.url(self.storage, name), f"/media/{name}")
+        self.assertEqual(self.storage.calls, 4)
+        self.assertEqual(
+            urls.stats(), {"size": 2, "hits": 2, "misses": 4, "hit_ratio": 2 / 6}
+        )
+
+    def test_urls_expire(self):
+        urls = MediaURLCache(max_size=2, timeout=0)
+        urls.url(self.storage, "a.jpg")
+        urls.url(self.storage, "a.jpg")
+        self.assertEqual(self.storage.calls, 2)
+
+    def test_disabled_cache(self):
+        urls = MediaURLCache(max_size=0)
+        urls.url(self.storage, "a.jpg")
+        urls.url(self.storage, "a.jpg")
+        self.assertEqual(self.storage.calls, 2)
+        self.assertEqual(urls.stats()["size"], 0)
+
+
+class ReuseFileTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.storage = InMemoryStorage()
+        self.name = self.storage.save("uploads/photo.jpg", ContentFile(b"data"))
+
+    def test_release_in_progress_is_waited_for_a_bounded_time(self):
+        # A release that never finishes, such as one of a stuck worker.
+        cache.add(_release_key(self.name), 1)
+        started = time.monotonic()
+        self.assertTrue(reuse_file(self.storage, self.name))
+        self.assertLess(time.monotonic() - started, RELEASE_WAIT + 0.5)
+
+    def test_reused_file_is_kept_by_a_release(self):
+        self.assertTrue(reuse_file(self.storage, self.name))
+        self.assertFalse(delete_unused_file(self.storage, self.name))
+        self.assertTrue(self.storage.exists(self.name))
@@ -0,0 +1,173 @@
+import base64
+import json
+
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.paginator import EmptyPage
+from django.db import connection
+from django.db.models.functions import Lower
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from authentication.models import Customer
+from shop.models import Product
+from shop.tests.factories import ProductFactory
+from utils.pagination import CountStrategyPaginator, EstimatedCount, Pagination
+
+
+class ProductCursorPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.product_list_url = reverse("product-list")
+        for index in range(25):
+            ProductFactory(price=index % 7 + 1, views=index % 3)
+
+    def walk(self, params):
+        pages = []
+        cursor = ""
+        while cursor is not None:
+            response = self.client.get(
+                self.product_list_url, {**params, "cursor": cursor}
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            cursor = response.data["pagination"]["next_page"]
+        return pages
+
+    def test_cursor_pages_follow_ordering(self):
+        for ordering, expected in [
+            (None, Product.objects.order_by("-id")),
+            ("views", Product.objects.order_by("views", "id")),
+            ("-price", Product.objects.order_by("-price", "-id")),
+        ]:
+            params = {"ordering": ordering} if ordering else {}
+            pages = self.walk(params)
+            ids = [item["id"] for page in pages for item in page["items"]]
+            self.assertEqual(ids, list(expected.values_list("id", flat=True)))
+            self.assertEqual([len(page["items"]) for page in pages], [10, 10, 5])
+            self.assertIsNone(pages[0]["items_count"])
+
+    def test_previous_cursor_returns_previous_page(self):
+        pages = self.walk({"ordering": "price"})
+        response = self.client.get(
+            self.product_list_url,
+            {"ordering": "price", "cursor": pages[2]["pagination"]["previous_page"]},
+        )
+        self.assertEqual(response.data["items"], pages[1]["items"])
+        self.assertIsNone(pages[0]["pagination"]["previous_page"])
+
+    def test_cursor_page_does_not_count_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.product_list_url, {"cursor": ""})
+        # Only the facet counts of the catalog may aggregate rows.
+        self.assertFalse(
+            any(
+                "COUNT(" in query["sql"] and "UNION" not in query["sql"]
+                for query in queries.captured_queries
+            )
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.product_list_url, {"cursor": "invalid"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_with_malformed_values(self):
+        for ordering, values in [
+            (None, ["abc"]),
+            (None, [{"id": 1}]),
+            (None, [[1]]),
+            (None, [None]),
+            (None, [10**30]),
+            ("price", ["abc", 1]),
+            ("price", [1, 2, 3]),
+        ]:
+            data = json.dumps({"values": values, "reverse": False})
+            params = {"cursor": base64.urlsafe_b64encode(data.encode()).decode()}
+            if ordering:
+                params["ordering"] = ordering
+            response = self.client.get(self.product_list_url, params)
+            self.assertEqual(
+                response.status_code, status.HTTP_404_NOT_FOUND, (ordering, values)
+            )
+
+    def test_unsupported_ordering_is_a_bad_request(self):
+        with self.assertRaises(ValidationError) as context:
+            Pagination().get_keyset_ordering(Product.objects.order_by(Lower("name")))
+        self.assertIn("ordering", context.exception.detail)
+
+
+class PaginationCountStrategyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product_list_url = reverse("product-list")
+        ProductFactory.create_batch(12)
+
+    def count_queries(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.product_list_url, params)
+        counts = [
+            query
+            for query in queries.captured_queries
+            if "COUNT(" in query["sql"] and "UNION" not in query["sql"]
+        ]
+        return response, len(counts)
+
+    def test_cached_count_is_reused_per_filter_signature(self):
+        response, counts = self.count_queries({})
+        self.assertEqual(counts, 1)
+        self.assertEqual(response.data["items_count"], 12)
+        self.assertFalse(response.data["items_count_is_approximate"])
+
+        response, counts = self.count_queries({"page": 2})
+        self.assertEqual(counts, 0)
+        self.assertEqual(response.data["items_count"], 12)
+        self.assertFalse(response.data["items_count_is_approximate"])
+        self.assertEqual(len(response.data["items"]), 2)
+
+        response, counts = self.count_queries({"name": "product"})
+        self.assertEqual(counts, 1)
+
+    def test_pages_past_a_cached_count_are_not_found(self):
+        self.client.get(self.product_list_url)
+        response, counts = self.count_queries({"page": 999})
+        self.assertEqual(counts, 0)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_pages_past_a_stale_count_are_served(self):
+        self.client.get(self.product_list_url)
+        ProductFactory.create_batch(13)
+        response = self.client.get(self.product_list_url, {"page": 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["items"]), 5)
+        self.assertFalse(response.data["items_count_is_approximate"])
+
+    def test_filter_that_can_never_match(self):
+        response = self.client.get(self.product_list_url, {"size": ","})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["items_count"], 0)
+        self.assertEqual(response.data["items"], [])
+
+    def test_pages_past_an_estimated_count_are_served_while_they_have_rows(self):
+        ProductFactory.create_batch(13)
+        paginator = CountStrategyPaginator(
+            Product.objects.order_by("id"), 10, count_strategy="estimated"
+        )
+        with patch.object(EstimatedCount, "count", return_value=(12, True)):
+            self.assertEqual(len(paginator.page(3)), 5)
+            with self.assertRaises(EmptyPage):
+                paginator.page(4)
+
+    def test_estimated_count_is_exact_without_planner_statistics(self):
+        user = Customer.objects.create_superuser(
+            email="admin@example.com", password="password"
+        )
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse("authentication:customers-list"))
+        self.assertEqual(response.data["items_count"], 1)
+        self.assertFalse(response.data["items_count_is_approximate"])
@@ -0,0 +1,118 @@
+import os
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from cloudinary.exceptions import NotFound
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from shop.models import Category
+from shop.tests.factories import CategoryFactory
+from utils.media import OrphanedMediaCollector, hash_content
+from utils.storage import ContentAddressedCloudinaryStorage
+
+
+class ContentAddressedCloudinaryStorageTest(TestCase):
+    digest = "ab" * 32
+
+    def setUp(self):
+        self.storage = ContentAddressedCloudinaryStorage()
+        upload = patch("cloudinary.uploader.upload", side_effect=self.upload)
+        self.upload_mock = upload.start()
+        self.addCleanup(upload.stop)
+
+    @staticmethod
+    def upload(content, **options):
+        # Cloudinary suffixes the file name unless a public id is given.
+        public_id = options.get("public_id") or f"{os.path.basename(content.name)}_x1"
+        return {"public_id": os.path.join(options.get("folder", ""), public_id)}
+
+    def test_content_addressed_names_are_kept(self):
+        for name in (
+            f"uploads/products/ab/{self.digest}.jpg",
+            f"uploads/products/ab/renditions/{self.digest}-320w.webp",
+        ):
+            self.assertEqual(self.storage.save(name, ContentFile(b"data")), name)
+        options = self.upload_mock.call_args.kwargs
+        self.assertFalse(options["overwrite"])
+        self.assertFalse(options["unique_filename"])
+
+        self.assertNotEqual(
+            self.storage.save("uploads/other.jpg", ContentFile(b"data")),
+            "uploads/other.jpg",
+        )
+
+    def test_stored_address_is_not_uploaded_again(self):
+        storage = ContentAddressedCloudinaryStorage()
+        category = CategoryFactory()
+        field_file = category.image
+        field_file.storage = storage
+        with patch.object(storage, "exists", return_value=True):
+            field_file.save("photo.jpg", ContentFile(b"data"), save=False)
+
+        self.upload_mock.assert_not_called()
+        self.assertEqual(
+            field_file.name,
+            Category._meta.get_field("image").content_address(
+                hash_content(ContentFile(b"data")), ".jpg"
+            ),
+        )
+
+    def test_modified_time_is_the_upload_time(self):
+        name = f"uploads/products/ab/{self.digest}.jpg"
+        with patch(
+            "cloudinary.api.resource",
+            return_value={"created_at": "2024-05-01T10:00:00Z"},
+        ) as resource:
+            modified = self.storage.get_modified_time(name)
+        self.assertEqual(modified, datetime(2024, 5, 1, 10, tzinfo=timezone.utc))
+        self.assertEqual(resource.call_args.args, (name,))
+
+        with patch("cloudinary.api.resource", side_effect=NotFound):
+            with self.assertRaises(FileNotFoundError):
+                self.storage.get_modified_time(name)
+
+    def test_collector_uses_the_listed_sizes_and_upload_times(self):
+        old, new = (
+            f"uploads/products/ab/{digest}.jpg" for digest in ("ab" * 32, "cd" * 32)
+        )
+        pages = [
+            {
+                "resources": [
+                    {
+                        "public_id": old,
+                        "bytes": 100,
+                        "created_at": "2024-05-01T10:00:00Z",
+                        "tags": [self.storage.TAG],
+                    },
+                    {
+                        "public_id": "uploads/other.jpg",
+                        "bytes": 5,
+                        "created_at": "2024-05-01T10:00:00Z",
+                        "tags": [],
+                    },
+                ],
+                "next_cursor": "next",
+            },
+            {
+                "resources": [
+                    {
+                        "public_id": new,
+                        "bytes": 200,
+                        "created_at": datetime.now(timezone.utc).isoformat(),
+                        "tags": [self.storage.TAG],
+                    },
+                ],
+            },
+        ]
+        collector = OrphanedMediaCollector(self.storage, min_age=60)
+        with patch("cloudinary.api.resources", side_effect=pages) as resources, patch(
+            "cloudinary.api.resource"
+        ) as resource, patch.object(self.storage, "size") as size:
+            self.assertEqual(collector.collect(dry_run=True)["size"], 100)
+
+        self.assertEqual(resources.call_count, 2)
+        self.assertEqual(resources.call_args.kwargs["prefix"], "uploads/")
+        self.assertEqual(resources.call_args.kwargs["next_cursor"], "next")
+        resource.assert_not_called()
+        size.assert_not_called()
@@ -0,0 +1,46 @@
+import os
+
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.request import Request
+
+from utils.custom_exceptions import UploadTooLargeError
+from utils.uploads import LimitedTemporaryFileUploadHandler, SpooledMultiPartParser
+
+
+class SpooledMultiPartParserTest(TestCase):
+    def parse(self, files):
+        request = Request(
+            RequestFactory().post("/upload/", {"uploaded_images": files}),
+            parsers=[SpooledMultiPartParser()],
+        )
+        return request.FILES.getlist("uploaded_images")
+
+    def test_files_are_spooled_to_disk(self):
+        # Smaller than FILE_UPLOAD_MAX_MEMORY_SIZE, still written to disk.
+        files = self.parse(
+            [SimpleUploadedFile(f"{index}.jpg", b"x" * 1024) for index in range(2)]
+        )
+        self.assertEqual(len(files), 2)
+        for file in files:
+            self.assertIsInstance(file, TemporaryUploadedFile)
+            self.assertTrue(os.path.exists(file.temporary_file_path()))
+            self.assertEqual(file.read(), b"x" * 1024)
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=4096)
+    def test_requests_over_the_limit_are_rejected(self):
+        with self.assertRaises(UploadTooLargeError):
+            self.parse([SimpleUploadedFile("big.jpg", b"x" * 8192)])
+
+    def test_handler_counts_the_received_bytes(self):
+        # The declared content length is below the limit, the data is not.
+        handler = LimitedTemporaryFileUploadHandler(max_bytes=100)
+        handler.handle_raw_input(None, {}, 50, "boundary")
+        handler.new_file("file", "file.jpg", "image/jpeg", 50)
+        handler.receive_data_chunk(b"x" * 60, 0)
+        with self.assertRaises(UploadTooLargeError):
+            handler.receive_data_chunk(b"x" * 60, 60)
+        with self.assertRaises(UploadTooLargeError):
+            LimitedTemporaryFileUploadHandler(max_bytes=100).handle_raw_input(
+                None, {}, 101, "boundary"
+            )
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework.parsers import MultiPartParser
+
+from utils.custom_exceptions import UploadTooLargeError
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Write every uploaded file to a temporary file chunk by chunk and stop
+    the upload once the request carries more than ``max_bytes``.
+    """
+
+    def __init__(self, request=None, max_bytes=None):
+        super().__init__(request)
+        self.max_bytes = max_bytes
+        self.received = 0
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        if self.max_bytes is not None and content_length > self.max_bytes:
+            raise UploadTooLargeError()
+
+    def receive_data_chunk(self, raw_data, start):
+        # The content length may be missing or wrong, count what is received.
+        self.received += len(raw_data)
+        if self.max_bytes is not None and self.received > self.max_bytes:
+            raise UploadTooLargeError()
+        return super().receive_data_chunk(raw_data, start)
+
+
+class SpooledMultiPartParser(MultiPartParser):
+    """
+    Multipart parser keeping uploaded files on disk instead of in memory,
+    whatever their size, and rejecting requests larger than
+    ``IMAGE_UPLOAD_MAX_BYTES`` with a 413 response.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context["request"]
+        # Read by MultiPartParser.parse instead of the Django request handlers.
+        request.upload_handlers = [
+            LimitedTemporaryFileUploadHandler(
+                request, max_bytes=settings.IMAGE_UPLOAD_MAX_BYTES
+            )
+        ]
+        return super().parse(stream, media_type, parser_context)
@@ -1,6 +1,6 @@
 from django.conf import settings
 from shop.models import Product
-from shop.serializers import ProductSerializer
+from shop.serializers import ProductValuesSerializer
 from utils.custom_exceptions import (
     ProductAlreadyExistException,
     ProductNotExistException,
@@ -18,10 +18,12 @@ class WishlistService:
 
     def __iter__(self):
         product_ids = self.wishlist.keys()
-        products = Product.objects.filter(id__in=product_ids)
+        products = ProductValuesSerializer().serialize(
+            Product.objects.filter(id__in=product_ids)
+        )
         for product in products:
             wishlist_item = {
-                "product": ProductSerializer(product).data,
+                "product": product,
             }
             yield wishlist_item
 
@@ -38,7 +40,8 @@ class WishlistService:
         product_id = str(product.id)
         if product_id in self.wishlist:
             raise ProductAlreadyExistException
-        self.wishlist[product_id] = {"product": ProductSerializer(product).data}
+        (data,) = ProductValuesSerializer().serialize_instances([product])
+        self.wishlist[product_id] = {"product": data}
         self.save()
 
     def remove(self, product: Product) -> None:
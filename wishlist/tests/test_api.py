@@ -3,7 +3,12 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from faker import Faker
+from types import SimpleNamespace
+from django.core.cache import cache
+from django.test import override_settings
 from shop.models import Product, Category
+from shop.serializers import ProductValuesSerializer
+from shop.services import product_repository
 from wishlist.services import WishlistService
 
 
@@ -60,3 +65,37 @@ class WishlistTests(APITestCase):
                 for item in response.data["products"]
             )
         )
+
+
+@override_settings(CATALOG_CACHE_ALLOW_LOCAL=True)
+class WishlistServiceTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        product_repository.clear()
+        self.category = Category.objects.create(name="Lamps", slug="lamps")
+        self.product = Product.objects.create(
+            name="Desk lamp",
+            category=self.category,
+            slug="desk-lamp",
+            price="19.90",
+            SKU=123456,
+            description="A lamp.",
+        )
+
+    def test_add_serializes_the_repository_product(self):
+        product = product_repository.get(self.product.id)
+        expected = ProductValuesSerializer().serialize(
+            Product.objects.filter(pk=self.product.pk)
+        )
+        wishlist_service = WishlistService(SimpleNamespace(session=self.client.session))
+
+        with self.assertNumQueries(0):
+            wishlist_service.add(product=product)
+
+        self.assertEqual(
+            wishlist_service.wishlist[str(self.product.id)], {"product": expected[0]}
+        )
+        self.assertEqual(
+            ProductValuesSerializer(fragments=False).serialize_instances([product]),
+            expected,
+        )
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from wishlist.services import WishlistService
 from shop.models import Product
+from shop.services import product_repository
 from utils.custom_exceptions import (
     ProductAlreadyExistException,
     ProductNotExistException,
@@ -25,7 +26,7 @@ class AddToWishlistView(APIView):
     def post(self, request, product_id):
         wishlist_service = WishlistService(request)
         try:
-            product = Product.objects.get(id=product_id)
+            product = product_repository.get(product_id)
             wishlist_service.add(product=product)
         except Product.DoesNotExist:
             raise ProductNotExistException
@@ -42,7 +43,7 @@ class RemoveFromWishlistView(APIView):
     def delete(self, request, product_id):
         wishlist_service = WishlistService(request)
         try:
-            product = Product.objects.get(id=product_id)
+            product = product_repository.get(product_id)
             wishlist_service.remove(product=product)
         except Product.DoesNotExist:
             raise Product.DoesNotExist